@@ -0,0 +1,31 @@
+from django.core.cache import cache
+import pytest
+
+from huntsite.puzzles import answer_index
+from huntsite.teams import team_search
+
+
+@pytest.fixture(autouse=True)
+def reset_answer_index():
+    """The answer index is held in process memory, so it would otherwise outlive each test's
+    database."""
+    answer_index.invalidate()
+    yield
+    answer_index.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def reset_team_search_index():
+    """The team search index is also held in process memory."""
+    team_search.invalidate()
+    yield
+    team_search.invalidate()
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    """Use a local memory cache instead of the dummy cache that tests are configured with."""
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    cache.clear()
+    yield cache
+    cache.clear()
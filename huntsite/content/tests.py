@@ -298,6 +298,29 @@ def test_story_page(client, settings):
         _assert_story3_available(story_cards, is_hidden=True, has_spoiler_warning=True)
 
 
+def test_story_page_num_queries(client, django_assert_num_queries):
+    """The number of queries for the story page shouldn't depend on the number of entries or
+    solves."""
+    puzzles = PuzzleFactory.create_batch(3)
+    for puzzle in puzzles:
+        StoryEntryFactory(puzzle=puzzle)
+    team = UserFactory()
+    for puzzle in puzzles[:2]:
+        guess_submit(puzzle, team, puzzle.answer)
+
+    # The first request also loads the current site, which is then cached
+    client.get("/story/")
+    # Entries with puzzles
+    with django_assert_num_queries(1):
+        assert client.get("/story/").status_code == 200
+
+    client.force_login(team)
+    # Session + user + solves + entries with puzzles
+    with django_assert_num_queries(4):
+        response = client.get("/story/")
+    assert len(response.context["entries"]) == 2
+
+
 def test_victory_unlock(settings):
     # Set up users
     anon_client = Client()
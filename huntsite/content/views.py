@@ -3,7 +3,7 @@ from django.template.response import TemplateResponse
 from django.views.decorators.http import require_safe
 
 from huntsite.content import models
-from huntsite.puzzles import models as puzzle_models
+from huntsite.puzzles import release_schedule, solved_puzzles
 from huntsite.utils import HuntState, get_hunt_state, is_wrapup_available
 
 
@@ -22,16 +22,12 @@ def story_page(request):
     hunt_state = get_hunt_state(request)
     if hunt_state < HuntState.ENDED:
         # Filter to only unlocked story entries by solve
-        if request.user.is_anonymous:
-            solves = {}
-        else:
-            solves = {
-                solve.puzzle: solve
-                for solve in puzzle_models.Solve.objects.filter(user=request.user).select_related(
-                    "puzzle"
-                )
-            }
-        entries = [entry for entry in entries if entry.puzzle is None or entry.puzzle in solves]
+        solved_puzzle_ids = solved_puzzles.get_solved_puzzles(request.user).puzzle_ids
+        entries = [
+            entry
+            for entry in entries
+            if entry.puzzle_id is None or entry.puzzle_id in solved_puzzle_ids
+        ]
     context = {
         "entries": entries,
     }
@@ -41,7 +37,7 @@ def story_page(request):
 @require_safe
 def victory_page(request):
     if (
-        request.user.is_finished
+        solved_puzzles.get_solved_puzzles(request.user).is_finished
         or request.user.is_tester
         or get_hunt_state(request) >= HuntState.ENDED
     ):
@@ -57,15 +53,9 @@ def victory_page(request):
 @require_safe
 def attributions_page(request):
     entries = models.AttributionsEntry.objects.all().order_by("order_by")
-    puzzles = (
-        puzzle_models.Puzzle.available.with_calendar_entry()
-        .with_attributions_entry()
-        .all()
-        .order_by("calendar_entry__day")
-    )
     context = {
         "entries": entries,
-        "puzzles": puzzles,
+        "puzzles": release_schedule.available_puzzles(),
     }
     return TemplateResponse(request, "attributions.html", context)
 
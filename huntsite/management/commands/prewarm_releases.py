@@ -0,0 +1,67 @@
+from time import sleep
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from huntsite.puzzles import release_schedule
+from huntsite.puzzles import services as puzzle_services
+from huntsite.teams import services as team_services
+
+
+class Command(BaseCommand):
+    help = (
+        "Prewarm caches shortly before each release of puzzles or canned hints, so that the "
+        "requests at the release are served from the cache. Runs until there are no upcoming "
+        "releases, or with --once, prewarms the releases that are due and exits"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lead-time",
+            type=float,
+            default=60,
+            help="Seconds before each release to prewarm caches (default: 60)",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=300,
+            help="Most seconds to wait before checking the release schedule again (default: 300)",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Prewarm releases within the lead time and exit, e.g., when run by cron",
+        )
+
+    def handle(self, *args, lead_time=60, poll_interval=300, once=False, **kwargs):
+        lead_time = timezone.timedelta(seconds=lead_time)
+        prewarmed = set()
+        while True:
+            now = timezone.now()
+            releases = [
+                release_at
+                for release_at in release_schedule.upcoming_releases(now)
+                if release_at not in prewarmed
+            ]
+            if not releases:
+                self.stderr.write("No upcoming releases to prewarm.")
+                return
+            release_at = releases[0]
+            wait = (release_at - lead_time - now).total_seconds()
+            if wait > 0:
+                if once:
+                    return
+                # The schedule can change while waiting, so it's checked again periodically
+                sleep(min(wait, poll_interval))
+                continue
+
+            num_puzzles = puzzle_services.release_prewarm(release_at)
+            num_rows = team_services.leaderboard_prewarm()
+            prewarmed.add(release_at)
+            self.stderr.write(
+                self.style.SUCCESS(
+                    f"Prewarmed caches for the release of {num_puzzles} puzzles at "
+                    f"{release_at:%Y-%m-%d %H:%M:%S %Z} and {num_rows} leaderboard rows."
+                )
+            )
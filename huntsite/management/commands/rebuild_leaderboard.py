@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from huntsite.teams import services as team_services
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized leaderboard entries for all teams"
+
+    def handle(self, *args, **kwargs):
+        self.stderr.write("Rebuilding leaderboard.")
+        num_teams = team_services.leaderboard_rebuild()
+        self.stderr.write(
+            self.style.SUCCESS(f"Rebuilt leaderboard entries for {num_teams} teams.")
+        )
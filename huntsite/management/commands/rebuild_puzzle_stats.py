@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from huntsite.puzzles import services as puzzle_services
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized solve and guess counts for all puzzles"
+
+    def handle(self, *args, **kwargs):
+        self.stderr.write("Rebuilding puzzle stats.")
+        num_puzzles = puzzle_services.puzzle_stats_rebuild()
+        self.stderr.write(self.style.SUCCESS(f"Rebuilt stats for {num_puzzles} puzzles."))
@@ -0,0 +1,50 @@
+import signal
+from time import sleep
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from huntsite.tasks import services as task_services
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background tasks, checking for new ones every TASKS_POLL_INTERVAL seconds. "
+        "Several workers can run at once. Stops after the current task on SIGINT or SIGTERM"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once no tasks are left to run, instead of waiting for new ones",
+        )
+        parser.add_argument(
+            "--max-tasks", type=int, default=None, help="Exit after running this many tasks"
+        )
+
+    def handle(self, *args, burst=False, max_tasks=None, **kwargs):
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+            self.stderr.write("Stopping after the current task.")
+
+        old_handlers = {
+            signum: signal.signal(signum, stop) for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+        self.stderr.write("Worker started.")
+        num_run = 0
+        try:
+            while not stopping and (max_tasks is None or num_run < max_tasks):
+                if task_services.tasks_run_pending(max_tasks=1):
+                    num_run += 1
+                elif burst:
+                    break
+                else:
+                    sleep(settings.TASKS_POLL_INTERVAL)
+        finally:
+            for signum, handler in old_handlers.items():
+                signal.signal(signum, handler)
+        self.stderr.write(self.style.SUCCESS(f"Worker stopped after running {num_run} tasks."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from huntsite.teams import services as team_services
+
+
+class Command(BaseCommand):
+    help = (
+        "Snapshot all teams' leaderboard standings, so that the leaderboard as of any time can be "
+        "computed from the latest earlier snapshot. Run periodically, e.g., hourly from cron"
+    )
+
+    def handle(self, *args, **kwargs):
+        self.stderr.write("Taking leaderboard snapshot.")
+        snapshot = team_services.leaderboard_snapshot_take()
+        self.stderr.write(
+            self.style.SUCCESS(f"Took leaderboard snapshot as of {snapshot.taken_at}.")
+        )
@@ -0,0 +1,134 @@
+"""In-process index of puzzle answers, used to grade guesses without querying the Puzzle table.
+
+The index is loaded from the database on first use and held in memory by each worker process.
+It is invalidated by saves and deletes of Puzzle and MetapuzzleInfo objects, and by saves of
+AdventCalendarEntry objects. So that other worker processes also pick up the change,
+invalidation also bumps a version stored in the configured Django cache, which each process
+checks before using its index. Since a per-process cache backend like locmem can't do this,
+production settings require Redis when running more than one worker process. Changes made
+without signals firing, e.g., by bulk operations, need a call to invalidate().
+"""
+
+import datetime
+import threading
+from typing import NamedTuple
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from loguru import logger
+
+from huntsite.puzzles.models import AdventCalendarEntry, GuessEvaluation, MetapuzzleInfo, Puzzle
+
+ANSWER_INDEX_VERSION_CACHE_KEY = "puzzles:answer_index:version"
+
+
+class AnswerIndexEntry(NamedTuple):
+    puzzle_id: int
+    slug: str
+    title: str
+    available_at: datetime.datetime
+    answer_normalized: str
+    keep_going_answers_normalized: frozenset[str]
+    day: int
+    is_meta: bool
+    is_final: bool
+
+    @property
+    def is_available(self):
+        return self.available_at <= timezone.now()
+
+    def evaluate(self, guess_text_normalized: str) -> GuessEvaluation:
+        """Grade a normalized guess against this puzzle's answers."""
+        if guess_text_normalized == self.answer_normalized:
+            return GuessEvaluation.CORRECT
+        elif guess_text_normalized in self.keep_going_answers_normalized:
+            return GuessEvaluation.KEEP_GOING
+        return GuessEvaluation.INCORRECT
+
+
+_index: dict[str, AnswerIndexEntry] | None = None
+_index_version: str | None = None
+_lock = threading.Lock()
+
+
+def _load_index() -> dict[str, AnswerIndexEntry]:
+    puzzles = (
+        Puzzle.objects.with_meta_info()
+        .with_calendar_entry()
+        .only(
+            "id",
+            "slug",
+            "title",
+            "available_at",
+            "answer_normalized",
+            "keep_going_answers_normalized",
+            "calendar_entry__day",
+            "meta_info__is_final",
+        )
+    )
+    return {
+        puzzle.slug: AnswerIndexEntry(
+            puzzle_id=puzzle.id,
+            slug=puzzle.slug,
+            title=puzzle.title,
+            available_at=puzzle.available_at,
+            answer_normalized=puzzle.answer_normalized,
+            keep_going_answers_normalized=frozenset(puzzle.keep_going_answers_normalized),
+            day=puzzle.calendar_entry.day if hasattr(puzzle, "calendar_entry") else -1,
+            is_meta=hasattr(puzzle, "meta_info"),
+            is_final=hasattr(puzzle, "meta_info") and puzzle.meta_info.is_final,
+        )
+        for puzzle in puzzles
+    }
+
+
+def _rebuild_index() -> dict[str, AnswerIndexEntry]:
+    global _index, _index_version
+    with _lock:
+        version = cache.get(ANSWER_INDEX_VERSION_CACHE_KEY)
+        _index = _load_index()
+        _index_version = version
+        logger.debug("Loaded answer index with {n} puzzles.", n=len(_index))
+        return _index
+
+
+def _get_index() -> dict[str, AnswerIndexEntry]:
+    index = _index
+    if index is None or cache.get(ANSWER_INDEX_VERSION_CACHE_KEY) != _index_version:
+        index = _rebuild_index()
+    return index
+
+
+def get_entry(slug: str) -> AnswerIndexEntry | None:
+    """Return the answer index entry for the puzzle with the given slug, or None if no such
+    puzzle exists. The index is reloaded if it is stale."""
+    return _get_index().get(slug)
+
+
+def get_entries() -> list[AnswerIndexEntry]:
+    """Return the answer index entries of every puzzle. The index is reloaded if it is stale."""
+    return list(_get_index().values())
+
+
+def invalidate():
+    """Invalidate the answer index in this process and in all other processes sharing the
+    configured cache."""
+    global _index
+    with _lock:
+        _index = None
+    cache.set(ANSWER_INDEX_VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+
+
+@receiver(post_save, sender=Puzzle)
+@receiver(post_delete, sender=Puzzle)
+@receiver(post_save, sender=MetapuzzleInfo)
+@receiver(post_delete, sender=MetapuzzleInfo)
+@receiver(post_save, sender=AdventCalendarEntry)
+def invalidate_answer_index(sender, **kwargs):
+    # Invalidate again after commit so that no process can reload pre-commit data
+    invalidate()
+    transaction.on_commit(invalidate)
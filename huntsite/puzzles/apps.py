@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class PuzzlesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'huntsite.puzzles'
+
+    def ready(self):
+        # Connect signal receivers that invalidate the answer index and the cached puzzles and solves
+        import huntsite.puzzles.answer_index  # noqa: F401
+        import huntsite.puzzles.puzzle_bundle  # noqa: F401
+        import huntsite.puzzles.release_schedule  # noqa: F401
+        import huntsite.puzzles.solved_puzzles  # noqa: F401
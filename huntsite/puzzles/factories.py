@@ -7,6 +7,8 @@ import factory
 import factory.fuzzy
 from faker import Faker
 
+from huntsite.puzzles import answer_index
+
 fake = Faker()
 
 MOCK_PUZZLES = [
@@ -43,6 +45,11 @@ class PuzzleFactory(factory.django.DjangoModelFactory):
         factory_related_name="puzzle",
     )
 
+    @factory.post_generation
+    def invalidate_answer_index(obj, create, extracted, **kwargs):
+        # post_save is muted, so the answer index wouldn't otherwise pick up the new puzzle
+        answer_index.invalidate()
+
 
 class MetapuzzleInfoFactory(factory.django.DjangoModelFactory):
     class Meta:
@@ -18,7 +18,8 @@ class GuessForm(forms.Form):
         self.helper.form_id = "guess-form"
         self.helper.attrs = {
             "hx-post": ".",
-            "hx-target": "#guesses-results",
+            "hx-target": "#guess-list-body",
+            "hx-swap": "afterbegin",
             "hx-on::after-request": "if(event.detail.successful) this.reset()",
         }
         self.helper.layout = Layout(
@@ -0,0 +1,200 @@
+"""Write-behind buffer for incorrect guesses, enabled with the GUESS_BUFFER_ENABLED setting.
+
+Incorrect guesses are the large majority of guess writes, and nothing else depends on them
+being recorded immediately. When the buffer is enabled, guess_submit still grades guesses
+synchronously, but appends incorrect guesses to this per-process buffer instead of inserting
+them one transaction at a time. The buffer is written with a single bulk_create when it
+reaches GUESS_BUFFER_MAX_SIZE guesses or when its oldest guess is older than
+GUESS_BUFFER_MAX_AGE seconds, whichever comes first. A background thread enforces the age
+limit when no new guesses arrive. The buffer is also flushed when the process exits.
+
+A failed write keeps the guesses in the buffer to be retried with the next flush, up to
+GUESS_BUFFER_MAX_RETRIES times in a row. After that, the guesses are written one at a time and
+any that still fail are logged and dropped, so that a guess that can never be written, e.g.,
+because its puzzle was deleted, doesn't hold up the others or grow the buffer without bound.
+
+Each process has its own buffer, so a buffered guess is also reserved in the configured Django
+cache, which is shared between processes, so that the same guess buffered by another process is
+still detected as a duplicate. Guesses that conflict with one already written anyway are dropped
+and not counted in the puzzle stats.
+
+Guesses in the buffer are not yet visible to queries, so code that lists a team's guesses
+should also include pending_for(...).
+"""
+
+import atexit
+from collections import Counter
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, transaction
+from loguru import logger
+
+from huntsite.puzzles.models import Guess, PuzzleStats
+
+GUESS_RESERVATION_TIMEOUT = 60 * 60  # seconds
+
+
+def _guess_key(guess: Guess) -> tuple[int, int, str]:
+    return (guess.user_id, guess.puzzle_id, guess.text_normalized)
+
+
+def _reservation_cache_key(key: tuple[int, int, str]) -> str:
+    user_id, puzzle_id, text_normalized = key
+    return f"puzzles:guess_buffer:{user_id}:{puzzle_id}:{text_normalized}"
+
+
+def _write(guesses: list[Guess]):
+    with transaction.atomic():
+        Guess.objects.bulk_create(guesses, batch_size=settings.GUESS_BUFFER_MAX_SIZE)
+        counts = Counter(
+            guess.puzzle_id for guess in guesses if PuzzleStats.counts_user(guess.user)
+        )
+        for puzzle_id, count in counts.items():
+            PuzzleStats.objects.increment(
+                puzzle_id, num_guesses=count, num_incorrect_guesses=count
+            )
+
+
+def _write_each(guesses: list[Guess]) -> int:
+    """Write guesses one at a time, dropping any that fail. Returns the number written."""
+    num_written = 0
+    for guess in guesses:
+        try:
+            _write([guess])
+        except IntegrityError:
+            # Possibly the same guess written by another process after its reservation expired
+            logger.debug("Dropped buffered guess {guess!r} as a duplicate.", guess=guess)
+        except Exception:
+            logger.exception("Dropped buffered guess {guess!r}.", guess=guess)
+            cache.delete(_reservation_cache_key(_guess_key(guess)))
+        else:
+            num_written += 1
+    return num_written
+
+
+class GuessBuffer:
+    """Thread-safe buffer of unsaved Guess instances that are written in batches."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._guesses: list[Guess] = []
+        self._keys: set[tuple[int, int, str]] = set()
+        self._oldest: float | None = None
+        self._num_failures = 0
+        self._flusher: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def __len__(self):
+        return len(self._guesses)
+
+    def add(self, guess: Guess) -> bool:
+        """Add a guess to the buffer. Returns False without adding it if the same guess by the
+        same team is already in this or another process's buffer."""
+        key = _guess_key(guess)
+        with self._lock:
+            if key in self._keys:
+                return False
+        if not cache.add(_reservation_cache_key(key), True, timeout=GUESS_RESERVATION_TIMEOUT):
+            return False
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._guesses.append(guess)
+            self._keys.add(key)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            is_full = len(self._guesses) >= settings.GUESS_BUFFER_MAX_SIZE
+            self._ensure_flusher()
+        if is_full or self._is_stale():
+            self.flush()
+        return True
+
+    def pending_for(self, user_id: int, puzzle_id: int) -> list[Guess]:
+        """Return the buffered guesses by a team for a puzzle."""
+        with self._lock:
+            return [
+                guess
+                for guess in self._guesses
+                if guess.user_id == user_id and guess.puzzle_id == puzzle_id
+            ]
+
+    def flush(self) -> int:
+        """Write all buffered guesses to the database. Returns the number of guesses written.
+        If the write fails, the guesses are kept in the buffer to be retried, until they've
+        failed GUESS_BUFFER_MAX_RETRIES times, after which they're written one at a time. A write
+        that fails because of a duplicate guess isn't retried."""
+        with self._lock:
+            guesses, self._guesses = self._guesses, []
+            keys, self._keys = self._keys, set()
+            self._oldest = None
+        if not guesses:
+            return 0
+        try:
+            _write(guesses)
+        except IntegrityError:
+            logger.info(
+                "Buffered guesses conflict with saved guesses, writing them one at a time."
+            )
+            with self._lock:
+                self._num_failures = 0
+            num_written = _write_each(guesses)
+        except Exception:
+            with self._lock:
+                self._num_failures += 1
+                if self._num_failures <= settings.GUESS_BUFFER_MAX_RETRIES:
+                    self._guesses[:0] = guesses
+                    self._keys |= keys
+                    self._oldest = time.monotonic()
+                    should_retry = True
+                else:
+                    self._num_failures = 0
+                    should_retry = False
+            if should_retry:
+                logger.exception("Failed to flush {n} buffered guesses.", n=len(guesses))
+                return 0
+            logger.exception(
+                "Failed to flush {n} buffered guesses, writing them one at a time.",
+                n=len(guesses),
+            )
+            num_written = _write_each(guesses)
+        else:
+            with self._lock:
+                self._num_failures = 0
+            num_written = len(guesses)
+        logger.debug("Flushed {n} buffered guesses.", n=num_written)
+        return num_written
+
+    def close(self):
+        """Stop the background flusher thread and flush any remaining guesses."""
+        self._stop.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        self._flusher = None
+        self.flush()
+        self._stop.clear()
+
+    def _is_stale(self) -> bool:
+        oldest = self._oldest
+        return oldest is not None and time.monotonic() - oldest >= settings.GUESS_BUFFER_MAX_AGE
+
+    def _ensure_flusher(self):
+        # Started lazily so that it runs in the worker process rather than a pre-fork parent
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(
+                target=self._run_flusher, name="guess-buffer-flusher", daemon=True
+            )
+            self._flusher.start()
+
+    def _run_flusher(self):
+        while not self._stop.wait(settings.GUESS_BUFFER_MAX_AGE / 2):
+            if self._is_stale():
+                close_old_connections()
+                self.flush()
+                close_old_connections()
+
+
+guess_buffer = GuessBuffer()
+atexit.register(guess_buffer.close)
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def delete_duplicate_guesses(apps, schema_editor):
+    """Delete duplicate guesses created by concurrent submissions, keeping the earliest one."""
+    Guess = apps.get_model("puzzles", "Guess")
+    duplicates = (
+        Guess.objects.values("user", "puzzle", "text_normalized")
+        .annotate(min_id=models.Min("id"), count=models.Count("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        Guess.objects.filter(
+            user=duplicate["user"],
+            puzzle=duplicate["puzzle"],
+            text_normalized=duplicate["text_normalized"],
+            id__gt=duplicate["min_id"],
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0008_puzzle_solution_pdf_url'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_guesses, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='guess',
+            constraint=models.UniqueConstraint(fields=('user', 'puzzle', 'text_normalized'), name='unique_guess_per_user_puzzle'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0009_guess_unique_guess_per_user_puzzle'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='guess',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
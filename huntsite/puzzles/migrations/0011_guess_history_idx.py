@@ -0,0 +1,19 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0010_guess_created_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='guess',
+            index=models.Index(fields=['user', 'puzzle', '-created_at', '-id'], name='guess_history_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_puzzle_stats(apps, schema_editor):
+    """Count existing solves and guesses. Equivalent to the rebuild_puzzle_stats command."""
+    Puzzle = apps.get_model("puzzles", "Puzzle")
+    PuzzleStats = apps.get_model("puzzles", "PuzzleStats")
+    counted = {"user__is_active": True, "user__is_staff": False, "user__is_tester": False}
+    stats = []
+    for puzzle in Puzzle.objects.all():
+        guesses = puzzle.guess_set.filter(**counted)
+        stats.append(
+            PuzzleStats(
+                puzzle=puzzle,
+                num_solves=puzzle.solve_set.filter(**counted).count(),
+                num_guesses=guesses.count(),
+                num_incorrect_guesses=guesses.filter(evaluation="incorrect").count(),
+            )
+        )
+    PuzzleStats.objects.bulk_create(stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0011_guess_history_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PuzzleStats',
+            fields=[
+                ('puzzle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='puzzles.puzzle')),
+                ('num_solves', models.PositiveIntegerField(default=0)),
+                ('num_guesses', models.PositiveIntegerField(default=0)),
+                ('num_incorrect_guesses', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Puzzle Stats',
+            },
+        ),
+        migrations.RunPython(populate_puzzle_stats, migrations.RunPython.noop),
+    ]
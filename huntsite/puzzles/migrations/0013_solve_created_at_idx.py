@@ -0,0 +1,19 @@
+# Generated by Django 5.0.4 on 2026-10-18 11:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0012_puzzlestats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='solve',
+            index=models.Index(fields=['created_at'], name='solve_created_at_idx'),
+        ),
+    ]
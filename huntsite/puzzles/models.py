@@ -1,9 +1,10 @@
 import datetime
+from functools import cached_property
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models import Count, Subquery, Value
+from django.db.models import F, Value
 from django.db.models.functions import Coalesce
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -61,34 +62,23 @@ class PuzzleQuerySet(models.QuerySet):
         return self.filter(available_at__lte=dt)
 
     def with_solve_stats(self):
-        solves_count = (
-            Solve.objects.filter(puzzle=models.OuterRef("pk"))
-            .filter(
-                user__is_active=True,
-                user__is_staff=False,
-                user__is_tester=False,
-            )
-            .values("puzzle")
-            .annotate(c=Count("*"))
-            .values("c")
-        )
-        return self.annotate(num_solves=Coalesce(Subquery(solves_count), Value(0)))
+        return self.annotate(num_solves=Coalesce("stats__num_solves", Value(0)))
 
     def with_guess_stats(
         self,
         annotate_name="num_guesses",
         filter_evaluations: list["GuessEvaluation"] | None = None,
     ):
-        guesses = Guess.objects.filter(puzzle=models.OuterRef("pk")).filter(
-            user__is_active=True,
-            user__is_staff=False,
-            user__is_tester=False,
-        )
-        if filter_evaluations is not None:
-            guesses = guesses.filter(evaluation__in=filter_evaluations)
-        guesses_count = guesses.values("puzzle").annotate(c=Count("*")).values("c")
-        annotation = {annotate_name: Coalesce(Subquery(guesses_count), Value(0))}
-        return self.annotate(**annotation)
+        """Annotates the number of guesses, or the number of incorrect guesses if
+        filter_evaluations is [GuessEvaluation.INCORRECT]. Other filters aren't supported, since
+        only those counts are kept in PuzzleStats."""
+        if filter_evaluations is None:
+            field = "stats__num_guesses"
+        elif set(filter_evaluations) == {GuessEvaluation.INCORRECT}:
+            field = "stats__num_incorrect_guesses"
+        else:
+            raise ValueError(f"Guess stats aren't kept for evaluations {filter_evaluations}.")
+        return self.annotate(**{annotate_name: Coalesce(field, Value(0))})
 
 
 class AvailablePuzzleManager(models.Manager):
@@ -136,6 +126,27 @@ class Puzzle(models.Model):
     def is_hints_available(self):
         return self.canned_hints_available_at and self.canned_hints_available_at <= timezone.now()
 
+    def _is_prefetched(self, related_name: str) -> bool:
+        return related_name in getattr(self, "_prefetched_objects_cache", {})
+
+    @cached_property
+    def errata_list(self) -> list["Erratum"]:
+        """The puzzle's errata, newest first. Uses the rows loaded by with_errata() if it was
+        used, unlike errata.exists() and errata.first(), which always query."""
+        if self._is_prefetched("errata"):
+            return list(self.errata.all())
+        return list(self.errata.order_by("-published_at"))
+
+    @cached_property
+    def canned_hint_list(self) -> list["CannedHint"]:
+        """The puzzle's canned hints that are available, in order. Uses the rows loaded by
+        with_canned_hints() if it was used, which may be as of a time traveled to."""
+        if self._is_prefetched("canned_hints"):
+            return list(self.canned_hints.all())
+        if not self.is_hints_available:
+            return []
+        return list(self.canned_hints.order_by("order_by"))
+
     def get_absolute_url(self):
         """Returns the URL for the detail page of the puzzle."""
         return reverse("puzzle_detail", kwargs={"slug": self.slug})
@@ -261,11 +272,25 @@ class Guess(models.Model):
     text_normalized = models.CharField(max_length=255, editable=False)
     evaluation = models.CharField(max_length=255, choices=GuessEvaluation, editable=False)
 
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set on instantiation rather than on save so that buffered guesses keep their submission time
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Guesses"
+        constraints = [
+            # Enforces "already submitted" at the database level so that concurrent submissions
+            # by members of the same team can't create duplicate guesses
+            models.UniqueConstraint(
+                fields=["user", "puzzle", "text_normalized"], name="unique_guess_per_user_puzzle"
+            ),
+        ]
+        indexes = [
+            # Keyset pagination of a team's guess history for a puzzle
+            models.Index(
+                fields=["user", "puzzle", "-created_at", "-id"], name="guess_history_idx"
+            ),
+        ]
 
     @property
     def display_evaluation(self):
@@ -311,6 +336,10 @@ class Solve(models.Model):
 
     class Meta:
         unique_together = ("user", "puzzle")
+        indexes = [
+            # For replaying solves since a leaderboard snapshot
+            models.Index(fields=["created_at"], name="solve_created_at_idx"),
+        ]
 
     def to_dict(self):
         """Returns a dictionary representation of the Solve object that can be serialized as
@@ -338,6 +367,44 @@ class Finish(models.Model):
         return f"{self.user.team_name} - {self.created_at}"
 
 
+class PuzzleStatsQuerySet(models.QuerySet):
+    def increment(self, puzzle_id: int, **counts: int):
+        """Atomically add to a puzzle's counters, creating its stats if they don't exist."""
+        updates = {field: F(field) + count for field, count in counts.items() if count}
+        if not updates:
+            return
+        if not self.filter(pk=puzzle_id).update(**updates):
+            self.bulk_create([PuzzleStats(puzzle_id=puzzle_id)], ignore_conflicts=True)
+            self.filter(pk=puzzle_id).update(**updates)
+
+
+class PuzzleStats(models.Model):
+    """Denormalized solve and guess counts for a puzzle. Only solves and guesses by active,
+    non-staff, non-tester teams are counted. Counters are incremented as guesses are submitted,
+    and recomputed from scratch by the rebuild_puzzle_stats task, which is queued when teams are
+    deactivated, and by the management command of the same name."""
+
+    puzzle = models.OneToOneField(
+        Puzzle, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    num_solves = models.PositiveIntegerField(default=0)
+    num_guesses = models.PositiveIntegerField(default=0)
+    num_incorrect_guesses = models.PositiveIntegerField(default=0)
+
+    objects = PuzzleStatsQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = "Puzzle Stats"
+
+    def __str__(self):
+        return f"{self.puzzle.title} - {self.num_solves} solves - {self.num_guesses} guesses"
+
+    @staticmethod
+    def counts_user(user) -> bool:
+        """Whether a team's solves and guesses are counted in puzzle stats."""
+        return user.is_active and not user.is_staff and not user.is_tester
+
+
 class AdventCalendarEntry(models.Model):
     puzzle = models.OneToOneField(
         Puzzle, on_delete=models.CASCADE, primary_key=True, related_name="calendar_entry"
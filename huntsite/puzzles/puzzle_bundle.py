@@ -0,0 +1,161 @@
+"""Cached bundles of the content shown on a puzzle's detail page.
+
+Everything on the detail page other than a team's guesses is the same for every team, so it is
+loaded once into an immutable PuzzleBundle, with canned hints pre-rendered from Markdown, and
+stored in the configured Django cache keyed by puzzle id. Together with the answer index, which
+maps the slug to the puzzle's id and availability, a detail page is assembled from one cache
+read plus the query for the team's guesses.
+
+Bundles hold canned hints even before they're available, and with_hints_as_of() drops them
+until then, so that the same bundle serves both sides of the hints release time and testers
+time traveling across it. Bundles are deleted by saves and deletes of the puzzle and of its
+errata, external links, clipboard data, and canned hints. Changes that don't send signals, like
+queryset updates, are picked up when the bundle expires after BUNDLE_CACHE_TIMEOUT.
+"""
+
+import datetime
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.safestring import SafeString, mark_safe
+
+from huntsite.puzzles.models import CannedHint, ClipboardData, Erratum, ExternalLink, Puzzle
+
+BUNDLE_CACHE_TIMEOUT = 60 * 60  # seconds
+
+
+class BundleErratum(NamedTuple):
+    text: str
+    published_at: datetime.datetime
+
+
+class BundleExternalLink(NamedTuple):
+    url: str
+    description: str
+    html: SafeString
+
+
+class BundleCannedHint(NamedTuple):
+    keywords_html: SafeString
+    text_html: SafeString
+
+
+class PuzzleBundle(NamedTuple):
+    puzzle_id: int
+    slug: str
+    title: str
+    pdf_url: str
+    available_at: datetime.datetime
+    canned_hints_available_at: datetime.datetime | None
+    errata: tuple[BundleErratum, ...]
+    """Newest first."""
+    external_links: tuple[BundleExternalLink, ...]
+    clipboard_text: str | None
+    canned_hints: tuple[BundleCannedHint, ...]
+
+    @property
+    def is_available(self):
+        return self.available_at <= timezone.now()
+
+    @property
+    def latest_erratum(self) -> BundleErratum | None:
+        return self.errata[0] if self.errata else None
+
+    def get_solution_absolute_url(self):
+        return reverse("puzzle_solution", kwargs={"slug": self.slug})
+
+    def with_hints_as_of(self, as_of: datetime.datetime | None = None) -> "PuzzleBundle":
+        """Return the bundle with its canned hints if they're available as of the given time,
+        by default now, and without them otherwise."""
+        as_of = as_of or timezone.now()
+        if self.canned_hints_available_at and self.canned_hints_available_at <= as_of:
+            return self
+        return self._replace(canned_hints=())
+
+
+def _cache_key(puzzle_id: int) -> str:
+    return f"puzzles:bundle:{puzzle_id}"
+
+
+def _load_bundle(puzzle_id: int) -> PuzzleBundle | None:
+    puzzle = (
+        Puzzle.objects.with_errata()
+        .with_clipboard_data()
+        .with_external_links()
+        # Every hint, since whether they're shown is decided when the bundle is used
+        .prefetch_related(
+            Prefetch("canned_hints", queryset=CannedHint.objects.order_by("order_by"))
+        )
+        .filter(pk=puzzle_id)
+        .first()
+    )
+    if puzzle is None:
+        return None
+    clipboard_data = getattr(puzzle, "clipboard_data", None)
+    return PuzzleBundle(
+        puzzle_id=puzzle.pk,
+        slug=puzzle.slug,
+        title=puzzle.title,
+        pdf_url=puzzle.pdf_url,
+        available_at=puzzle.available_at,
+        canned_hints_available_at=puzzle.canned_hints_available_at,
+        errata=tuple(
+            BundleErratum(text=erratum.text, published_at=erratum.published_at)
+            for erratum in puzzle.errata_list
+        ),
+        external_links=tuple(
+            # Link HTML is entered by organizers and displayed unescaped, as in templates
+            BundleExternalLink(
+                url=link.url, description=link.description, html=mark_safe(link.html)
+            )
+            for link in puzzle.external_links.all()
+        ),
+        clipboard_text=clipboard_data.text if clipboard_data else None,
+        canned_hints=tuple(
+            BundleCannedHint(
+                keywords_html=mark_safe(hint.render_keywords()),
+                text_html=mark_safe(hint.render_text()),
+            )
+            for hint in puzzle.canned_hint_list
+        ),
+    )
+
+
+def get_bundle(puzzle_id: int) -> PuzzleBundle | None:
+    """Return the bundle for the puzzle with the given id, or None if no such puzzle exists.
+    Takes one cache lookup, plus four queries if the bundle isn't cached."""
+    key = _cache_key(puzzle_id)
+    bundle = cache.get(key)
+    if bundle is None:
+        bundle = _load_bundle(puzzle_id)
+        if bundle is not None:
+            cache.set(key, bundle, timeout=BUNDLE_CACHE_TIMEOUT)
+    return bundle
+
+
+def invalidate(puzzle_id: int):
+    """Delete the cached bundle for the puzzle with the given id."""
+    cache.delete(_cache_key(puzzle_id))
+
+
+@receiver(post_save, sender=Puzzle)
+@receiver(post_delete, sender=Puzzle)
+@receiver(post_save, sender=Erratum)
+@receiver(post_delete, sender=Erratum)
+@receiver(post_save, sender=ExternalLink)
+@receiver(post_delete, sender=ExternalLink)
+@receiver(post_save, sender=ClipboardData)
+@receiver(post_delete, sender=ClipboardData)
+@receiver(post_save, sender=CannedHint)
+@receiver(post_delete, sender=CannedHint)
+def invalidate_puzzle_bundle(sender, instance, **kwargs):
+    puzzle_id = instance.pk if sender is Puzzle else instance.puzzle_id
+    # Invalidate again after commit so that no request can cache pre-commit data
+    invalidate(puzzle_id)
+    transaction.on_commit(lambda: invalidate(puzzle_id))
@@ -0,0 +1,171 @@
+"""Cache of the available puzzles, which only changes when puzzles are released.
+
+Puzzle.available filters on the current time, so its results can't be cached as they are. But
+the set of available puzzles only changes at the puzzles' available_at times, so it is cached in
+the configured Django cache along with the next release time, with a timeout that expires it at
+that release. Entries are also treated as expired once the next release time has passed, so a
+puzzle is never listed late because of the cache backend's timeout resolution.
+
+So that the first requests after a release don't all query at once, the state after a release
+can be built ahead of time with prewarm(), which the prewarm_releases management command does
+shortly before each release. The prewarmed state is stored under its own key, and swapped in by
+the first request to find the current state expired.
+
+The cached puzzles have their calendar entries, metapuzzle info, and attributions entries
+loaded. The cache is invalidated by saves and deletes of Puzzle, MetapuzzleInfo, and
+PuzzleAttributionsEntry objects and by saves of AdventCalendarEntry objects. Changes that don't
+send signals are picked up after at most AVAILABLE_PUZZLES_CACHE_TIMEOUT.
+"""
+
+import datetime
+import math
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from huntsite.puzzles.models import (
+    AdventCalendarEntry,
+    MetapuzzleInfo,
+    Puzzle,
+    PuzzleAttributionsEntry,
+)
+
+AVAILABLE_PUZZLES_CACHE_KEY = "puzzles:release_schedule:available"
+NEXT_RELEASE_AT_CACHE_KEY = "puzzles:release_schedule:next_release_at"
+INVALIDATED_AT_CACHE_KEY = "puzzles:release_schedule:invalidated_at"
+AVAILABLE_PUZZLES_CACHE_TIMEOUT = 60 * 60  # seconds
+
+
+class AvailablePuzzles(NamedTuple):
+    puzzles: list[Puzzle]
+    """Available puzzles, in order of calendar day."""
+    next_release_at: datetime.datetime | None
+    """When the next puzzle is released, or None if every puzzle has been."""
+
+    def is_current(self, now: datetime.datetime) -> bool:
+        return self.next_release_at is None or now < self.next_release_at
+
+
+def _load(now: datetime.datetime) -> AvailablePuzzles:
+    # There are few puzzles, so unreleased ones are loaded too to find the next release time
+    # without another query
+    puzzles = (
+        Puzzle.objects.with_calendar_entry()
+        .with_meta_info()
+        .with_attributions_entry()
+        .order_by("calendar_entry__day")
+    )
+    available = []
+    next_release_at = None
+    for puzzle in puzzles:
+        if puzzle.available_at <= now:
+            available.append(puzzle)
+        elif next_release_at is None or puzzle.available_at < next_release_at:
+            next_release_at = puzzle.available_at
+    return AvailablePuzzles(puzzles=available, next_release_at=next_release_at)
+
+
+def _prewarmed_cache_key(release_at: datetime.datetime) -> str:
+    return f"{AVAILABLE_PUZZLES_CACHE_KEY}:{release_at.timestamp()}"
+
+
+def _set(available: AvailablePuzzles, now: datetime.datetime):
+    timeout = AVAILABLE_PUZZLES_CACHE_TIMEOUT
+    if available.next_release_at is not None:
+        until_release = (available.next_release_at - now).total_seconds()
+        timeout = min(timeout, max(math.ceil(until_release), 1))
+    cache.set(AVAILABLE_PUZZLES_CACHE_KEY, available, timeout=timeout)
+    # Kept past the release, to find its prewarmed puzzles once the puzzles above expire
+    cache.set(
+        NEXT_RELEASE_AT_CACHE_KEY,
+        available.next_release_at,
+        timeout=AVAILABLE_PUZZLES_CACHE_TIMEOUT,
+    )
+
+
+def _get_prewarmed(
+    release_at: datetime.datetime, now: datetime.datetime
+) -> AvailablePuzzles | None:
+    prewarmed = cache.get(_prewarmed_cache_key(release_at))
+    if prewarmed is None:
+        return None
+    built_at, available = prewarmed
+    invalidated_at = cache.get(INVALIDATED_AT_CACHE_KEY)
+    if invalidated_at is not None and built_at <= invalidated_at:
+        return None
+    return available if available.is_current(now) else None
+
+
+def _get() -> AvailablePuzzles:
+    now = timezone.now()
+    cached = cache.get_many([AVAILABLE_PUZZLES_CACHE_KEY, NEXT_RELEASE_AT_CACHE_KEY])
+    available = cached.get(AVAILABLE_PUZZLES_CACHE_KEY)
+    if available is not None and available.is_current(now):
+        return available
+    available = None
+    release_at = cached.get(NEXT_RELEASE_AT_CACHE_KEY)
+    if release_at is not None and release_at <= now:
+        # The release that expired the cached puzzles may have been prewarmed
+        available = _get_prewarmed(release_at, now)
+    if available is None:
+        available = _load(now)
+    _set(available, now)
+    return available
+
+
+def available_puzzles() -> list[Puzzle]:
+    """Return the puzzles available now, in order of calendar day, with their calendar entries,
+    metapuzzle info, and attributions entries loaded. Takes one cache lookup, plus one query
+    after a release that wasn't prewarmed or a change to the puzzles."""
+    return _get().puzzles
+
+
+def next_release_at() -> datetime.datetime | None:
+    """Return when the next puzzle is released, or None if every puzzle has been."""
+    return _get().next_release_at
+
+
+def upcoming_releases(now: datetime.datetime | None = None) -> list[datetime.datetime]:
+    """Return the times after now at which puzzles or their canned hints are released, in
+    order."""
+    now = now or timezone.now()
+    puzzle_releases = Puzzle.objects.filter(available_at__gt=now).values_list(
+        "available_at", flat=True
+    )
+    hint_releases = Puzzle.objects.filter(canned_hints_available_at__gt=now).values_list(
+        "canned_hints_available_at", flat=True
+    )
+    return sorted(set(puzzle_releases) | set(hint_releases))
+
+
+def prewarm(release_at: datetime.datetime) -> AvailablePuzzles:
+    """Build the available puzzles as of release_at, to be swapped in once the release time
+    has passed. Prewarmed puzzles are discarded if the cache is invalidated after they're
+    built."""
+    built_at = timezone.now()
+    available = _load(release_at)
+    timeout = (release_at - built_at).total_seconds() + AVAILABLE_PUZZLES_CACHE_TIMEOUT
+    cache.set(_prewarmed_cache_key(release_at), (built_at, available), timeout=math.ceil(timeout))
+    return available
+
+
+def invalidate():
+    cache.set(INVALIDATED_AT_CACHE_KEY, timezone.now(), timeout=AVAILABLE_PUZZLES_CACHE_TIMEOUT)
+    cache.delete(AVAILABLE_PUZZLES_CACHE_KEY)
+
+
+@receiver(post_save, sender=Puzzle)
+@receiver(post_delete, sender=Puzzle)
+@receiver(post_save, sender=MetapuzzleInfo)
+@receiver(post_delete, sender=MetapuzzleInfo)
+@receiver(post_save, sender=PuzzleAttributionsEntry)
+@receiver(post_delete, sender=PuzzleAttributionsEntry)
+@receiver(post_save, sender=AdventCalendarEntry)
+def invalidate_available_puzzles(sender, **kwargs):
+    # Invalidate again after commit so that no request can cache pre-commit data
+    invalidate()
+    transaction.on_commit(invalidate)
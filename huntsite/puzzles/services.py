@@ -1,77 +1,261 @@
-from typing import Iterable
+import datetime
+from typing import Iterable, NamedTuple
 
-from django.db import transaction
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
 from loguru import logger
 
-from huntsite.puzzles.models import Finish, Guess, GuessEvaluation, Puzzle, Solve
-from huntsite.puzzles.utils import normalize_answer
-from huntsite.teams.models import User
+from huntsite.puzzles import answer_index, puzzle_bundle, release_schedule, solved_puzzles
+from huntsite.puzzles.answer_index import AnswerIndexEntry
+from huntsite.puzzles.guess_buffer import guess_buffer
+from huntsite.puzzles.models import Finish, Guess, GuessEvaluation, Puzzle, PuzzleStats, Solve
+from huntsite.puzzles.utils import clean_answer, normalize_answer
+from huntsite.teams import leaderboard_etag
+from huntsite.teams.models import LeaderboardEntry, User
 
-ALREADY_SUBMITTED = object()
-"""Sentinel object to indicate that a guess has already been submitted."""
+GUESS_LIST_PAGE_SIZE = 25
+"""Number of guesses per page of a team's guess history for a puzzle."""
 
 
-def guess_list_for_puzzle_and_user(puzzle: Puzzle, user: User) -> Iterable[Guess]:
-    """Function to return all guesses for a puzzle by a team."""
-    return Guess.objects.filter(puzzle=puzzle, user=user).order_by("-created_at")
+def guess_list_for_puzzle_and_user(puzzle: Puzzle | int, user: User) -> Iterable[Guess]:
+    """Function to return all guesses for a puzzle by a team, including any that are waiting in
+    the guess buffer."""
+    guesses = Guess.objects.filter(puzzle=puzzle, user=user).order_by("-created_at")
+    puzzle_id = puzzle.pk if isinstance(puzzle, Puzzle) else puzzle
+    if pending := guess_buffer.pending_for(user.pk, puzzle_id):
+        return sorted([*pending, *guesses], key=lambda guess: guess.created_at, reverse=True)
+    return guesses
 
 
-@transaction.atomic
-def guess_submit(puzzle: Puzzle, user: User, guess_text: str) -> GuessEvaluation:
-    """Function to handle the submission of a guess to a puzzle."""
+class GuessPage(NamedTuple):
+    guesses: list[Guess]
+    next_cursor: str | None
+    """Cursor for the next page of older guesses, or None if this is the last page."""
+
+
+def _encode_guess_cursor(guess: Guess) -> str:
+    return f"{guess.created_at.isoformat()}_{guess.id}"
+
+
+def _decode_guess_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    """Raises ValueError if the cursor is malformed."""
+    created_at, _, guess_id = cursor.rpartition("_")
+    return datetime.datetime.fromisoformat(created_at), int(guess_id)
+
+
+def guess_page_for_puzzle_and_user(
+    puzzle: Puzzle | int,
+    user: User,
+    cursor: str | None = None,
+    page_size: int = GUESS_LIST_PAGE_SIZE,
+) -> GuessPage:
+    """Function to return a page of a team's guesses for a puzzle, newest first. Pages are
+    keyset-paginated on (created_at, id), so each page costs the same however many guesses the
+    team has made. Guesses waiting in the guess buffer are merged into the first page; any older
+    than the rest of it are listed once they're written.
+
+    Raises ValueError if the cursor is malformed.
+    """
+    guesses = Guess.objects.filter(puzzle=puzzle, user=user).order_by("-created_at", "-id")
+    if cursor is None:
+        puzzle_id = puzzle.pk if isinstance(puzzle, Puzzle) else puzzle
+        pending = guess_buffer.pending_for(user.pk, puzzle_id)
+    else:
+        created_at, guess_id = _decode_guess_cursor(cursor)
+        guesses = guesses.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=guess_id)
+        )
+        pending = []
+    saved = list(guesses[: page_size + 1])
+    # Buffered guesses have no id yet, and were saved after any guesses made at the same time
+    merged = sorted(
+        [*pending, *saved],
+        key=lambda guess: (guess.created_at, guess.id is None, guess.id or 0),
+        reverse=True,
+    )[:page_size]
+    kept = [guess for guess in merged if guess.id is not None]
+    if len(kept) == len(saved):
+        next_cursor = None
+    elif kept:
+        next_cursor = _encode_guess_cursor(kept[-1])
+    else:
+        # Buffered guesses filled the page, so the next page starts with the newest saved guess
+        next_cursor = f"{saved[0].created_at.isoformat()}_{saved[0].id + 1}"
+    return GuessPage(guesses=merged, next_cursor=next_cursor)
+
+
+def guess_submit(puzzle: Puzzle | AnswerIndexEntry, user: User, guess_text: str) -> Guess | None:
+    """Function to handle the submission of a guess to a puzzle. The puzzle can be given either
+    as a Puzzle instance or as its answer index entry; grading always uses the answer index, so
+    it doesn't need to query the puzzle. Returns the saved or buffered guess, or None if the team
+    already submitted it.
+
+    Submission is idempotent: duplicate guesses are detected by the database's unique constraint
+    on (user, puzzle, text_normalized) rather than by a separate lookup, so concurrent submissions
+    of the same guess by members of the same team can't both be recorded.
+
+    If GUESS_BUFFER_ENABLED is set, incorrect guesses are written behind via the guess buffer.
+    Correct and keep-going guesses are always committed immediately.
+    """
+    if isinstance(puzzle, Puzzle):
+        entry = answer_index.get_entry(puzzle.slug)
+    else:
+        entry = puzzle
     logger.trace(
         "Team '{user.team_name}' submitted guess for puzzle {puzzle}: {guess}",
         user=user,
-        puzzle=puzzle,
+        puzzle=entry.title,
         guess=guess_text,
     )
     guess_text_normalized = normalize_answer(guess_text)
-
-    # Check if guess already exists
-    if Guess.objects.filter(
-        user=user, puzzle=puzzle, text_normalized=guess_text_normalized
-    ).exists():
-        logger.trace("Guess was 'already_submitted'.")
-        return ALREADY_SUBMITTED
-
-    if guess_text_normalized == puzzle.answer_normalized:
-        evaluation = GuessEvaluation.CORRECT
-    elif guess_text_normalized in puzzle.keep_going_answers_normalized:
-        evaluation = GuessEvaluation.KEEP_GOING
-    else:
-        evaluation = GuessEvaluation.INCORRECT
-
-    logger.trace("Guess was '{evaluation}'.", evaluation=evaluation)
+    evaluation = entry.evaluate(guess_text_normalized)
 
     guess = Guess(
         user=user,
-        puzzle=puzzle,
-        text=guess_text,
+        puzzle_id=entry.puzzle_id,
+        text=clean_answer(guess_text),
         text_normalized=guess_text_normalized,
         evaluation=evaluation,
     )
-    guess.full_clean()
-    guess.save()
+    if evaluation == GuessEvaluation.INCORRECT and settings.GUESS_BUFFER_ENABLED:
+        return _buffer_guess(guess)
+
+    try:
+        with transaction.atomic():
+            guess.save(force_insert=True)
+            is_new_solve = evaluation == GuessEvaluation.CORRECT and _record_solve(entry, user)
+            if PuzzleStats.counts_user(user):
+                # A team that already solved the puzzle can guess a changed answer correctly
+                # again, which isn't another solve
+                PuzzleStats.objects.increment(
+                    entry.puzzle_id,
+                    num_solves=int(is_new_solve),
+                    num_guesses=1,
+                    num_incorrect_guesses=int(evaluation == GuessEvaluation.INCORRECT),
+                )
+    except IntegrityError:
+        logger.trace("Guess was 'already_submitted'.")
+        return None
+
+    logger.trace("Guess was '{evaluation}'.", evaluation=evaluation)
+    return guess
 
-    if evaluation == GuessEvaluation.CORRECT:
-        solve = Solve(user=user, puzzle=puzzle)
-        solve.full_clean()
-        solve.save()
 
-        logger.info("Team '{user.team_name}' solved puzzle '{puzzle}'!", user=user, puzzle=puzzle)
+def _buffer_guess(guess: Guess) -> Guess | None:
+    """Add an incorrect guess to the guess buffer. Duplicates are checked against both the
+    database and the buffer. Returns the guess, or None if it's a duplicate."""
+    is_saved = Guess.objects.filter(
+        user=guess.user, puzzle_id=guess.puzzle_id, text_normalized=guess.text_normalized
+    ).exists()
+    if is_saved or not guess_buffer.add(guess):
+        logger.trace("Guess was 'already_submitted'.")
+        return None
+    logger.trace("Guess was '{evaluation}' (buffered).", evaluation=guess.evaluation)
+    return guess
+
 
-        if hasattr(puzzle, "meta_info") and puzzle.meta_info.is_final:
-            finish = Finish(user=user)
-            finish.full_clean()
-            finish.save()
-            user.is_finished = True
-            user.save()
+def _record_solve(entry: AnswerIndexEntry, user: User) -> bool:
+    """Record a solve (and a finish, if the puzzle is the final metapuzzle). Inserts ignore
+    conflicts so that a solve that was already recorded is left as is. Returns whether the solve
+    is new, which it isn't if the team solved the puzzle before its answer was changed."""
+    if Solve.objects.filter(user=user, puzzle_id=entry.puzzle_id).exists():
+        return False
+    Solve.objects.bulk_create([Solve(user=user, puzzle_id=entry.puzzle_id)], ignore_conflicts=True)
+    LeaderboardEntry.objects.record_solve(
+        user.pk, day=entry.day, is_meta=entry.is_meta, is_final=entry.is_final
+    )
+    # Inserted without signals, so the caches that depend on solves are invalidated here
+    solved_puzzles.invalidate(user.pk)
+    leaderboard_etag.invalidate()
+    logger.info("Team '{user.team_name}' solved puzzle '{puzzle}'!", user=user, puzzle=entry.title)
 
-            logger.info("Team {user.team_name} finished the hunt!", user=user)
+    if entry.is_final:
+        Finish.objects.bulk_create([Finish(user=user)], ignore_conflicts=True)
+        User.objects.filter(pk=user.pk).update(is_finished=True)
+        user.is_finished = True
 
-    return evaluation
+        logger.info("Team {user.team_name} finished the hunt!", user=user)
+    return True
 
 
 def solve_list_for_user(user: User) -> Iterable[Solve]:
     """Function to return all solves by a team."""
     return user.solve_set.order_by("-created_at")
+
+
+def solved_puzzle_ids_for_user(user: User) -> set[int]:
+    """Function to return the ids of the puzzles a team has solved."""
+    return set(solved_puzzles.get_solved_puzzles(user).puzzle_ids)
+
+
+def puzzle_stats_by_puzzle_id() -> dict[int, PuzzleStats]:
+    """Function to return every puzzle's stats, keyed by puzzle id. Puzzles without guesses may
+    have no stats."""
+    return {stats.puzzle_id: stats for stats in PuzzleStats.objects.all()}
+
+
+def release_prewarm(release_at: datetime.datetime) -> int:
+    """Build the caches that a release of puzzles or canned hints at release_at changes, ahead of
+    the release: the available puzzles as of the release, and the bundles of the puzzles being
+    released. Returns the number of puzzles released."""
+    release_schedule.prewarm(release_at)
+    puzzle_ids = list(
+        Puzzle.objects.filter(
+            Q(available_at=release_at) | Q(canned_hints_available_at=release_at)
+        ).values_list("pk", flat=True)
+    )
+    for puzzle_id in puzzle_ids:
+        puzzle_bundle.get_bundle(puzzle_id)
+    logger.info(
+        "Prewarmed caches for the release of {n} puzzles at {release_at}.",
+        n=len(puzzle_ids),
+        release_at=release_at,
+    )
+    return len(puzzle_ids)
+
+
+def puzzle_stats_rebuild() -> int:
+    """Recompute PuzzleStats for all puzzles from the Solve and Guess tables. Returns the number
+    of puzzles updated.
+
+    The existing stats rows are locked first, so guesses submitted during the rebuild either
+    are counted by it or increment its results afterwards.
+    """
+    counted = {"user__is_active": True, "user__is_staff": False, "user__is_tester": False}
+    with transaction.atomic():
+        list(PuzzleStats.objects.select_for_update())
+        num_solves = dict(
+            Solve.objects.filter(**counted)
+            .values("puzzle")
+            .annotate(count=Count("*"))
+            .values_list("puzzle", "count")
+        )
+        guess_counts = {
+            row["puzzle"]: row
+            for row in Guess.objects.filter(**counted)
+            .values("puzzle")
+            .annotate(
+                num_guesses=Count("*"),
+                num_incorrect_guesses=Count("id", filter=Q(evaluation=GuessEvaluation.INCORRECT)),
+            )
+        }
+        stats = [
+            PuzzleStats(
+                puzzle_id=puzzle_id,
+                num_solves=num_solves.get(puzzle_id, 0),
+                num_guesses=guess_counts.get(puzzle_id, {}).get("num_guesses", 0),
+                num_incorrect_guesses=guess_counts.get(puzzle_id, {}).get(
+                    "num_incorrect_guesses", 0
+                ),
+            )
+            for puzzle_id in Puzzle.objects.values_list("id", flat=True)
+        ]
+        PuzzleStats.objects.bulk_create(
+            stats,
+            update_conflicts=True,
+            unique_fields=["puzzle"],
+            update_fields=["num_solves", "num_guesses", "num_incorrect_guesses"],
+        )
+    logger.info("Rebuilt puzzle stats for {n} puzzles.", n=len(stats))
+    return len(stats)
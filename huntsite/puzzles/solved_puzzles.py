@@ -0,0 +1,98 @@
+"""Cache of the puzzles each team has solved, shared by the views that show them.
+
+Each team's solved puzzles are loaded with one query and stored in the configured Django cache,
+along with whether the team has finished the hunt. A team's entry is deleted when it solves a
+puzzle, both by guess_submit(), whose solves are inserted without sending signals, and by saves
+and deletes of Solve and Finish objects, as well as saves of the team that can change whether it
+has finished. Changes that don't send signals are picked up after SOLVED_PUZZLES_CACHE_TIMEOUT.
+"""
+
+import datetime
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from huntsite.puzzles import answer_index
+from huntsite.puzzles.answer_index import AnswerIndexEntry
+from huntsite.puzzles.models import Finish, Solve
+from huntsite.teams.models import User
+
+SOLVED_PUZZLES_CACHE_TIMEOUT = 60 * 60  # seconds
+
+
+class SolveListEntry(NamedTuple):
+    puzzle: AnswerIndexEntry
+    created_at: datetime.datetime
+
+
+class SolvedPuzzles(NamedTuple):
+    solve_times: dict[int, datetime.datetime]
+    """When the team solved each puzzle it has solved, by puzzle id."""
+    is_finished: bool
+
+    @property
+    def puzzle_ids(self) -> frozenset[int]:
+        return frozenset(self.solve_times)
+
+    def solve_list(self) -> list[SolveListEntry]:
+        """The team's solves, newest first, with the solved puzzles' answer index entries."""
+        entries = {entry.puzzle_id: entry for entry in answer_index.get_entries()}
+        return sorted(
+            (
+                SolveListEntry(puzzle=entries[puzzle_id], created_at=created_at)
+                for puzzle_id, created_at in self.solve_times.items()
+                if puzzle_id in entries
+            ),
+            key=lambda solve: solve.created_at,
+            reverse=True,
+        )
+
+
+NO_SOLVED_PUZZLES = SolvedPuzzles(solve_times={}, is_finished=False)
+
+
+def _cache_key(user_id: int) -> str:
+    return f"puzzles:solved:{user_id}"
+
+
+def get_solved_puzzles(user: User) -> SolvedPuzzles:
+    """Return the puzzles the team has solved. Takes one cache lookup, plus one query if they
+    aren't cached."""
+    if user.is_anonymous:
+        return NO_SOLVED_PUZZLES
+    key = _cache_key(user.pk)
+    solved = cache.get(key)
+    if solved is None:
+        solved = SolvedPuzzles(
+            solve_times=dict(
+                Solve.objects.filter(user=user).values_list("puzzle_id", "created_at")
+            ),
+            is_finished=user.is_finished,
+        )
+        cache.set(key, solved, timeout=SOLVED_PUZZLES_CACHE_TIMEOUT)
+    return solved
+
+
+def invalidate(user_id: int):
+    """Delete the cached solved puzzles of the team with the given id, now and again after the
+    current transaction commits, so that no request can cache pre-commit data."""
+    key = _cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+@receiver(post_save, sender=Solve)
+@receiver(post_delete, sender=Solve)
+@receiver(post_save, sender=Finish)
+@receiver(post_delete, sender=Finish)
+def invalidate_solved_puzzles(sender, instance, **kwargs):
+    invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_solved_puzzles_on_user_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "is_finished" in update_fields:
+        invalidate(instance.pk)
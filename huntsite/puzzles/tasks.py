@@ -0,0 +1,7 @@
+from huntsite.puzzles import services as puzzle_services
+from huntsite.tasks.registry import register
+
+
+@register
+def rebuild_puzzle_stats() -> dict:
+    return {"num_puzzles": puzzle_services.puzzle_stats_rebuild()}
@@ -0,0 +1,75 @@
+from django.core.cache import cache
+from django.utils import timezone
+import pytest
+
+from huntsite.puzzles import answer_index
+from huntsite.puzzles.factories import MetapuzzleInfoFactory, PuzzleFactory
+from huntsite.puzzles.models import GuessEvaluation, Puzzle
+
+pytestmark = pytest.mark.django_db
+
+
+def test_answer_index_entry():
+    """Answer index entries should grade guesses like the puzzle would."""
+    puzzle = PuzzleFactory(
+        answer="SUPER SECRET ANSWER",
+        keep_going_answers=["KEEP GOING", "STAY THE COURSE"],
+        available_at=timezone.now() + timezone.timedelta(days=1),
+    )
+    entry = answer_index.get_entry(puzzle.slug)
+    assert entry.puzzle_id == puzzle.id
+    assert not entry.is_available
+    assert not entry.is_final
+    assert entry.evaluate("SUPERSECRETANSWER") == GuessEvaluation.CORRECT
+    assert entry.evaluate("STAYTHECOURSE") == GuessEvaluation.KEEP_GOING
+    assert entry.evaluate("WRONGANSWER") == GuessEvaluation.INCORRECT
+
+    assert answer_index.get_entry("not-a-puzzle") is None
+
+
+def test_answer_index_no_queries_when_loaded(django_assert_num_queries):
+    """Once loaded, the answer index should be read without querying the database."""
+    puzzles = [PuzzleFactory() for _ in range(3)]
+    with django_assert_num_queries(1):
+        for puzzle in puzzles:
+            assert answer_index.get_entry(puzzle.slug).puzzle_id == puzzle.id
+    with django_assert_num_queries(0):
+        for puzzle in puzzles:
+            assert answer_index.get_entry(puzzle.slug).puzzle_id == puzzle.id
+        assert answer_index.get_entry("not-a-puzzle") is None
+
+
+def test_answer_index_invalidation():
+    """Saving a puzzle or its metapuzzle info should invalidate the answer index."""
+    puzzle = PuzzleFactory(answer="SUPER SECRET ANSWER")
+    assert answer_index.get_entry(puzzle.slug).answer_normalized == "SUPERSECRETANSWER"
+
+    puzzle.answer = "NEW ANSWER"
+    puzzle.keep_going_answers = ["KEEP GOING"]
+    puzzle.save()
+    entry = answer_index.get_entry(puzzle.slug)
+    assert entry.answer_normalized == "NEWANSWER"
+    assert entry.keep_going_answers_normalized == frozenset({"KEEPGOING"})
+
+    meta_info = MetapuzzleInfoFactory(puzzle=puzzle, is_final=True)
+    assert answer_index.get_entry(puzzle.slug).is_final
+    meta_info.delete()
+    assert not answer_index.get_entry(puzzle.slug).is_final
+
+    slug = puzzle.slug
+    puzzle.delete()
+    assert answer_index.get_entry(slug) is None
+
+
+def test_answer_index_cross_process_invalidation(settings):
+    """The answer index should be reloaded when another process bumps the shared version."""
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    puzzle = PuzzleFactory(answer="SUPER SECRET ANSWER")
+    assert answer_index.get_entry(puzzle.slug).answer_normalized == "SUPERSECRETANSWER"
+
+    # Simulate a change made in another process: the database and the shared version change,
+    # but this process's index isn't invalidated directly
+    Puzzle.objects.filter(pk=puzzle.pk).update(answer_normalized="NEWANSWER")
+    assert answer_index.get_entry(puzzle.slug).answer_normalized == "SUPERSECRETANSWER"
+    cache.set(answer_index.ANSWER_INDEX_VERSION_CACHE_KEY, "other-process")
+    assert answer_index.get_entry(puzzle.slug).answer_normalized == "NEWANSWER"
@@ -0,0 +1,264 @@
+import time
+
+import pytest
+
+from huntsite.puzzles import answer_index
+from huntsite.puzzles.factories import PuzzleFactory
+from huntsite.puzzles.guess_buffer import GuessBuffer, guess_buffer
+from huntsite.puzzles.models import Guess, GuessEvaluation, PuzzleStats, Solve
+from huntsite.puzzles.services import (
+    guess_list_for_puzzle_and_user,
+    guess_page_for_puzzle_and_user,
+    guess_submit,
+)
+from huntsite.teams.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def buffer_settings(settings):
+    settings.GUESS_BUFFER_ENABLED = True
+    settings.GUESS_BUFFER_MAX_SIZE = 3
+    settings.GUESS_BUFFER_MAX_AGE = 3600
+    yield settings
+    guess_buffer.close()
+
+
+@pytest.fixture
+def no_flusher(monkeypatch):
+    """Don't start the background flusher thread, which would write outside of the test's
+    transaction."""
+    monkeypatch.setattr(GuessBuffer, "_ensure_flusher", lambda self: None)
+
+
+def test_incorrect_guess_is_buffered(buffer_settings, no_flusher):
+    """Incorrect guesses should be graded immediately but written behind."""
+    puzzle = PuzzleFactory(answer="ANSWER")
+    user = UserFactory()
+
+    assert guess_submit(puzzle, user, "wrong").evaluation == GuessEvaluation.INCORRECT
+    assert not Guess.objects.exists()
+    assert len(guess_buffer) == 1
+
+    # Buffered guesses are still listed and still count as already submitted
+    assert [guess.text for guess in guess_list_for_puzzle_and_user(puzzle, user)] == ["WRONG"]
+    assert guess_submit(puzzle, user, "Wrong!") is None
+    assert len(guess_buffer) == 1
+
+    # Another team can submit the same guess
+    assert guess_submit(puzzle, UserFactory(), "wrong").evaluation == GuessEvaluation.INCORRECT
+    assert len(guess_buffer) == 2
+
+    assert guess_buffer.flush() == 2
+    assert Guess.objects.count() == 2
+    assert len(guess_buffer) == 0
+
+    # Duplicates of flushed guesses are detected by the database lookup
+    assert guess_submit(puzzle, user, "wrong") is None
+    assert len(guess_buffer) == 0
+
+
+def test_correct_and_keep_going_guesses_are_not_buffered(buffer_settings, no_flusher):
+    """Correct and keep-going guesses should be committed immediately, along with solves."""
+    puzzle = PuzzleFactory(answer="ANSWER", keep_going_answers=["ALMOST"])
+    user = UserFactory()
+
+    guess_submit(puzzle, user, "wrong")
+    assert guess_submit(puzzle, user, "almost").evaluation == GuessEvaluation.KEEP_GOING
+    assert guess_submit(puzzle, user, "answer").evaluation == GuessEvaluation.CORRECT
+    assert set(Guess.objects.values_list("text", flat=True)) == {"ALMOST", "ANSWER"}
+    assert Solve.objects.filter(user=user, puzzle=puzzle).exists()
+    assert len(guess_buffer) == 1
+
+    # Guesses are listed in submission order regardless of when they were written
+    guesses = guess_list_for_puzzle_and_user(puzzle, user)
+    assert [guess.text for guess in guesses] == ["ANSWER", "ALMOST", "WRONG"]
+    guess_buffer.flush()
+    guesses = guess_list_for_puzzle_and_user(puzzle, user)
+    assert [guess.text for guess in guesses] == ["ANSWER", "ALMOST", "WRONG"]
+
+
+def _guess_pages(puzzle, user, page_size):
+    pages = []
+    cursor = None
+    while True:
+        page = guess_page_for_puzzle_and_user(puzzle, user, cursor=cursor, page_size=page_size)
+        pages.append([guess.text for guess in page.guesses])
+        if page.next_cursor is None:
+            return pages
+        cursor = page.next_cursor
+
+
+def test_buffered_guesses_on_first_page(buffer_settings, no_flusher):
+    """Buffered guesses should be merged into the first page of a team's guess history."""
+    puzzle = PuzzleFactory(answer="ANSWER", keep_going_answers=["ALMOST", "NEARLY"])
+    user = UserFactory()
+    guess_submit(puzzle, user, "almost")
+    guess_submit(puzzle, user, "nearly")
+    guess_submit(puzzle, user, "wrong")
+
+    assert _guess_pages(puzzle, user, page_size=2) == [["WRONG", "NEARLY"], ["ALMOST"]]
+    # Pages filled by buffered guesses continue with the newest saved guess
+    assert _guess_pages(puzzle, user, page_size=1) == [["WRONG"], ["NEARLY"], ["ALMOST"]]
+
+
+def test_buffered_guess_before_correct_guess(buffer_settings, no_flusher):
+    """A buffered guess should be listed below saved guesses that were submitted after it."""
+    puzzle = PuzzleFactory(answer="ANSWER", keep_going_answers=["ALMOST"])
+    user = UserFactory()
+    guess_submit(puzzle, user, "almost")
+    guess_submit(puzzle, user, "wrong")
+    guess_submit(puzzle, user, "answer")
+
+    assert _guess_pages(puzzle, user, page_size=3) == [["ANSWER", "WRONG", "ALMOST"]]
+    assert _guess_pages(puzzle, user, page_size=2) == [["ANSWER", "WRONG"], ["ALMOST"]]
+
+
+def test_buffer_flushes_at_max_size(buffer_settings, no_flusher):
+    puzzle = PuzzleFactory(answer="ANSWER")
+    user = UserFactory()
+
+    guess_submit(puzzle, user, "one")
+    guess_submit(puzzle, user, "two")
+    assert not Guess.objects.exists()
+    guess_submit(puzzle, user, "three")
+    assert Guess.objects.count() == 3
+    assert len(guess_buffer) == 0
+    stats = PuzzleStats.objects.get(puzzle=puzzle)
+    assert (stats.num_guesses, stats.num_incorrect_guesses) == (3, 3)
+
+
+def test_buffer_flushes_at_max_age(buffer_settings, no_flusher, monkeypatch):
+    puzzle = PuzzleFactory(answer="ANSWER")
+    user = UserFactory()
+
+    guess_submit(puzzle, user, "one")
+    assert not Guess.objects.exists()
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + buffer_settings.GUESS_BUFFER_MAX_AGE)
+    guess_submit(puzzle, user, "two")
+    assert Guess.objects.count() == 2
+
+
+def test_buffered_guess_num_queries(buffer_settings, no_flusher, django_assert_num_queries):
+    """Buffering an incorrect guess should only take a duplicate lookup."""
+    puzzle = PuzzleFactory(answer="ANSWER")
+    user = UserFactory()
+    entry = answer_index.get_entry(puzzle.slug)
+
+    with django_assert_num_queries(1):
+        guess_submit(entry, user, "wrong")
+
+
+def test_flush_failure_keeps_guesses(buffer_settings, no_flusher, monkeypatch):
+    puzzle = PuzzleFactory(answer="ANSWER")
+    user = UserFactory()
+    guess_submit(puzzle, user, "one")
+
+    def bulk_create(*args, **kwargs):
+        raise RuntimeError("Database is down")
+
+    with monkeypatch.context() as m:
+        m.setattr(Guess.objects, "bulk_create", bulk_create)
+        assert guess_buffer.flush() == 0
+    assert len(guess_buffer) == 1
+    assert guess_submit(puzzle, user, "one") is None
+
+    assert guess_buffer.flush() == 1
+    assert Guess.objects.count() == 1
+
+
+def test_flush_failure_drops_unwritable_guesses(buffer_settings, no_flusher, monkeypatch):
+    """A guess that can never be written should be dropped once retries are used up, without
+    dropping the guesses flushed with it."""
+    buffer_settings.GUESS_BUFFER_MAX_RETRIES = 2
+    puzzle = PuzzleFactory(answer="ANSWER")
+    user = UserFactory()
+    guess_submit(puzzle, user, "poison")
+    guess_submit(puzzle, user, "fine")
+    bulk_create = Guess.objects.bulk_create
+
+    def fail_poison(guesses, *args, **kwargs):
+        if any(guess.text == "POISON" for guess in guesses):
+            raise RuntimeError("Can't write this guess")
+        return bulk_create(guesses, *args, **kwargs)
+
+    monkeypatch.setattr(Guess.objects, "bulk_create", fail_poison)
+    assert guess_buffer.flush() == 0
+    assert guess_buffer.flush() == 0
+    assert len(guess_buffer) == 2
+
+    assert guess_buffer.flush() == 1
+    assert len(guess_buffer) == 0
+    assert list(Guess.objects.values_list("text", flat=True)) == ["FINE"]
+    stats = PuzzleStats.objects.get(puzzle=puzzle)
+    assert (stats.num_guesses, stats.num_incorrect_guesses) == (1, 1)
+
+
+def test_guess_buffered_by_another_process(buffer_settings, no_flusher, locmem_cache):
+    """A guess buffered by another process should still be detected as a duplicate."""
+    puzzle = PuzzleFactory(answer="ANSWER")
+    user = UserFactory()
+    other_buffer = GuessBuffer()
+    other_buffer.add(
+        Guess(
+            user=user,
+            puzzle=puzzle,
+            text="WRONG",
+            text_normalized="WRONG",
+            evaluation=GuessEvaluation.INCORRECT,
+        )
+    )
+
+    assert guess_submit(puzzle, user, "wrong") is None
+    assert len(guess_buffer) == 0
+    assert guess_submit(puzzle, UserFactory(), "wrong").evaluation == GuessEvaluation.INCORRECT
+
+
+def test_flush_drops_duplicates(buffer_settings, no_flusher):
+    """Buffered guesses that conflict with saved guesses should be dropped without being counted
+    in the puzzle stats."""
+    puzzle = PuzzleFactory(answer="ANSWER")
+    user = UserFactory()
+    guess_submit(puzzle, user, "one")
+    guess_submit(puzzle, user, "two")
+    # Written by another process whose reservation expired
+    Guess.objects.create(
+        user=user,
+        puzzle=puzzle,
+        text="ONE",
+        text_normalized="ONE",
+        evaluation=GuessEvaluation.INCORRECT,
+    )
+
+    assert guess_buffer.flush() == 1
+    assert Guess.objects.count() == 2
+    stats = PuzzleStats.objects.get(puzzle=puzzle)
+    assert (stats.num_guesses, stats.num_incorrect_guesses) == (1, 1)
+
+
+def test_close_flushes_buffer(buffer_settings, no_flusher):
+    """Closing the buffer, as is done on worker shutdown, should write pending guesses."""
+    puzzle = PuzzleFactory(answer="ANSWER")
+    guess_submit(puzzle, UserFactory(), "wrong")
+
+    guess_buffer.close()
+    assert Guess.objects.count() == 1
+    assert len(guess_buffer) == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_background_flusher(buffer_settings):
+    """The background thread should write guesses once they exceed the maximum age."""
+    buffer_settings.GUESS_BUFFER_MAX_AGE = 0.1
+    puzzle = PuzzleFactory(answer="ANSWER")
+    guess_submit(puzzle, UserFactory(), "wrong")
+
+    deadline = time.monotonic() + 5
+    while len(guess_buffer) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert len(guess_buffer) == 0
+    # The buffer is emptied before the write commits, so wait for the flusher to finish
+    guess_buffer.close()
+    assert Guess.objects.count() == 1
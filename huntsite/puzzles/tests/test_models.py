@@ -4,7 +4,12 @@ from django.core.exceptions import ValidationError
 from django.utils import timezone
 import pytest
 
-from huntsite.puzzles.factories import MetapuzzleInfoFactory, PuzzleFactory
+from huntsite.puzzles.factories import (
+    CannedHintFactory,
+    ErratumFactory,
+    MetapuzzleInfoFactory,
+    PuzzleFactory,
+)
 from huntsite.puzzles.models import AdventCalendarEntry, GuessEvaluation, MetapuzzleInfo, Puzzle
 from huntsite.puzzles.services import guess_submit
 from huntsite.teams.factories import UserFactory
@@ -134,6 +139,39 @@ def test_puzzle_is_available():
     assert not puzzle_not_avail.is_available
 
 
+def test_puzzle_errata_and_canned_hint_lists(django_assert_num_queries):
+    """Errata and canned hint lists should use prefetched rows, and otherwise query them."""
+    puzzle = PuzzleFactory(canned_hints_available_at=timezone.now() - timezone.timedelta(days=1))
+    old_erratum = ErratumFactory(
+        puzzle=puzzle, published_at=timezone.now() - timezone.timedelta(days=2)
+    )
+    new_erratum = ErratumFactory(
+        puzzle=puzzle, published_at=timezone.now() - timezone.timedelta(days=1)
+    )
+    hint2 = CannedHintFactory(puzzle=puzzle, order_by=2)
+    hint1 = CannedHintFactory(puzzle=puzzle, order_by=1)
+
+    puzzle = Puzzle.objects.with_errata().with_canned_hints().get(pk=puzzle.pk)
+    with django_assert_num_queries(0):
+        assert puzzle.errata_list == [new_erratum, old_erratum]
+        assert puzzle.canned_hint_list == [hint1, hint2]
+
+    puzzle = Puzzle.objects.get(pk=puzzle.pk)
+    # Each list is queried once
+    with django_assert_num_queries(2):
+        assert puzzle.errata_list == [new_erratum, old_erratum]
+        assert puzzle.canned_hint_list == [hint1, hint2]
+
+    # Hints aren't listed before they're available
+    puzzle.canned_hints_available_at = timezone.now() + timezone.timedelta(days=1)
+    puzzle.save()
+    puzzle = Puzzle.objects.get(pk=puzzle.pk)
+    with django_assert_num_queries(1):
+        assert puzzle.canned_hint_list == []
+        assert puzzle.errata_list
+    assert Puzzle.objects.with_canned_hints().get(pk=puzzle.pk).canned_hint_list == []
+
+
 def test_metapuzzle_info_final_uniqueness():
     """MetapuzzleInfo should give validation error if saving `is_final` instance if another
     already exists."""
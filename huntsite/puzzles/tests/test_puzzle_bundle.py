@@ -0,0 +1,120 @@
+from django.utils import timezone
+import pytest
+
+from huntsite.puzzles import puzzle_bundle
+from huntsite.puzzles.factories import (
+    CannedHintFactory,
+    ClipboardDataFactory,
+    ErratumFactory,
+    ExternalLinkFactory,
+    PuzzleFactory,
+)
+from huntsite.teams.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_puzzle_bundle():
+    puzzle = PuzzleFactory(canned_hints_available_at=timezone.now() - timezone.timedelta(days=1))
+    old_erratum = ErratumFactory(
+        puzzle=puzzle, published_at=timezone.now() - timezone.timedelta(days=2)
+    )
+    new_erratum = ErratumFactory(
+        puzzle=puzzle, published_at=timezone.now() - timezone.timedelta(days=1)
+    )
+    ExternalLinkFactory(puzzle=puzzle, description="Second", order_by=2)
+    ExternalLinkFactory(puzzle=puzzle, description="First", order_by=1, html="<b>Link</b>")
+    ClipboardDataFactory(puzzle=puzzle, text="Copy me")
+    CannedHintFactory(puzzle=puzzle, keywords="**Second**", text="Hint *B*", order_by=2)
+    CannedHintFactory(puzzle=puzzle, keywords="First", text="Hint A", order_by=1)
+
+    bundle = puzzle_bundle.get_bundle(puzzle.pk)
+    assert bundle.slug == puzzle.slug
+    assert bundle.title == puzzle.title
+    assert bundle.is_available
+    assert [erratum.text for erratum in bundle.errata] == [new_erratum.text, old_erratum.text]
+    assert [link.description for link in bundle.external_links] == ["First", "Second"]
+    assert bundle.external_links[0].html == "<b>Link</b>"
+    assert bundle.clipboard_text == "Copy me"
+    # Hints are rendered from Markdown
+    assert bundle.canned_hints == (
+        ("First", "Hint A"),
+        ("<strong>Second</strong>", "Hint <em>B</em>"),
+    )
+
+    assert puzzle_bundle.get_bundle(puzzle.pk + 1) is None
+
+
+def test_puzzle_bundle_with_hints_as_of():
+    puzzle = PuzzleFactory()
+    CannedHintFactory(puzzle=puzzle)
+    bundle = puzzle_bundle.get_bundle(puzzle.pk)
+    # Never available without a release time
+    assert bundle.with_hints_as_of().canned_hints == ()
+
+    puzzle.canned_hints_available_at = timezone.now() + timezone.timedelta(days=1)
+    puzzle.save()
+    bundle = puzzle_bundle.get_bundle(puzzle.pk)
+    assert bundle.with_hints_as_of().canned_hints == ()
+    assert len(bundle.with_hints_as_of(timezone.now() + timezone.timedelta(days=2)).canned_hints)
+
+
+def test_puzzle_bundle_cache(locmem_cache, django_assert_num_queries):
+    """Cached bundles should be used until the puzzle or its content changes."""
+    puzzle = PuzzleFactory()
+    # Puzzle with clipboard data, errata, external links, and canned hints
+    with django_assert_num_queries(4):
+        puzzle_bundle.get_bundle(puzzle.pk)
+    with django_assert_num_queries(0):
+        puzzle_bundle.get_bundle(puzzle.pk)
+
+    puzzle.title = "Renamed"
+    puzzle.save()
+    assert puzzle_bundle.get_bundle(puzzle.pk).title == "Renamed"
+
+    erratum = ErratumFactory(puzzle=puzzle, text="Erratum")
+    assert puzzle_bundle.get_bundle(puzzle.pk).errata[0].text == "Erratum"
+    erratum.delete()
+    assert puzzle_bundle.get_bundle(puzzle.pk).errata == ()
+
+    link = ExternalLinkFactory(puzzle=puzzle, description="Link")
+    assert puzzle_bundle.get_bundle(puzzle.pk).external_links[0].description == "Link"
+    link.description = "Renamed link"
+    link.save()
+    assert puzzle_bundle.get_bundle(puzzle.pk).external_links[0].description == "Renamed link"
+
+    clipboard_data = ClipboardDataFactory(puzzle=puzzle, text="Copy me")
+    assert puzzle_bundle.get_bundle(puzzle.pk).clipboard_text == "Copy me"
+    clipboard_data.delete()
+    assert puzzle_bundle.get_bundle(puzzle.pk).clipboard_text is None
+
+    hint = CannedHintFactory(puzzle=puzzle, text="Hint")
+    assert puzzle_bundle.get_bundle(puzzle.pk).canned_hints[0].text_html == "Hint"
+    hint.delete()
+    assert puzzle_bundle.get_bundle(puzzle.pk).canned_hints == ()
+
+    # Other puzzles' bundles are kept
+    other_puzzle = PuzzleFactory()
+    puzzle_bundle.get_bundle(other_puzzle.pk)
+    ErratumFactory(puzzle=puzzle)
+    with django_assert_num_queries(0):
+        puzzle_bundle.get_bundle(other_puzzle.pk)
+
+    puzzle.delete()
+    assert puzzle_bundle.get_bundle(puzzle.pk) is None
+
+
+def test_puzzle_detail_cached_num_queries(client, locmem_cache, django_assert_num_queries):
+    """Once its bundle is cached, a puzzle's detail page should only query for the team's
+    guesses, besides the session and user."""
+    puzzle = PuzzleFactory()
+    ErratumFactory(puzzle=puzzle)
+    CannedHintFactory(puzzle=puzzle)
+    client.force_login(UserFactory())
+    assert client.get(puzzle.get_absolute_url()).status_code == 200
+
+    # Session + user + guesses
+    with django_assert_num_queries(3):
+        response = client.get(puzzle.get_absolute_url())
+    assert response.status_code == 200
+    assert puzzle.title in response.content.decode()
@@ -0,0 +1,125 @@
+from unittest import mock
+
+from django.core.management import call_command
+from django.utils import timezone
+import pytest
+
+from huntsite.puzzles import release_schedule
+from huntsite.puzzles.factories import (
+    MetapuzzleInfoFactory,
+    PuzzleAttributionsEntryFactory,
+    PuzzleFactory,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def test_available_puzzles():
+    now = timezone.now()
+    puzzle2 = PuzzleFactory(calendar_entry__day=2, available_at=now - timezone.timedelta(hours=1))
+    puzzle1 = PuzzleFactory(calendar_entry__day=1, available_at=now - timezone.timedelta(days=1))
+    later_puzzle = PuzzleFactory(
+        calendar_entry__day=4, available_at=now + timezone.timedelta(days=2)
+    )
+    next_puzzle = PuzzleFactory(
+        calendar_entry__day=3, available_at=now + timezone.timedelta(days=1)
+    )
+
+    assert release_schedule.available_puzzles() == [puzzle1, puzzle2]
+    assert release_schedule.next_release_at() == next_puzzle.available_at
+
+    next_puzzle.delete()
+    later_puzzle.delete()
+    assert release_schedule.next_release_at() is None
+
+
+def test_available_puzzles_cache(locmem_cache, django_assert_num_queries):
+    """Available puzzles should be cached until the next release or until they change."""
+    now = timezone.now()
+    puzzle = PuzzleFactory(calendar_entry__day=1, available_at=now - timezone.timedelta(days=1))
+    next_puzzle = PuzzleFactory(
+        calendar_entry__day=2, available_at=now + timezone.timedelta(hours=1)
+    )
+    with django_assert_num_queries(1):
+        assert release_schedule.available_puzzles() == [puzzle]
+    with django_assert_num_queries(0):
+        assert release_schedule.available_puzzles() == [puzzle]
+        assert release_schedule.next_release_at() == next_puzzle.available_at
+
+    # Expires at the next release, even if the cache hasn't expired the entry yet
+    with mock.patch("django.utils.timezone.now", return_value=next_puzzle.available_at):
+        with django_assert_num_queries(1):
+            assert release_schedule.available_puzzles() == [puzzle, next_puzzle]
+
+    # Invalidated by changes to puzzles and their related rows
+    puzzle.title = "Renamed"
+    puzzle.save()
+    assert release_schedule.available_puzzles()[0].title == "Renamed"
+
+    MetapuzzleInfoFactory(puzzle=puzzle, icon="⭐")
+    assert release_schedule.available_puzzles()[0].meta_info.icon == "⭐"
+
+    PuzzleAttributionsEntryFactory(puzzle=puzzle, content="Thanks")
+    assert release_schedule.available_puzzles()[0].attributions_entry.content == "Thanks"
+
+    puzzle.delete()
+    assert release_schedule.available_puzzles() == []
+
+
+def test_prewarm(locmem_cache, django_assert_num_queries):
+    """Prewarmed puzzles should be swapped in at the release without querying."""
+    now = timezone.now()
+    puzzle = PuzzleFactory(calendar_entry__day=1, available_at=now - timezone.timedelta(days=1))
+    next_puzzle = PuzzleFactory(
+        calendar_entry__day=2, available_at=now + timezone.timedelta(minutes=1)
+    )
+    assert release_schedule.available_puzzles() == [puzzle]
+    assert release_schedule.prewarm(next_puzzle.available_at).puzzles == [puzzle, next_puzzle]
+    # Not swapped in before the release
+    with django_assert_num_queries(0):
+        assert release_schedule.available_puzzles() == [puzzle]
+
+    with mock.patch("django.utils.timezone.now", return_value=next_puzzle.available_at):
+        locmem_cache.delete(release_schedule.AVAILABLE_PUZZLES_CACHE_KEY)
+        with django_assert_num_queries(0):
+            assert release_schedule.available_puzzles() == [puzzle, next_puzzle]
+
+    # Discarded if the puzzles change after they're prewarmed
+    later_puzzle = PuzzleFactory(
+        calendar_entry__day=3, available_at=now + timezone.timedelta(minutes=2)
+    )
+    release_schedule.available_puzzles()
+    release_schedule.prewarm(later_puzzle.available_at)
+    later_puzzle.title = "Renamed"
+    later_puzzle.save()
+    release_schedule.available_puzzles()
+    with mock.patch("django.utils.timezone.now", return_value=later_puzzle.available_at):
+        with django_assert_num_queries(1):
+            assert release_schedule.available_puzzles()[-1].title == "Renamed"
+
+
+def test_upcoming_releases():
+    now = timezone.now()
+    tomorrow = now + timezone.timedelta(days=1)
+    PuzzleFactory(available_at=now - timezone.timedelta(days=1), canned_hints_available_at=now)
+    PuzzleFactory(available_at=tomorrow)
+    PuzzleFactory(available_at=tomorrow, canned_hints_available_at=tomorrow)
+    PuzzleFactory(
+        available_at=now + timezone.timedelta(hours=1),
+        canned_hints_available_at=now + timezone.timedelta(days=2),
+    )
+    assert release_schedule.upcoming_releases(now) == [
+        now + timezone.timedelta(hours=1),
+        tomorrow,
+        now + timezone.timedelta(days=2),
+    ]
+
+
+def test_prewarm_releases_command(locmem_cache):
+    now = timezone.now()
+    soon_puzzle = PuzzleFactory(available_at=now + timezone.timedelta(seconds=30))
+    later_puzzle = PuzzleFactory(available_at=now + timezone.timedelta(days=1))
+
+    call_command("prewarm_releases", once=True, lead_time=60)
+    assert locmem_cache.get(release_schedule._prewarmed_cache_key(soon_puzzle.available_at))
+    assert not locmem_cache.get(release_schedule._prewarmed_cache_key(later_puzzle.available_at))
@@ -1,13 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from django.db import connection
+from django.utils import timezone
 import pytest
 
-from huntsite.puzzles.factories import PuzzleFactory
-from huntsite.puzzles.models import Guess, Solve
+from huntsite.puzzles import answer_index, puzzle_bundle
+from huntsite.puzzles.factories import MetapuzzleInfoFactory, PuzzleFactory
+from huntsite.puzzles.models import (
+    Finish,
+    Guess,
+    GuessEvaluation,
+    Puzzle,
+    PuzzleStats,
+    Solve,
+)
 from huntsite.puzzles.services import (
     guess_list_for_puzzle_and_user,
+    guess_page_for_puzzle_and_user,
     guess_submit,
+    puzzle_stats_rebuild,
+    release_prewarm,
     solve_list_for_user,
 )
 from huntsite.teams.factories import UserFactory
+from huntsite.teams.models import LeaderboardEntry
 
 pytestmark = pytest.mark.django_db
 
@@ -34,6 +51,57 @@ def test_guess_list_for_puzzle_and_user():
     assert [guess.text for guess in guesses] == ["GUESS THREE", "GUESS TWO", "GUESS ONE"]
 
 
+def test_guess_page_for_puzzle_and_user():
+    """guess_page_for_puzzle_and_user should page through a team's guesses, newest first."""
+    puzzle = PuzzleFactory()
+    user = UserFactory()
+    guess_submit(PuzzleFactory(), user, "IRRELEVANT")
+    texts = [f"GUESS {chr(65 + i)}" for i in range(7)]
+    for text in texts:
+        guess_submit(puzzle, user, text)
+    # Guesses with the same timestamp are ordered by ID
+    Guess.objects.filter(text__in=texts[2:5]).update(created_at=Guess.objects.last().created_at)
+
+    guesses = []
+    cursor = None
+    num_pages = 0
+    while True:
+        page = guess_page_for_puzzle_and_user(puzzle, user, cursor=cursor, page_size=3)
+        guesses.extend(guess.text for guess in page.guesses)
+        num_pages += 1
+        if page.next_cursor is None:
+            break
+        cursor = page.next_cursor
+    assert guesses == list(
+        Guess.objects.filter(puzzle=puzzle)
+        .order_by("-created_at", "-id")
+        .values_list("text", flat=True)
+    )
+    assert sorted(guesses) == texts
+    assert num_pages == 3
+
+    # No next page when the last page is exactly full
+    page = guess_page_for_puzzle_and_user(puzzle, user, page_size=7)
+    assert len(page.guesses) == 7
+    assert page.next_cursor is None
+
+    with pytest.raises(ValueError):
+        guess_page_for_puzzle_and_user(puzzle, user, cursor="not a cursor")
+
+
+def test_guess_page_num_queries(django_assert_num_queries):
+    """Each page should take a single query."""
+    puzzle = PuzzleFactory()
+    user = UserFactory()
+    for i in range(30):
+        guess_submit(puzzle, user, f"GUESS {chr(65 + i // 26)}{chr(65 + i % 26)}")
+
+    with django_assert_num_queries(1):
+        page = guess_page_for_puzzle_and_user(puzzle, user, page_size=10)
+    with django_assert_num_queries(1):
+        guess_page_for_puzzle_and_user(puzzle, user, cursor=page.next_cursor, page_size=10)
+
+
 def test_guess_submit():
     """guess_submit should create a guess and mark the puzzle as solved if correct."""
     puzzle = PuzzleFactory(answer="SUPER SECRET ANSWER")
@@ -108,3 +176,142 @@ def test_solve_list_for_user():
     assert solve_list_for_user(user).count() == 3
     # reverse order of solving
     assert [solve.puzzle for solve in solve_list_for_user(user)] == solved_puzzles[::-1]
+
+
+def test_guess_submit_num_queries(django_assert_num_queries):
+    """guess_submit should record a guess in a single insert, without separate lookups or
+    validation queries."""
+    puzzle = PuzzleFactory(answer="SUPER SECRET ANSWER")
+    user = UserFactory()
+    # Load the answer index and create the puzzle's stats
+    answer_index.get_entry(puzzle.slug)
+    PuzzleStats.objects.create(puzzle=puzzle)
+
+    # Savepoint + insert guess + update stats + release savepoint
+    with django_assert_num_queries(4):
+        assert guess_submit(puzzle, user, "WRONG ANSWER").evaluation == GuessEvaluation.INCORRECT
+    # Savepoint + failed insert guess + rollback to and release savepoint
+    with django_assert_num_queries(4):
+        assert guess_submit(puzzle, user, "WRONG ANSWER") is None
+    # Savepoint + insert guess + check solve + insert solve + update leaderboard + update stats
+    # + release savepoint
+    with django_assert_num_queries(7):
+        assert (
+            guess_submit(puzzle, user, "SUPER SECRET ANSWER").evaluation == GuessEvaluation.CORRECT
+        )
+
+
+def test_guess_submit_changed_answer():
+    """Guessing a puzzle's changed answer after solving it shouldn't count as another solve."""
+    puzzle = MetapuzzleInfoFactory(puzzle__answer="OLD ANSWER").puzzle
+    user = UserFactory()
+    assert guess_submit(puzzle, user, "OLD ANSWER").evaluation == GuessEvaluation.CORRECT
+    leaderboard_entry = LeaderboardEntry.objects.get(user=user)
+    assert (leaderboard_entry.num_solves, leaderboard_entry.num_meta_solves) == (1, 1)
+
+    puzzle.answer = "NEW ANSWER"
+    puzzle.save()
+    assert guess_submit(puzzle, user, "NEW ANSWER").evaluation == GuessEvaluation.CORRECT
+    assert Solve.objects.filter(puzzle=puzzle, user=user).count() == 1
+    stats = PuzzleStats.objects.get(puzzle=puzzle)
+    assert (stats.num_solves, stats.num_guesses) == (1, 2)
+    leaderboard_entry.refresh_from_db()
+    assert (leaderboard_entry.num_solves, leaderboard_entry.num_meta_solves) == (1, 1)
+
+
+def test_guess_submit_final_metapuzzle():
+    """Solving the final metapuzzle should finish the hunt for the team."""
+    puzzle = MetapuzzleInfoFactory(is_final=True).puzzle
+    user = UserFactory()
+    assert not user.is_finished
+
+    guess_submit(puzzle, user, puzzle.answer)
+    assert Solve.objects.filter(puzzle=puzzle, user=user).exists()
+    assert Finish.objects.filter(user=user).exists()
+    assert user.is_finished
+    user.refresh_from_db()
+    assert user.is_finished
+
+
+@pytest.mark.django_db(transaction=True)
+def test_guess_submit_concurrent():
+    """Concurrent submissions of the same guesses by members of the same team should record
+    each guess and the solve exactly once, without errors."""
+    if connection.vendor == "sqlite":
+        pytest.skip("SQLite does not support concurrent writers.")
+
+    puzzle = PuzzleFactory(answer="SUPER SECRET ANSWER")
+    user = UserFactory()
+    guess_texts = ["WRONG ANSWER", "ANOTHER WRONG ANSWER", "SUPER SECRET ANSWER"]
+    num_threads = 16
+    barrier = threading.Barrier(num_threads)
+
+    def submit_all():
+        try:
+            barrier.wait()
+            return [guess_submit(puzzle, user, guess_text) for guess_text in guess_texts]
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        futures = [executor.submit(submit_all) for _ in range(num_threads)]
+        results = [future.result() for future in futures]
+
+    # Each distinct guess was accepted exactly once
+    for i, guess_text in enumerate(guess_texts):
+        assert sum(result[i] is not None for result in results) == 1
+    assert Guess.objects.filter(puzzle=puzzle, user=user).count() == len(guess_texts)
+    assert Solve.objects.filter(puzzle=puzzle, user=user).count() == 1
+
+
+def test_puzzle_stats_rebuild():
+    """puzzle_stats_rebuild should recount solves and guesses by active, non-staff, non-tester
+    teams."""
+    puzzles = [PuzzleFactory(answer="ANSWER") for _ in range(3)]
+    users = [UserFactory() for _ in range(3)]
+    tester = UserFactory(is_tester=True)
+    for user in [*users, tester]:
+        guess_submit(puzzles[0], user, "WRONG")
+        guess_submit(puzzles[0], user, "ANSWER")
+    guess_submit(puzzles[1], users[0], "WRONG")
+
+    def stats():
+        return {
+            puzzle.id: (puzzle.num_solves, puzzle.num_guesses, puzzle.num_incorrect_guesses)
+            for puzzle in Puzzle.objects.with_solve_stats()
+            .with_guess_stats()
+            .with_guess_stats(
+                annotate_name="num_incorrect_guesses",
+                filter_evaluations=[GuessEvaluation.INCORRECT],
+            )
+        }
+
+    expected = {puzzles[0].id: (3, 6, 3), puzzles[1].id: (0, 1, 1), puzzles[2].id: (0, 0, 0)}
+    assert stats() == expected
+
+    # Deactivated teams aren't subtracted until the stats are rebuilt
+    users[1].is_active = False
+    users[1].save()
+    PuzzleStats.objects.filter(puzzle=puzzles[1]).update(num_guesses=100)
+    assert stats() != expected
+
+    assert puzzle_stats_rebuild() == 3
+    expected[puzzles[0].id] = (2, 4, 2)
+    assert stats() == expected
+    assert PuzzleStats.objects.count() == 3
+
+
+def test_release_prewarm(locmem_cache, django_assert_num_queries):
+    now = timezone.now()
+    release_at = now + timezone.timedelta(minutes=1)
+    PuzzleFactory(available_at=now - timezone.timedelta(days=1))
+    released = [
+        PuzzleFactory(available_at=release_at),
+        PuzzleFactory(available_at=now, canned_hints_available_at=release_at),
+    ]
+    PuzzleFactory(available_at=now + timezone.timedelta(days=1))
+
+    assert release_prewarm(release_at) == 2
+    with django_assert_num_queries(0):
+        for puzzle in released:
+            assert puzzle_bundle.get_bundle(puzzle.pk).title == puzzle.title
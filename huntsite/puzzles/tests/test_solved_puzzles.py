@@ -0,0 +1,70 @@
+from django.contrib.auth.models import AnonymousUser
+import pytest
+
+from huntsite.puzzles import solved_puzzles
+from huntsite.puzzles.factories import MetapuzzleInfoFactory, PuzzleFactory
+from huntsite.puzzles.models import Solve
+from huntsite.puzzles.services import guess_submit
+from huntsite.teams.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_get_solved_puzzles():
+    user = UserFactory()
+    puzzle = PuzzleFactory()
+    PuzzleFactory()
+    guess_submit(PuzzleFactory(), UserFactory(), "IRRELEVANT")
+
+    solved = solved_puzzles.get_solved_puzzles(user)
+    assert solved.puzzle_ids == frozenset()
+    assert not solved.is_finished
+
+    guess_submit(puzzle, user, puzzle.answer)
+    solved = solved_puzzles.get_solved_puzzles(user)
+    assert solved.puzzle_ids == {puzzle.pk}
+    assert solved.solve_times[puzzle.pk] == Solve.objects.get(user=user).created_at
+
+    assert solved_puzzles.get_solved_puzzles(AnonymousUser()) == solved_puzzles.NO_SOLVED_PUZZLES
+
+
+def test_solved_puzzles_cache(locmem_cache, django_assert_num_queries):
+    """Solved puzzles should be cached until the team solves a puzzle or finishes the hunt."""
+    user = UserFactory()
+    puzzle = PuzzleFactory()
+    final_puzzle = MetapuzzleInfoFactory(is_final=True).puzzle
+
+    with django_assert_num_queries(1):
+        assert solved_puzzles.get_solved_puzzles(user).puzzle_ids == frozenset()
+    with django_assert_num_queries(0):
+        assert solved_puzzles.get_solved_puzzles(user).puzzle_ids == frozenset()
+
+    # Incorrect guesses keep the cache
+    guess_submit(puzzle, user, "WRONG")
+    with django_assert_num_queries(0):
+        solved_puzzles.get_solved_puzzles(user)
+
+    # Solves are inserted without signals, so guess_submit invalidates the cache itself
+    guess_submit(puzzle, user, puzzle.answer)
+    assert solved_puzzles.get_solved_puzzles(user).puzzle_ids == {puzzle.pk}
+
+    guess_submit(final_puzzle, user, final_puzzle.answer)
+    solved = solved_puzzles.get_solved_puzzles(user)
+    assert solved.puzzle_ids == {puzzle.pk, final_puzzle.pk}
+    assert solved.is_finished
+
+    # Invalidated by deletes, like an organizer removing a solve
+    Solve.objects.get(user=user, puzzle=puzzle).delete()
+    assert solved_puzzles.get_solved_puzzles(user).puzzle_ids == {final_puzzle.pk}
+
+
+def test_solve_list():
+    user = UserFactory()
+    puzzles = [PuzzleFactory() for _ in range(3)]
+    for puzzle in puzzles:
+        guess_submit(puzzle, user, puzzle.answer)
+
+    solve_list = solved_puzzles.get_solved_puzzles(user).solve_list()
+    assert {solve.puzzle.puzzle_id for solve in solve_list} == {puzzle.pk for puzzle in puzzles}
+    solve_times = [solve.created_at for solve in solve_list]
+    assert solve_times == sorted(solve_times, reverse=True)
@@ -0,0 +1,102 @@
+import time
+
+from django.test import Client
+from django.utils import timezone
+import pytest
+
+from huntsite.puzzles import throttling
+from huntsite.puzzles.factories import PuzzleFactory
+from huntsite.puzzles.models import Guess
+from huntsite.teams.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def throttle_settings(settings, locmem_cache):
+    settings.GUESS_THROTTLE_ENABLED = True
+    settings.GUESS_THROTTLE_TEAM_CAPACITY = 4
+    settings.GUESS_THROTTLE_TEAM_PER_MINUTE = 1
+    settings.GUESS_THROTTLE_PUZZLE_CAPACITY = 2
+    settings.GUESS_THROTTLE_PUZZLE_PER_MINUTE = 1
+    return settings
+
+
+def test_take_tokens(locmem_cache, monkeypatch):
+    """Buckets should allow bursts up to their capacity and refill at their rate."""
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    bucket = throttling.Bucket(key="test", capacity=2, per_minute=6)
+
+    assert throttling.take_tokens([bucket]).allowed
+    assert throttling.take_tokens([bucket]).allowed
+    result = throttling.take_tokens([bucket])
+    assert not result.allowed
+    assert result.retry_after == 10
+
+    monkeypatch.setattr(time, "time", lambda: now + 10)
+    assert throttling.take_tokens([bucket]).allowed
+    assert not throttling.take_tokens([bucket]).allowed
+
+    # Refills up to capacity only
+    monkeypatch.setattr(time, "time", lambda: now + 1000)
+    assert throttling.take_tokens([bucket]).allowed
+    assert throttling.take_tokens([bucket]).allowed
+    assert not throttling.take_tokens([bucket]).allowed
+
+
+def test_take_tokens_all_or_nothing(locmem_cache):
+    """No tokens should be taken from any bucket if one of them is empty."""
+    small = throttling.Bucket(key="small", capacity=1, per_minute=1)
+    large = throttling.Bucket(key="large", capacity=2, per_minute=1)
+
+    assert throttling.take_tokens([small, large]).allowed
+    assert not throttling.take_tokens([small, large]).allowed
+    assert throttling.take_tokens([large]).allowed
+
+
+def test_throttle_guess(throttle_settings):
+    """Teams should be limited per puzzle and overall, independently of other teams."""
+    user = UserFactory()
+    puzzles = [PuzzleFactory() for _ in range(3)]
+
+    for puzzle in puzzles[:2]:
+        assert throttling.throttle_guess(user, puzzle.id).allowed
+        assert throttling.throttle_guess(user, puzzle.id).allowed
+        assert not throttling.throttle_guess(user, puzzle.id).allowed
+    # Team bucket is now empty
+    assert not throttling.throttle_guess(user, puzzles[2].id).allowed
+    assert throttling.throttled_count() == 3
+
+    assert throttling.throttle_guess(UserFactory(), puzzles[0].id).allowed
+
+    throttle_settings.GUESS_THROTTLE_ENABLED = False
+    assert throttling.throttle_guess(user, puzzles[0].id).allowed
+
+
+def test_throttled_guess_submit_view(throttle_settings):
+    """Throttled guesses should get a 429 response and not be recorded."""
+    puzzle = PuzzleFactory(available_at=timezone.now() - timezone.timedelta(days=1))
+    user = UserFactory()
+    client = Client()
+    client.force_login(user)
+
+    for guess in ["ONE", "TWO"]:
+        response = client.post(puzzle.get_absolute_url(), data={"guess": guess})
+        assert response.status_code == 200
+
+    # htmx requests get a partial that replaces the evaluation message
+    response = client.post(
+        puzzle.get_absolute_url(), data={"guess": "THREE"}, headers={"HX-Request": "true"}
+    )
+    assert response.status_code == 429
+    assert response["HX-Retarget"] == "#guess-evaluation"
+    assert int(response["Retry-After"]) > 0
+    assert "too often" in response.content.decode()
+    assert "<html" not in response.content.decode()
+
+    response = client.post(puzzle.get_absolute_url(), data={"guess": "THREE"})
+    assert response.status_code == 429
+    assert "429 Too Many Requests" in response.content.decode()
+
+    assert Guess.objects.count() == 2
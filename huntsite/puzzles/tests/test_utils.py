@@ -0,0 +1,50 @@
+import sys
+
+from hypothesis import given
+from hypothesis import strategies as st
+
+from huntsite.puzzles.utils import (
+    _clean_answer_reference,
+    _normalize_answer_reference,
+    clean_answer,
+    normalize_answer,
+)
+
+
+def test_clean_answer():
+    assert clean_answer("  Feliz   navidad! ") == "FELIZ NAVIDAD"
+    assert clean_answer("Crème brûlée") == "CREME BRULEE"
+    assert clean_answer("ﬁsh and\tchips 123") == "FISH AND CHIPS"
+    assert clean_answer("Straße") == "STRASSE"
+    assert clean_answer("1, 2, 3!") == ""
+
+
+def test_normalize_answer():
+    assert normalize_answer("  Feliz   navidad! ") == "FELIZNAVIDAD"
+    assert normalize_answer("Crème brûlée") == "CREMEBRULEE"
+    assert normalize_answer("1, 2, 3!") == ""
+
+
+@given(st.text())
+def test_clean_answer_matches_reference(text):
+    """Optimized clean_answer and normalize_answer should match the reference implementations
+    for any Unicode input."""
+    assert clean_answer(text) == _clean_answer_reference(text)
+    assert normalize_answer(text) == _normalize_answer_reference(text)
+
+
+@given(st.lists(st.sampled_from(" \t 　aŹß"), max_size=20).map("".join))
+def test_clean_answer_matches_reference_whitespace_and_marks(text):
+    """Same as above, biased towards whitespace, combining marks and case-expanding
+    characters."""
+    assert clean_answer(text) == _clean_answer_reference(text)
+    assert normalize_answer(text) == _normalize_answer_reference(text)
+
+
+def test_clean_answer_matches_reference_all_code_points():
+    """Optimized clean_answer should match the reference implementation for every code point."""
+    chunk_size = 64
+    for start in range(0, sys.maxunicode + 1, chunk_size):
+        # Separate each code point with a letter so that whitespace isn't collapsed away
+        text = "a".join(chr(c) for c in range(start, min(start + chunk_size, sys.maxunicode + 1)))
+        assert clean_answer(text) == _clean_answer_reference(text), hex(start)
@@ -2,12 +2,24 @@ import re
 
 from bs4 import BeautifulSoup
 from django.test import Client
+from django.urls import reverse
 from django.utils import timezone
 import pytest
 from pytest_django.asserts import assertRedirects, assertTemplateNotUsed, assertTemplateUsed
 
-from huntsite.puzzles.factories import CannedHintFactory, ErratumFactory, PuzzleFactory
-from huntsite.puzzles.services import guess_list_for_puzzle_and_user
+from huntsite.puzzles.factories import (
+    CannedHintFactory,
+    ErratumFactory,
+    ExternalLinkFactory,
+    MetapuzzleInfoFactory,
+    PuzzleFactory,
+)
+from huntsite.puzzles.models import Guess
+from huntsite.puzzles.services import (
+    GUESS_LIST_PAGE_SIZE,
+    guess_list_for_puzzle_and_user,
+    guess_submit,
+)
 from huntsite.teams.factories import UserFactory
 
 pytestmark = pytest.mark.django_db
@@ -62,6 +74,47 @@ def test_puzzle_list_view_hunt_ended(client, settings):
     assert len(re.findall("0 incorrect guesses", response.content.decode())) == 4
 
 
+def test_puzzle_list_num_queries(client, django_assert_num_queries):
+    """The number of queries to list puzzles shouldn't depend on the number of puzzles."""
+    puzzles = [PuzzleFactory(calendar_entry__day=day) for day in range(1, 4)]
+    MetapuzzleInfoFactory(puzzle=puzzles[0])
+    team = UserFactory()
+    guess_submit(puzzles[1], team, puzzles[1].answer)
+
+    # The first request also loads the current site, which is then cached
+    client.get("/puzzles/")
+    # Puzzles with calendar entries, metapuzzle info, and attributions entries
+    with django_assert_num_queries(1):
+        assert client.get("/puzzles/").status_code == 200
+
+    client.force_login(team)
+    # Session + user + puzzles + solved puzzles
+    with django_assert_num_queries(4):
+        assert client.get("/puzzles/").status_code == 200
+
+
+def test_puzzle_list_cached_num_queries(client, locmem_cache, django_assert_num_queries):
+    """Available puzzles should be cached until the next puzzle is released."""
+    now = timezone.now()
+    PuzzleFactory(calendar_entry__day=1, available_at=now - timezone.timedelta(days=1))
+    future_puzzle = PuzzleFactory(
+        calendar_entry__day=2, available_at=now + timezone.timedelta(days=1)
+    )
+    client.get("/puzzles/")
+
+    with django_assert_num_queries(0):
+        response = client.get("/puzzles/")
+    assert future_puzzle.title not in response.content.decode()
+
+    client.force_login(UserFactory())
+    # Session + user + solved puzzles
+    with django_assert_num_queries(3):
+        assert client.get("/puzzles/").status_code == 200
+    # Solved puzzles are cached too
+    with django_assert_num_queries(2):
+        assert client.get("/puzzles/").status_code == 200
+
+
 def test_puzzle_detail_auth(client):
     """Puzzle detail page requires logged in user."""
     puzzle = PuzzleFactory()
@@ -135,6 +188,29 @@ def test_puzzle_detail_no_answer_keep_going_in_source(client):
     assert "INTERMEDIATEB" not in response.content.decode()
 
 
+def test_puzzle_detail_num_queries(client, django_assert_num_queries):
+    """The number of queries for a puzzle's page shouldn't depend on how much content the puzzle
+    has or how many guesses the team has made, even without a cache."""
+    puzzle = PuzzleFactory(canned_hints_available_at=timezone.now() - timezone.timedelta(days=1))
+    ErratumFactory.create_batch(3, puzzle=puzzle)
+    ExternalLinkFactory.create_batch(3, puzzle=puzzle)
+    CannedHintFactory.create_batch(3, puzzle=puzzle)
+    team = UserFactory()
+    for i in range(3):
+        guess_submit(puzzle, team, f"GUESS {i}")
+    client.force_login(team)
+    # The first request also loads the current site, which is then cached
+    client.get(puzzle.get_absolute_url())
+
+    # Session + user + puzzle with clipboard data + errata + external links + canned hints +
+    # guesses
+    with django_assert_num_queries(7):
+        response = client.get(puzzle.get_absolute_url())
+    soup = BeautifulSoup(response.content, "html.parser")
+    assert "Errata (3)" in soup.find(id="errata").text
+    assert len(soup.find(id="canned-hints").find("tbody").find_all("tr")) == 3
+
+
 def test_puzzle_detail_errata(client):
     """Errata display correctly on puzzle detail page."""
     puzzle = PuzzleFactory()
@@ -311,13 +387,16 @@ def test_puzzle_guess_submit(client):
     response = client.post(puzzle.get_absolute_url(), data={"guess": "I AM GUESSING"})
     assert response.status_code == 200
     assert guess_list_for_puzzle_and_user(puzzle=puzzle, user=user).count() == 1
-    assertTemplateUsed(response, "partials/puzzle_guess_list.html")
+    assertTemplateUsed(response, "partials/puzzle_guess_submit.html")
     assertTemplateNotUsed(response, "puzzle_detail.html")
     soup = BeautifulSoup(response.content, "html.parser")
     guess_rows = soup.find_all("tr", class_="guess-list-row")
     assert len(guess_rows) == 1
     assert "I AM GUESSING" in guess_rows[0].text
     assert "Incorrect" in guess_rows[0].text
+    # The rendered guess is the one that was saved
+    assert response.context["guess"] == Guess.objects.get(user=user, puzzle=puzzle)
+    assert guess_rows[0].find(class_="timestamp").text
     eval_message = soup.find(id="evaluation-message")
     assert "Incorrect" in eval_message.text
 
@@ -325,11 +404,11 @@ def test_puzzle_guess_submit(client):
     response = client.post(puzzle.get_absolute_url(), data={"guess": "ANOTHER GUESS"})
     assert response.status_code == 200
     assert guess_list_for_puzzle_and_user(puzzle=puzzle, user=user).count() == 2
-    assertTemplateUsed(response, "partials/puzzle_guess_list.html")
+    assertTemplateUsed(response, "partials/puzzle_guess_submit.html")
     assertTemplateNotUsed(response, "puzzle_detail.html")
     soup = BeautifulSoup(response.content, "html.parser")
     guess_rows = soup.find_all("tr", class_="guess-list-row")
-    assert len(guess_rows) == 2
+    assert len(guess_rows) == 1
     assert "ANOTHER GUESS" in guess_rows[0].text
     assert "Incorrect" in guess_rows[0].text
     eval_message = soup.find(id="evaluation-message")
@@ -339,11 +418,10 @@ def test_puzzle_guess_submit(client):
     response = client.post(puzzle.get_absolute_url(), data={"guess": "ANOTHER GUESS"})
     assert response.status_code == 200
     assert guess_list_for_puzzle_and_user(puzzle=puzzle, user=user).count() == 2
-    assertTemplateUsed(response, "partials/puzzle_guess_list.html")
+    assertTemplateUsed(response, "partials/puzzle_guess_submit.html")
     assertTemplateNotUsed(response, "puzzle_detail.html")
     soup = BeautifulSoup(response.content, "html.parser")
-    guess_rows = soup.find_all("tr", class_="guess-list-row")
-    assert len(guess_rows) == 2
+    assert not soup.find_all("tr", class_="guess-list-row")
     eval_message = soup.find(id="evaluation-message")
     assert "already submitted" in eval_message.text
 
@@ -351,11 +429,11 @@ def test_puzzle_guess_submit(client):
     response = client.post(puzzle.get_absolute_url(), data={"guess": "FELIZ NAVIDAD"})
     assert response.status_code == 200
     assert guess_list_for_puzzle_and_user(puzzle=puzzle, user=user).count() == 3
-    assertTemplateUsed(response, "partials/puzzle_guess_list.html")
+    assertTemplateUsed(response, "partials/puzzle_guess_submit.html")
     assertTemplateNotUsed(response, "puzzle_detail.html")
     soup = BeautifulSoup(response.content, "html.parser")
     guess_rows = soup.find_all("tr", class_="guess-list-row")
-    assert len(guess_rows) == 3
+    assert len(guess_rows) == 1
     assert "FELIZ NAVIDAD" in guess_rows[0].text
     assert "Correct" in guess_rows[0].text
     eval_message = soup.find(id="evaluation-message")
@@ -376,7 +454,7 @@ def test_puzzle_guess_submit_keep_going(client):
     response = client.post(puzzle.get_absolute_url(), data={"guess": "I AM GUESSING"})
     assert response.status_code == 200
     assert guess_list_for_puzzle_and_user(puzzle=puzzle, user=user).count() == 1
-    assertTemplateUsed(response, "partials/puzzle_guess_list.html")
+    assertTemplateUsed(response, "partials/puzzle_guess_submit.html")
     assertTemplateNotUsed(response, "puzzle_detail.html")
     soup = BeautifulSoup(response.content, "html.parser")
     guess_rows = soup.find_all("tr", class_="guess-list-row")
@@ -390,11 +468,11 @@ def test_puzzle_guess_submit_keep_going(client):
     response = client.post(puzzle.get_absolute_url(), data={"guess": "JINGLE BELLS"})
     assert response.status_code == 200
     assert guess_list_for_puzzle_and_user(puzzle=puzzle, user=user).count() == 2
-    assertTemplateUsed(response, "partials/puzzle_guess_list.html")
+    assertTemplateUsed(response, "partials/puzzle_guess_submit.html")
     assertTemplateNotUsed(response, "puzzle_detail.html")
     soup = BeautifulSoup(response.content, "html.parser")
     guess_rows = soup.find_all("tr", class_="guess-list-row")
-    assert len(guess_rows) == 2
+    assert len(guess_rows) == 1
     assert "JINGLE BELLS" in guess_rows[0].text
     assert "Keep going" in guess_rows[0].text
     eval_message = soup.find(id="evaluation-message")
@@ -404,11 +482,11 @@ def test_puzzle_guess_submit_keep_going(client):
     response = client.post(puzzle.get_absolute_url(), data={"guess": "SNOWFLAKE"})
     assert response.status_code == 200
     assert guess_list_for_puzzle_and_user(puzzle=puzzle, user=user).count() == 3
-    assertTemplateUsed(response, "partials/puzzle_guess_list.html")
+    assertTemplateUsed(response, "partials/puzzle_guess_submit.html")
     assertTemplateNotUsed(response, "puzzle_detail.html")
     soup = BeautifulSoup(response.content, "html.parser")
     guess_rows = soup.find_all("tr", class_="guess-list-row")
-    assert len(guess_rows) == 3
+    assert len(guess_rows) == 1
     assert "SNOWFLAKE" in guess_rows[0].text
     assert "Keep going" in guess_rows[0].text
     eval_message = soup.find(id="evaluation-message")
@@ -418,17 +496,88 @@ def test_puzzle_guess_submit_keep_going(client):
     response = client.post(puzzle.get_absolute_url(), data={"guess": "FELIZ NAVIDAD"})
     assert response.status_code == 200
     assert guess_list_for_puzzle_and_user(puzzle=puzzle, user=user).count() == 4
-    assertTemplateUsed(response, "partials/puzzle_guess_list.html")
+    assertTemplateUsed(response, "partials/puzzle_guess_submit.html")
     assertTemplateNotUsed(response, "puzzle_detail.html")
     soup = BeautifulSoup(response.content, "html.parser")
     guess_rows = soup.find_all("tr", class_="guess-list-row")
-    assert len(guess_rows) == 4
+    assert len(guess_rows) == 1
     assert "FELIZ NAVIDAD" in guess_rows[0].text
     assert "Correct" in guess_rows[0].text
     eval_message = soup.find(id="evaluation-message")
     assert "Correct" in eval_message.text
 
 
+def test_puzzle_guess_submit_append_only(client, django_assert_max_num_queries):
+    """Guess submission responses should only contain the new guess and the evaluation message,
+    however many guesses the team has already made."""
+    puzzle = PuzzleFactory(
+        available_at=timezone.now() - timezone.timedelta(days=1),
+        answer="FELIZ NAVIDAD",
+    )
+    user = UserFactory()
+    client.force_login(user)
+    for i in range(50):
+        guess_submit(puzzle, user, f"GUESS {chr(65 + i // 26)}{chr(65 + i % 26)}")
+
+    # Detail page lists the first page of guesses
+    response = client.get(puzzle.get_absolute_url())
+    soup = BeautifulSoup(response.content, "html.parser")
+    guess_rows = soup.find(id="guess-list-body").find_all("tr", class_="guess-list-row")
+    assert len(guess_rows) == GUESS_LIST_PAGE_SIZE
+    assert soup.find(id="guess-evaluation") is not None
+
+    with django_assert_max_num_queries(10):
+        response = client.post(puzzle.get_absolute_url(), data={"guess": "ONE MORE GUESS"})
+    assert response.status_code == 200
+    soup = BeautifulSoup(response.content, "html.parser")
+    guess_rows = soup.find_all("tr", class_="guess-list-row")
+    assert len(guess_rows) == 1
+    assert "ONE MORE GUESS" in guess_rows[0].text
+    evaluation = soup.find(id="guess-evaluation")
+    assert evaluation["hx-swap-oob"] == "true"
+    assert "Incorrect" in evaluation.find(id="evaluation-message").text
+
+
+def test_puzzle_guess_history(client):
+    """Detail page should show the newest page of guesses, with a link to load older ones."""
+    puzzle = PuzzleFactory(available_at=timezone.now() - timezone.timedelta(days=1))
+    user = UserFactory()
+    texts = [
+        f"GUESS {chr(65 + i // 26)}{chr(65 + i % 26)}" for i in range(2 * GUESS_LIST_PAGE_SIZE + 5)
+    ]
+    for text in texts:
+        guess_submit(puzzle, user, text)
+
+    history_url = reverse("puzzle_guess_history", kwargs={"slug": puzzle.slug})
+    response = client.get(history_url)
+    assertRedirects(response, f"/accounts/login/?next={history_url}")
+
+    client.force_login(user)
+    response = client.get(puzzle.get_absolute_url())
+    soup = BeautifulSoup(response.content, "html.parser")
+    guess_rows = soup.find_all("tr", class_="guess-list-row")
+    assert [row.find(class_="mono").text for row in guess_rows] == texts[::-1][
+        :GUESS_LIST_PAGE_SIZE
+    ]
+
+    # Follow "load more" links until there are no more
+    while load_more := soup.find(id="guess-list-load-more"):
+        response = client.get(load_more.find("button")["hx-get"])
+        assert response.status_code == 200
+        assertTemplateNotUsed(response, "puzzle_detail.html")
+        soup = BeautifulSoup(response.content, "html.parser")
+        guess_rows += soup.find_all("tr", class_="guess-list-row")
+    assert [row.find(class_="mono").text for row in guess_rows] == texts[::-1]
+
+    response = client.get(history_url, {"cursor": "not a cursor"})
+    assert response.status_code == 400
+
+    # Unavailable puzzle
+    puzzle = PuzzleFactory(available_at=timezone.now() + timezone.timedelta(days=1))
+    response = client.get(reverse("puzzle_guess_history", kwargs={"slug": puzzle.slug}))
+    assert response.status_code == 404
+
+
 def test_puzzle_solve_with_story_unlock(client):
     pass
 
@@ -0,0 +1,104 @@
+"""Token-bucket rate limiting of guess submissions, backed by the configured Django cache.
+
+Each team has a bucket for all of its guesses and a bucket for its guesses to each puzzle. A
+bucket holds up to its capacity in tokens and is refilled at a constant rate; each guess takes
+one token from both of the team's applicable buckets, and is throttled if either is empty.
+
+Bucket state is read and written with separate cache operations, so concurrent requests from
+the same team can occasionally both take the last token. That errs on the side of letting
+guesses through, which is fine for protecting the database from scripted guessing.
+"""
+
+import math
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from loguru import logger
+
+THROTTLED_COUNT_CACHE_KEY = "puzzles:throttling:throttled_count"
+
+
+class Bucket(NamedTuple):
+    key: str
+    capacity: int
+    per_minute: float
+
+
+class ThrottleResult(NamedTuple):
+    allowed: bool
+    retry_after: int
+    """Seconds until a token is available in every bucket, if not allowed."""
+
+
+def _guess_buckets(user_id: int, puzzle_id: int) -> list[Bucket]:
+    return [
+        Bucket(
+            key=f"puzzles:throttling:team:{user_id}",
+            capacity=settings.GUESS_THROTTLE_TEAM_CAPACITY,
+            per_minute=settings.GUESS_THROTTLE_TEAM_PER_MINUTE,
+        ),
+        Bucket(
+            key=f"puzzles:throttling:team:{user_id}:puzzle:{puzzle_id}",
+            capacity=settings.GUESS_THROTTLE_PUZZLE_CAPACITY,
+            per_minute=settings.GUESS_THROTTLE_PUZZLE_PER_MINUTE,
+        ),
+    ]
+
+
+def take_tokens(buckets: list[Bucket]) -> ThrottleResult:
+    """Take one token from each bucket if all of them have one available. If any doesn't, no
+    tokens are taken."""
+    now = time.time()
+    states = cache.get_many([bucket.key for bucket in buckets])
+
+    tokens = {}
+    retry_after = 0.0
+    for bucket in buckets:
+        rate = bucket.per_minute / 60
+        available, updated_at = states.get(bucket.key, (bucket.capacity, now))
+        available = min(bucket.capacity, available + (now - updated_at) * rate)
+        if available < 1:
+            retry_after = max(retry_after, (1 - available) / rate)
+        tokens[bucket] = available
+
+    if retry_after > 0:
+        return ThrottleResult(allowed=False, retry_after=math.ceil(retry_after))
+
+    cache.set_many(
+        {bucket.key: (available - 1, now) for bucket, available in tokens.items()},
+        # Once it has refilled completely, a bucket is the same as a missing one
+        timeout=max(math.ceil(bucket.capacity / bucket.per_minute * 60) for bucket in buckets),
+    )
+    return ThrottleResult(allowed=True, retry_after=0)
+
+
+def throttle_guess(user, puzzle_id: int) -> ThrottleResult:
+    """Rate limit a team's guess submission to a puzzle."""
+    if not settings.GUESS_THROTTLE_ENABLED:
+        return ThrottleResult(allowed=True, retry_after=0)
+    result = take_tokens(_guess_buckets(user.pk, puzzle_id))
+    if not result.allowed:
+        _increment_throttled_count()
+        logger.warning(
+            "Throttled guess submission by team '{user.team_name}' for puzzle {puzzle_id}.",
+            user=user,
+            puzzle_id=puzzle_id,
+        )
+    return result
+
+
+def _increment_throttled_count():
+    cache.add(THROTTLED_COUNT_CACHE_KEY, 0, timeout=None)
+    try:
+        cache.incr(THROTTLED_COUNT_CACHE_KEY)
+    except ValueError:
+        # The key was evicted between add and incr
+        cache.set(THROTTLED_COUNT_CACHE_KEY, 1, timeout=None)
+
+
+def throttled_count() -> int:
+    """Return the number of guess submissions that have been throttled, as recorded in the
+    cache."""
+    return cache.get(THROTTLED_COUNT_CACHE_KEY, 0)
@@ -1,6 +1,31 @@
+from functools import lru_cache
 import unicodedata
 
+ANSWER_CACHE_SIZE = 4096
+"""Maximum number of recent inputs whose cleaned and normalized forms are memoized."""
 
+
+class _CleanAnswerTable(dict):
+    """Translation table for str.translate that maps alphabetic characters to their uppercase
+    form, keeps whitespace, and drops everything else. Entries are computed on first lookup.
+    Only code points in the Basic Multilingual Plane are memoized, which bounds the table's size.
+    """
+
+    def __missing__(self, codepoint: int) -> str | None:
+        char = chr(codepoint)
+        if char.isalpha() or char.isspace():
+            value = char.upper()
+        else:
+            value = None
+        if codepoint <= 0xFFFF:
+            self[codepoint] = value
+        return value
+
+
+_CLEAN_ANSWER_TABLE = _CleanAnswerTable()
+
+
+@lru_cache(maxsize=ANSWER_CACHE_SIZE)
 def clean_answer(text: str) -> str:
     """Clean up an answer or guess by:
 
@@ -9,15 +34,31 @@ def clean_answer(text: str) -> str:
     - Replacing any internal whitespace with a single space
     - Dropping non-alphabetic characters
     """
-    nfkd_form = unicodedata.normalize("NFKD", text.strip())
-    cleaned = "".join(c.upper() for c in nfkd_form if c.isalpha() or c.isspace())
-    cleaned = " ".join(cleaned.split())
-    return cleaned
+    if not text.isascii():
+        # NFKD normalization is a no-op for ASCII text
+        text = unicodedata.normalize("NFKD", text)
+    return " ".join(text.translate(_CLEAN_ANSWER_TABLE).split())
 
 
+@lru_cache(maxsize=ANSWER_CACHE_SIZE)
 def normalize_answer(text: str) -> str:
     """Normalizes an answer to a consistent format for comparison. Does everything
     that clean_answer does and removes whitespace.
     """
-    normalized = "".join(clean_answer(text).split())
+    return clean_answer(text).replace(" ", "")
+
+
+def _clean_answer_reference(text: str) -> str:
+    """Straightforward reference implementation of clean_answer, used to test and benchmark
+    the optimized implementation."""
+    nfkd_form = unicodedata.normalize("NFKD", text.strip())
+    cleaned = "".join(c.upper() for c in nfkd_form if c.isalpha() or c.isspace())
+    cleaned = " ".join(cleaned.split())
+    return cleaned
+
+
+def _normalize_answer_reference(text: str) -> str:
+    """Straightforward reference implementation of normalize_answer, used to test and benchmark
+    the optimized implementation."""
+    normalized = "".join(_clean_answer_reference(text).split())
     return normalized
@@ -4,7 +4,7 @@ import json
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
-from django.http import Http404
+from django.http import Http404, HttpResponseBadRequest
 from django.shortcuts import get_object_or_404, render
 from django.template.response import TemplateResponse
 from django.urls import reverse
@@ -12,6 +12,8 @@ from django.utils.safestring import mark_safe
 from django.views.decorators.http import require_http_methods, require_safe
 from loguru import logger
 
+from huntsite.content.models import StoryEntry
+from huntsite.puzzles import answer_index, puzzle_bundle, release_schedule, throttling
 from huntsite.puzzles.forms import GuessForm
 from huntsite.puzzles.models import GuessEvaluation, Puzzle
 import huntsite.puzzles.services as puzzle_services
@@ -29,22 +31,28 @@ def puzzle_list(request):
             user=request.user,
             time_traveling_at=time_traveling_at,
         )
-        puzzle_manager = Puzzle.objects.filter_available_at(time_traveling_at)
+        puzzles = (
+            Puzzle.objects.filter_available_at(time_traveling_at)
+            .with_calendar_entry()
+            .with_meta_info()
+            .order_by("calendar_entry__day")
+        )
     else:
-        # Only get available puzzles
+        # Only get available puzzles, which are cached until the next release
         logger.trace("Team '{user.team_name}' is viewing puzzle list", user=request.user)
-        puzzle_manager = Puzzle.available
+        puzzles = release_schedule.available_puzzles()
 
-    puzzle_queryset = puzzle_manager.with_calendar_entry().with_meta_info()
     if get_hunt_state(request) < HuntState.ENDED:
-        puzzle_queryset = puzzle_queryset.with_solves_by_user(request.user)
+        solved_puzzle_ids = puzzle_services.solved_puzzle_ids_for_user(request.user)
+        for puzzle in puzzles:
+            puzzle.is_solved = puzzle.pk in solved_puzzle_ids
     else:
-        puzzle_queryset = puzzle_queryset.with_solve_stats().with_guess_stats(
-            annotate_name="num_incorrect_guesses",
-            filter_evaluations=[GuessEvaluation.INCORRECT],
-        )
+        stats_by_puzzle_id = puzzle_services.puzzle_stats_by_puzzle_id()
+        for puzzle in puzzles:
+            stats = stats_by_puzzle_id.get(puzzle.pk)
+            puzzle.num_solves = stats.num_solves if stats else 0
+            puzzle.num_incorrect_guesses = stats.num_incorrect_guesses if stats else 0
 
-    puzzles = puzzle_queryset.all().order_by("calendar_entry__day")
     day_spine = list(range(1, 25))
     context = {
         "day_spine": day_spine,
@@ -56,9 +64,9 @@ def puzzle_list(request):
 GUESS_EVALUATION_MESSAGES = {
     GuessEvaluation.CORRECT: "Correct! 🎉",
     GuessEvaluation.INCORRECT: "Incorrect.",
-    puzzle_services.ALREADY_SUBMITTED: "You've already submitted that guess.",
     GuessEvaluation.KEEP_GOING: "You got an intermediate phrase! Keep going for the final answer.",
 }
+ALREADY_SUBMITTED_MESSAGE = "You've already submitted that guess."
 
 
 @require_http_methods(["GET", "POST"])
@@ -73,50 +81,67 @@ def puzzle_detail(request, slug: str):
 @login_required
 def puzzle_detail_serverside(request, slug: str):
     """View to display the content page of a single puzzle and take guesses."""
-    puzzle_manager = Puzzle.objects if request.user.is_tester else Puzzle.available
-
     if request.method == "GET":
-        queryset = (
-            puzzle_manager.with_errata()
-            .with_clipboard_data()
-            .with_external_links()
-            .with_canned_hints(
-                as_of=read_time_travel_session_var(request) if request.user.is_tester else None
-            )
-        )
-        puzzle = get_object_or_404(queryset, slug=slug)
+        # Everything but the team's guesses is the same for every team, so it comes from the
+        # answer index and the cached puzzle bundle rather than the database
+        entry = answer_index.get_entry(slug)
+        if entry is None or not (request.user.is_tester or entry.is_available):
+            raise Http404
+        bundle = puzzle_bundle.get_bundle(entry.puzzle_id)
+        if bundle is None:
+            raise Http404
 
         logger.trace(
             "Team '{user.team_name}' is viewing puzzle {puzzle}.",
             user=request.user,
-            puzzle=puzzle,
+            puzzle=bundle.title,
+        )
+        guess_page = puzzle_services.guess_page_for_puzzle_and_user(
+            puzzle=entry.puzzle_id,
+            user=request.user,
         )
         context = {
-            "puzzle": puzzle,
-            "guesses": puzzle_services.guess_list_for_puzzle_and_user(
-                puzzle=puzzle,
-                user=request.user,
+            "puzzle": bundle.with_hints_as_of(
+                read_time_travel_session_var(request) if request.user.is_tester else None
             ),
+            "guesses": guess_page.guesses,
+            "next_cursor": guess_page.next_cursor,
             "form": GuessForm(slug=slug),
         }
         return TemplateResponse(request, "puzzle_detail.html", context)
 
     elif request.method == "POST":
-        puzzle = get_object_or_404(puzzle_manager, slug=slug)
+        # Look up the puzzle in the answer index rather than the database
+        entry = answer_index.get_entry(slug)
+        if entry is None or not (request.user.is_tester or entry.is_available):
+            raise Http404
+
+        throttle = throttling.throttle_guess(request.user, entry.puzzle_id)
+        if not throttle.allowed:
+            return _too_many_requests(request, throttle.retry_after)
 
         # Submission to answer checker
         context = {}
         form = GuessForm(request.POST, slug=slug)
         if form.is_valid():
             guess_text = form.cleaned_data["guess"]
-            evaluation = puzzle_services.guess_submit(puzzle, request.user, guess_text)
-            context["evaluation_message"] = GUESS_EVALUATION_MESSAGES[evaluation]
+            guess = puzzle_services.guess_submit(entry, request.user, guess_text)
+            if guess is None:
+                context["evaluation_message"] = ALREADY_SUBMITTED_MESSAGE
+            else:
+                context["evaluation_message"] = GUESS_EVALUATION_MESSAGES[guess.evaluation]
+                # Only the new guess is rendered, to be prepended to the guess list on the page
+                context["guess"] = guess
             # Check for story unlock
-            if evaluation == GuessEvaluation.CORRECT and hasattr(puzzle, "storyentry"):
+            if (
+                guess is not None
+                and guess.evaluation == GuessEvaluation.CORRECT
+                and (story_entry := StoryEntry.objects.filter(puzzle_id=entry.puzzle_id).first())
+            ):
                 story_unlock_message = mark_safe(
                     """You've unlocked a new story entry: <a href="{url}">"{title}"</a>""".format(
                         url=reverse("story"),
-                        title=puzzle.storyentry.title,
+                        title=story_entry.title,
                     )
                 )
                 context["story_unlock_message"] = story_unlock_message
@@ -130,38 +155,67 @@ def puzzle_detail_serverside(request, slug: str):
             logger.error(
                 "Team '{user.team_name}' submitted invalid guess for puzzle {puzzle}: {payload}",
                 user=request.user,
-                puzzle=puzzle,
+                puzzle=entry.title,
                 payload=request.POST,
             )
             context["evaluation_message"] = "Sorry, something went wrong!"
 
-        all_puzzle_guesses = puzzle_services.guess_list_for_puzzle_and_user(
-            puzzle=puzzle,
+        return render(request, "partials/puzzle_guess_submit.html", context)
+
+
+@login_required
+@require_safe
+def puzzle_guess_history(request, slug: str):
+    """htmx endpoint for loading the next page of a team's guesses for a puzzle."""
+    entry = answer_index.get_entry(slug)
+    if entry is None or not (request.user.is_tester or entry.is_available):
+        raise Http404
+
+    try:
+        guess_page = puzzle_services.guess_page_for_puzzle_and_user(
+            puzzle=entry.puzzle_id,
             user=request.user,
+            cursor=request.GET.get("cursor"),
         )
-        context["guesses"] = all_puzzle_guesses
-        return render(request, "partials/puzzle_guess_list.html", context)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor.")
+    context = {
+        "slug": slug,
+        "guesses": guess_page.guesses,
+        "next_cursor": guess_page.next_cursor,
+    }
+    return render(request, "partials/puzzle_guess_list_page.html", context)
+
+
+def _too_many_requests(request, retry_after: int):
+    """429 response for a throttled guess submission. For htmx requests, renders a partial that
+    replaces the evaluation message rather than being added to the guess list."""
+    context = {"retry_after": retry_after}
+    if request.headers.get("HX-Request"):
+        response = render(request, "partials/too_many_requests.html", context, status=429)
+        response["HX-Retarget"] = "#guess-evaluation"
+        response["HX-Reswap"] = "innerHTML"
+    else:
+        response = render(request, "429.html", context, status=429)
+    response["Retry-After"] = str(retry_after)
+    return response
 
 
 def puzzle_detail_clientside(request, slug: str):
     """Puzzle detail view with clientside answer checker, for after hunt has ended."""
-    puzzle_manager = Puzzle.objects
-
     if request.method == "GET":
         queryset = (
-            puzzle_manager.with_errata()
-            .with_clipboard_data()
-            .with_external_links()
-            .with_canned_hints(
-                as_of=read_time_travel_session_var(request) if request.user.is_tester else None
-            )
-            .with_solve_stats()
+            Puzzle.objects.with_solve_stats()
             .with_guess_stats(
                 annotate_name="num_incorrect_guesses",
                 filter_evaluations=[GuessEvaluation.INCORRECT],
             )
+            .only("id", "answer", "keep_going_answers")
         )
         puzzle = get_object_or_404(queryset, slug=slug)
+        bundle = puzzle_bundle.get_bundle(puzzle.pk)
+        if bundle is None:
+            raise Http404
         # Base64-encode the answers so they're not in plaintext in the HTML source
         answer_data = {
             "answer": base64.b64encode(puzzle.answer.encode()).decode(),
@@ -170,7 +224,11 @@ def puzzle_detail_clientside(request, slug: str):
             ],
         }
         context = {
-            "puzzle": puzzle,
+            "puzzle": bundle.with_hints_as_of(
+                read_time_travel_session_var(request) if request.user.is_tester else None
+            ),
+            "num_solves": puzzle.num_solves,
+            "num_incorrect_guesses": puzzle.num_incorrect_guesses,
             "answer_data": json.dumps(answer_data),
         }
         return TemplateResponse(request, "puzzle_detail.html", context)
@@ -0,0 +1,26 @@
+from django.contrib import admin
+
+import huntsite.tasks.models as models
+from huntsite.tasks.services import task_retry
+
+
+@admin.action(description="Retry selected failed tasks")
+def retry_tasks(modeladmin, request, queryset):
+    num_retried = sum(task_retry(task) for task in queryset)
+    modeladmin.message_user(request, f"Queued {num_retried} failed tasks to retry.")
+
+
+@admin.register(models.Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "attempts", "created_at", "finished_at")
+    list_filter = ("status", "name")
+    search_fields = ("name",)
+    ordering = ("-created_at",)
+    actions = [retry_tasks]
+
+    def has_add_permission(self, request):
+        # Tasks are queued by the site's code
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
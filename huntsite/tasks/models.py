@@ -0,0 +1,35 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """A function to run in the background by the run_worker management command, with its
+    keyword arguments, status, and result."""
+
+    class Status(models.TextChoices):
+        QUEUED = "queued"
+        RUNNING = "running"
+        SUCCEEDED = "succeeded"
+        FAILED = "failed"
+
+    name = models.CharField(max_length=255, help_text="Name of the registered task function.")
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=Status, default=Status.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField()
+    run_after = models.DateTimeField(default=timezone.now)
+    """When the task can next be run. Failed attempts are retried after a delay."""
+    locked_at = models.DateTimeField(null=True, blank=True)
+    """When a worker started the current attempt. Tasks locked long enough ago that their worker
+    must have died are run again."""
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    """Traceback of the latest failed attempt."""
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"], name="task_queue_idx")]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
@@ -0,0 +1,25 @@
+"""Registry of the functions that can be run as background tasks.
+
+Tasks are stored in the database by name, so a worker can only run functions that it has
+registered under the same name. Each app defines its tasks in a tasks module, which is imported
+when Django starts, decorating them with register.
+"""
+
+from collections.abc import Callable
+
+_tasks: dict[str, Callable] = {}
+
+
+def register(func: Callable) -> Callable:
+    """Decorator that registers a function as a background task, named by its module and name.
+    The function must take only JSON-serializable keyword arguments, and return a
+    JSON-serializable result."""
+    name = f"{func.__module__}.{func.__name__}"
+    _tasks[name] = func
+    func.task_name = name
+    return func
+
+
+def get(name: str) -> Callable | None:
+    """Return the task function registered under a name, or None if there is none."""
+    return _tasks.get(name)
@@ -0,0 +1,137 @@
+"""Queue of background tasks stored in the database, so that slow work can run outside of web
+workers without an external broker.
+
+Workers claim the oldest runnable task with SELECT ... FOR UPDATE SKIP LOCKED, so that workers on
+Postgres never wait on each other. SQLite has no row locks, so the claim is also made with an
+UPDATE conditioned on the task being unchanged, which only one worker can win.
+"""
+
+from collections.abc import Callable
+import datetime
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from loguru import logger
+
+from huntsite.tasks import registry
+from huntsite.tasks.models import Task
+
+
+def task_enqueue(
+    func: Callable,
+    run_after: datetime.datetime | None = None,
+    max_attempts: int | None = None,
+    **kwargs,
+) -> Task:
+    """Queue a registered task function to be run by a worker with the given keyword arguments,
+    which must be JSON-serializable. If called in a transaction, workers see the task once the
+    transaction commits."""
+    name = getattr(func, "task_name", None)
+    if registry.get(name) is not func:
+        raise ValueError(f"{func!r} isn't a registered task.")
+    task = Task.objects.create(
+        name=name,
+        kwargs=kwargs,
+        max_attempts=max_attempts or settings.TASKS_MAX_ATTEMPTS,
+        run_after=run_after or timezone.now(),
+    )
+    logger.info("Queued task {task}.", task=task)
+    return task
+
+
+def task_enqueue_unique(func: Callable, **kwargs) -> Task:
+    """Queue a task like task_enqueue, unless the same task with the same arguments is already
+    queued and hasn't started running, in which case that task is returned instead. For tasks
+    like rebuilds, where running once after several requests is enough."""
+    name = getattr(func, "task_name", None)
+    task = Task.objects.filter(name=name, kwargs=kwargs, status=Task.Status.QUEUED).first()
+    return task or task_enqueue(func, **kwargs)
+
+
+def _lock_expired_at(now: datetime.datetime) -> datetime.datetime:
+    return now - datetime.timedelta(seconds=settings.TASKS_LOCK_TIMEOUT)
+
+
+def task_claim() -> Task | None:
+    """Claim the next task to run, or return None if there is none. Tasks whose worker stopped
+    without finishing them are claimed again, unless they've used up their attempts, in which
+    case they're marked failed."""
+    now = timezone.now()
+    lock_expired = Q(status=Task.Status.RUNNING, locked_at__lt=_lock_expired_at(now))
+    Task.objects.filter(lock_expired, attempts__gte=F("max_attempts")).update(
+        status=Task.Status.FAILED,
+        error="Worker stopped without finishing the task.",
+        finished_at=now,
+    )
+    while True:
+        with transaction.atomic():
+            task = (
+                Task.objects.filter(
+                    Q(status=Task.Status.QUEUED, run_after__lte=now) | lock_expired
+                )
+                .select_for_update(skip_locked=True)
+                .order_by("run_after", "id")
+                .first()
+            )
+            if task is None:
+                return None
+            claimed = Task.objects.filter(
+                pk=task.pk, status=task.status, attempts=task.attempts
+            ).update(status=Task.Status.RUNNING, locked_at=now, attempts=F("attempts") + 1)
+        if claimed:
+            task.refresh_from_db()
+            return task
+
+
+def task_run(task: Task):
+    """Run a claimed task and record its result. Failed attempts are retried after
+    TASKS_RETRY_DELAY seconds, doubling with each retry, until the task's attempts are used up."""
+    func = registry.get(task.name)
+    try:
+        if func is None:
+            raise LookupError(f"No task is registered as {task.name}.")
+        result = func(**task.kwargs)
+    except Exception:
+        task.error = traceback.format_exc()
+        task.locked_at = None
+        if task.attempts < task.max_attempts:
+            delay = settings.TASKS_RETRY_DELAY * 2 ** (task.attempts - 1)
+            task.status = Task.Status.QUEUED
+            task.run_after = timezone.now() + datetime.timedelta(seconds=delay)
+            logger.exception("Task {task} failed, retrying in {delay} s.", task=task, delay=delay)
+        else:
+            task.status = Task.Status.FAILED
+            task.finished_at = timezone.now()
+            logger.exception("Task {task} failed.", task=task)
+    else:
+        task.status = Task.Status.SUCCEEDED
+        task.result = result
+        task.finished_at = timezone.now()
+        logger.success("Task {task} succeeded.", task=task)
+    task.save(update_fields=["status", "result", "error", "locked_at", "run_after", "finished_at"])
+
+
+def tasks_run_pending(max_tasks: int | None = None) -> int:
+    """Run tasks until none are runnable, or until max_tasks have been run. Returns the number of
+    tasks run."""
+    num_run = 0
+    while max_tasks is None or num_run < max_tasks:
+        task = task_claim()
+        if task is None:
+            break
+        task_run(task)
+        num_run += 1
+    return num_run
+
+
+def task_retry(task: Task) -> bool:
+    """Queue a failed task to be run again, with its attempts reset. Returns whether the task
+    was queued."""
+    return bool(
+        Task.objects.filter(pk=task.pk, status=Task.Status.FAILED).update(
+            status=Task.Status.QUEUED, attempts=0, run_after=timezone.now(), finished_at=None
+        )
+    )
@@ -0,0 +1,174 @@
+import datetime
+
+from django.core import mail
+from django.core.management import call_command
+from django.utils import timezone
+import pytest
+
+from huntsite.tasks import services as task_services
+from huntsite.tasks.models import Task
+from huntsite.tasks.registry import register
+from huntsite.teams.factories import UserFactory
+from huntsite.teams.services import email_job_create
+from huntsite.teams.tasks import send_email_job
+
+pytestmark = pytest.mark.django_db
+
+calls = []
+
+
+@register
+def add(a: int, b: int) -> int:
+    calls.append((a, b))
+    return a + b
+
+
+@register
+def fail():
+    raise RuntimeError("Task failed")
+
+
+def _rewind(task: Task, seconds: float):
+    """Move the task's times into the past, as if seconds had passed."""
+    delta = datetime.timedelta(seconds=seconds)
+    Task.objects.filter(pk=task.pk).update(
+        run_after=task.run_after - delta,
+        locked_at=task.locked_at - delta if task.locked_at else None,
+    )
+    task.refresh_from_db()
+
+
+def test_task_enqueue_and_run():
+    calls.clear()
+    task = task_services.task_enqueue(add, a=1, b=2)
+    assert task.name == "huntsite.tasks.tests.test_services.add"
+    assert task.status == Task.Status.QUEUED
+
+    assert task_services.tasks_run_pending() == 1
+    task.refresh_from_db()
+    assert task.status == Task.Status.SUCCEEDED
+    assert task.result == 3
+    assert task.attempts == 1
+    assert task.finished_at is not None
+    assert calls == [(1, 2)]
+
+    # Finished tasks aren't run again
+    assert task_services.tasks_run_pending() == 0
+
+
+def test_task_enqueue_unique():
+    task = task_services.task_enqueue_unique(add, a=1, b=2)
+    assert task_services.task_enqueue_unique(add, a=1, b=2) == task
+    assert task_services.task_enqueue_unique(add, a=2, b=2) != task
+
+    # Once the task is running, it's queued again
+    task_services.task_claim()
+    assert task_services.task_enqueue_unique(add, a=1, b=2) != task
+    assert Task.objects.count() == 3
+
+
+def test_task_enqueue_unregistered():
+    def not_a_task():
+        pass
+
+    with pytest.raises(ValueError):
+        task_services.task_enqueue(not_a_task)
+    assert not Task.objects.exists()
+
+
+def test_task_run_retries(settings):
+    settings.TASKS_RETRY_DELAY = 30
+    task = task_services.task_enqueue(fail, max_attempts=3)
+
+    assert task_services.tasks_run_pending() == 1
+    task.refresh_from_db()
+    assert task.status == Task.Status.QUEUED
+    assert "RuntimeError: Task failed" in task.error
+    assert task.run_after > timezone.now() + datetime.timedelta(seconds=25)
+    # Not runnable until its retry delay has passed
+    assert task_services.tasks_run_pending() == 0
+
+    _rewind(task, 30)
+    assert task_services.tasks_run_pending() == 1
+    task.refresh_from_db()
+    assert task.status == Task.Status.QUEUED
+    # The delay doubles with each retry
+    assert task.run_after > timezone.now() + datetime.timedelta(seconds=55)
+
+    _rewind(task, 60)
+    assert task_services.tasks_run_pending() == 1
+    task.refresh_from_db()
+    assert task.status == Task.Status.FAILED
+    assert task.attempts == 3
+    assert task.finished_at is not None
+
+    assert task_services.task_retry(task)
+    task.refresh_from_db()
+    assert task.status == Task.Status.QUEUED
+    assert task.attempts == 0
+    assert task.finished_at is None
+    # Only failed tasks can be retried
+    assert not task_services.task_retry(task)
+
+
+def test_task_run_unknown_name():
+    task = Task.objects.create(name="huntsite.missing.task", max_attempts=1)
+    assert task_services.tasks_run_pending() == 1
+    task.refresh_from_db()
+    assert task.status == Task.Status.FAILED
+    assert "No task is registered as huntsite.missing.task" in task.error
+
+
+def test_tasks_run_pending_order_and_limit():
+    calls.clear()
+    later = task_services.task_enqueue(add, a=2, b=2)
+    _rewind(later, 10)
+    future = task_services.task_enqueue(
+        add, run_after=timezone.now() + datetime.timedelta(hours=1), a=3, b=3
+    )
+    earlier = task_services.task_enqueue(add, a=1, b=1)
+    _rewind(earlier, 20)
+
+    assert task_services.tasks_run_pending(max_tasks=1) == 1
+    assert calls == [(1, 1)]
+    assert task_services.tasks_run_pending() == 1
+    assert calls == [(1, 1), (2, 2)]
+    future.refresh_from_db()
+    assert future.status == Task.Status.QUEUED
+
+
+def test_task_claim_expired_lock(settings):
+    settings.TASKS_LOCK_TIMEOUT = 60
+    task = task_services.task_enqueue(add, max_attempts=2, a=1, b=1)
+    claimed = task_services.task_claim()
+    assert claimed == task
+    assert claimed.status == Task.Status.RUNNING
+    # A running task isn't claimed by another worker
+    assert task_services.task_claim() is None
+
+    # Claimed again if its worker stopped without finishing it
+    _rewind(claimed, 61)
+    claimed = task_services.task_claim()
+    assert claimed == task
+    assert claimed.attempts == 2
+
+    # Until it's used up its attempts
+    _rewind(claimed, 61)
+    assert task_services.task_claim() is None
+    task.refresh_from_db()
+    assert task.status == Task.Status.FAILED
+    assert task.error == "Worker stopped without finishing the task."
+
+
+def test_send_email_job_task():
+    teams = UserFactory.create_batch(3)
+    job = email_job_create("Subject", "Message", [team.email for team in teams])
+    task = task_services.task_enqueue(send_email_job, job_id=job.pk)
+
+    call_command("run_worker", burst=True)
+    task.refresh_from_db()
+    assert task.status == Task.Status.SUCCEEDED
+    assert task.result == {"num_sent": 3, "num_failed": 0}
+    assert sorted(address for message in mail.outbox for address in message.bcc) == sorted(
+        team.email for team in teams
+    )
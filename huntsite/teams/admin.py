@@ -1,33 +1,36 @@
-import threading
-
 from allauth.account.admin import EmailAddressAdmin as AllAuthEmailAddressAdmin
 from allauth.account.models import EmailAddress
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import Count, Q
 from django.utils.safestring import mark_safe
 from django_admin_action_forms import action_with_form
 from django_no_queryset_admin_actions import NoQuerySetAdminActionsMixin
 
 from huntsite.admin import UneditableAsReadOnlyAdminMixin
+from huntsite.tasks.services import task_enqueue
 from huntsite.teams.forms import SendEmailAdminForm
 import huntsite.teams.models as models
 from huntsite.teams.services import (
     email_address_select_all_active,
-    send_email,
-    user_clear_password,
-    user_deactivate,
+    email_job_create,
+    email_job_retry_failed,
+    users_clear_password,
+    users_deactivate,
 )
+from huntsite.teams.tasks import send_email_job
 
 
 @admin.action(description="Deactivate selected users")
 def deactivate_users(modeladmin, request, queryset):
-    for user in queryset:
-        user_deactivate(user)
+    num_deactivated = users_deactivate(queryset)
+    modeladmin.message_user(request, f"Deactivated {num_deactivated} users.")
 
 
 @admin.action(description="Clear password for selected users")
 def clear_user_passwords(modeladmin, request, queryset):
-    for user in queryset:
-        user_clear_password(user)
+    num_cleared = users_clear_password(queryset)
+    modeladmin.message_user(request, f"Cleared passwords for {num_cleared} users.")
 
 
 @admin.register(models.User)
@@ -78,27 +81,33 @@ class FlairAdmin(admin.ModelAdmin):
         return obj.icon
 
 
+def _queue_email(modeladmin, request, queryset, data, recipients_description):
+    # The job and its task are created together, so that there's never a job without a task
+    # to send it
+    with transaction.atomic():
+        job = email_job_create(
+            subject=data["subject"],
+            message=data["message"],
+            recipient_list=queryset.values_list("email", flat=True),
+            created_by=request.user,
+        )
+        task_enqueue(send_email_job, job_id=job.pk)
+    modeladmin.message_user(
+        request,
+        f"Email to {recipients_description} queued as job {job.pk}. "
+        "It will be sent by the background worker.",
+    )
+
+
 @action_with_form(SendEmailAdminForm, description="Send email to selected email addresses")
 def send_email_to_selected(modeladmin, request, queryset, data):
-    recipients = queryset.values_list("email", flat=True)
-    thread = threading.Thread(
-        target=send_email,
-        kwargs=dict(subject=data["subject"], message=data["message"], recipient_list=recipients),
-    )
-    thread.start()
-    modeladmin.message_user(request, f"Email sent to selected {queryset.count()} addresses.")
+    _queue_email(modeladmin, request, queryset, data, f"selected {queryset.count()} addresses")
 
 
 @action_with_form(SendEmailAdminForm, description="Send email to all email addresses")
 def send_email_to_all(modeladmin, request, data):
     queryset = email_address_select_all_active()
-    recipients = queryset.values_list("email", flat=True)
-    thread = threading.Thread(
-        target=send_email,
-        kwargs=dict(subject=data["subject"], message=data["message"], recipient_list=recipients),
-    )
-    thread.start()
-    modeladmin.message_user(request, f"Email sent to all ({queryset.count()}) addresses.")
+    _queue_email(modeladmin, request, queryset, data, f"all ({queryset.count()}) addresses")
 
 
 admin.site.unregister(EmailAddress)  # Unregister allauth's default admin
@@ -108,3 +117,61 @@ admin.site.unregister(EmailAddress)  # Unregister allauth's default admin
 class EmailAddressAdmin(NoQuerySetAdminActionsMixin, AllAuthEmailAddressAdmin):
     actions = AllAuthEmailAddressAdmin.actions + [send_email_to_selected, send_email_to_all]
     no_queryset_actions = [send_email_to_all]
+
+
+@admin.action(description="Retry failed deliveries of selected email jobs")
+def retry_failed_email_deliveries(modeladmin, request, queryset):
+    num_retried = 0
+    for job in queryset:
+        with transaction.atomic():
+            if num_job_retried := email_job_retry_failed(job):
+                task_enqueue(send_email_job, job_id=job.pk)
+                num_retried += num_job_retried
+    modeladmin.message_user(request, f"Queued {num_retried} failed deliveries to retry.")
+
+
+@admin.register(models.EmailJob)
+class EmailJobAdmin(admin.ModelAdmin):
+    list_display = ("subject", "status", "progress", "created_by", "created_at", "finished_at")
+    list_filter = ("status",)
+    list_select_related = ("created_by",)
+    readonly_fields = ("status", "progress", "created_by", "started_at", "finished_at")
+    ordering = ("-created_at",)
+    actions = [retry_failed_email_deliveries]
+
+    def get_queryset(self, request):
+        status = models.EmailDelivery.Status
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                num_recipients=Count("deliveries"),
+                num_sent=Count("deliveries", filter=Q(deliveries__status=status.SENT)),
+                num_failed=Count("deliveries", filter=Q(deliveries__status=status.FAILED)),
+            )
+        )
+
+    def has_add_permission(self, request):
+        # Jobs are queued by the send email actions of email addresses
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Progress")
+    def progress(self, obj):
+        return f"{obj.num_sent} of {obj.num_recipients} sent, {obj.num_failed} failed"
+
+
+@admin.register(models.EmailDelivery)
+class EmailDeliveryAdmin(admin.ModelAdmin):
+    list_display = ("email", "job", "status", "sent_at")
+    list_filter = ("status",)
+    list_select_related = ("job",)
+    search_fields = ("email",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class TeamsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'huntsite.teams'
+
+    def ready(self):
+        # Connect signal receivers that invalidate the team search index and leaderboard ETag
+        import huntsite.teams.leaderboard_etag  # noqa: F401
+        import huntsite.teams.team_search  # noqa: F401
@@ -0,0 +1,126 @@
+"""Delivery engine for bulk email.
+
+Sending each message with EmailMessage.send() opens a new connection to the email backend per
+message, which for SMTP and HTTP API backends alike costs more than sending the message itself.
+Instead, messages are sent by a pool of worker threads, each of which opens one backend
+connection and sends all of its messages through it with send_messages(). A rate limiter shared
+by the workers spaces messages out to stay under the email provider's rate limits.
+"""
+
+from collections.abc import Iterable
+import queue
+import threading
+import time
+from typing import NamedTuple
+
+from django.core.mail import EmailMessage, get_connection
+from loguru import logger
+
+
+class DeliveryReport(NamedTuple):
+    num_sent: int
+    failed_messages: list[EmailMessage]
+    elapsed: float
+    """Seconds taken to deliver all messages."""
+
+    @property
+    def num_failed(self) -> int:
+        return len(self.failed_messages)
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.num_sent / self.elapsed if self.elapsed else 0.0
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces out calls to wait() to at most rate per second. A rate of
+    0 or None is no limit."""
+
+    def __init__(self, rate: float | None):
+        self._interval = 1 / rate if rate else 0.0
+        self._next_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self._interval:
+            return
+        with self._lock:
+            at = max(self._next_at, time.monotonic())
+            self._next_at = at + self._interval
+        delay = at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _deliver_from_queue(
+    messages: queue.SimpleQueue,
+    rate_limiter: RateLimiter,
+    backend: str | None,
+    failed_messages: list[EmailMessage],
+) -> int:
+    num_sent = 0
+    with get_connection(backend) as connection:
+        while True:
+            try:
+                message = messages.get_nowait()
+            except queue.Empty:
+                return num_sent
+            rate_limiter.wait()
+            try:
+                num_sent += connection.send_messages([message]) or 0
+            except Exception:
+                logger.exception("Failed to send email to {bcc}.", bcc=message.bcc)
+                failed_messages.append(message)
+
+
+def deliver(
+    messages: Iterable[EmailMessage],
+    concurrency: int = 1,
+    rate: float | None = None,
+    backend: str | None = None,
+) -> DeliveryReport:
+    """Send messages using concurrency workers, each reusing one connection to the email backend,
+    at up to rate messages per second overall. Messages that fail to send are logged and counted
+    as failed; if a worker fails to connect, the other workers send its share. Blocks until every
+    message has been attempted."""
+    pending = queue.SimpleQueue()
+    num_messages = 0
+    for message in messages:
+        pending.put(message)
+        num_messages += 1
+    rate_limiter = RateLimiter(rate)
+    results = []
+    failed_messages = []
+
+    def work():
+        try:
+            results.append(_deliver_from_queue(pending, rate_limiter, backend, failed_messages))
+        except Exception:
+            logger.exception("Email delivery worker failed.")
+
+    start = time.perf_counter()
+    workers = [
+        threading.Thread(target=work) for _ in range(max(1, min(concurrency, num_messages)))
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    # Messages left over if every worker failed to connect
+    while not pending.empty():
+        failed_messages.append(pending.get_nowait())
+    report = DeliveryReport(
+        num_sent=sum(results),
+        failed_messages=failed_messages,
+        elapsed=time.perf_counter() - start,
+    )
+    logger.info(
+        "Sent {num_sent} of {num_messages} emails in {elapsed:.1f} s "
+        "({rate:.1f} messages/s) with {concurrency} workers.",
+        num_sent=report.num_sent,
+        num_messages=num_messages,
+        elapsed=report.elapsed,
+        rate=report.messages_per_second,
+        concurrency=len(workers),
+    )
+    return report
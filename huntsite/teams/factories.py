@@ -32,6 +32,9 @@ class UserFactory(factory.django.DjangoModelFactory):
 
     team_name = factory.LazyFunction(team_name_text_factory)
     profile = factory.RelatedFactory("huntsite.teams.factories.TeamProfileFactory", "user")
+    leaderboard_entry = factory.RelatedFactory(
+        "huntsite.teams.factories.LeaderboardEntryFactory", "user"
+    )
 
     @factory.post_generation
     def password(obj, create, extracted, **kwargs):
@@ -61,6 +64,13 @@ class TeamProfileFactory(factory.django.DjangoModelFactory):
     members = factory.LazyFunction(team_members_text_factory)
 
 
+class LeaderboardEntryFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = "teams.LeaderboardEntry"
+
+    user = factory.SubFactory(UserFactory, leaderboard_entry=None)
+
+
 class FlairFactory(factory.django.DjangoModelFactory):
     class Meta:
         model = "teams.Flair"
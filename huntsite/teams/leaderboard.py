@@ -0,0 +1,176 @@
+"""Renderer for leaderboard table rows.
+
+Rendering thousands of leaderboard rows through the template engine from model instances is
+dominated by overhead: a User and a LeaderboardEntry per team, a Flair per team's flair, and a
+template lookup per day per row to check whether the team solved it. Instead, rows are built
+from values_list tuples into small __slots__ records, and rendered by joining strings.
+
+Each team's cells other than its rank are rendered once and cached in the configured Django cache,
+keyed by the team's LeaderboardEntry.row_version, which is incremented when the cells change. Only
+the rank cells are rendered for every request. When cells do need to be rendered, the HTML for a
+team's flairs and for its solved days is rendered once per distinct set of flairs or bitmask of
+solved days, and shared between rows.
+"""
+
+from collections import defaultdict
+from collections.abc import Iterable
+import hashlib
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import SafeString, mark_safe
+from django.utils.text import Truncator
+
+from huntsite.puzzles.models import MetapuzzleInfo
+from huntsite.teams.models import Flair
+
+DAYS = range(25)
+"""Days shown as columns of the leaderboard."""
+
+ROW_FIELDS = (
+    "rank",
+    "user_id",
+    "row_version",
+    "user__team_name",
+    "num_solves",
+    "solved_days_mask",
+)
+"""Fields of ranked LeaderboardEntry values_list tuples that rows are built from."""
+
+ROW_CACHE_TIMEOUT = 60 * 60 * 24
+"""Seconds to cache rendered cells for. Cells for outdated row versions are never read again, so
+this only bounds how long they take up space in the cache."""
+
+SOLVED_DAY_SYMBOL = "❆"
+
+
+class LeaderboardRow:
+    """A team's row on the rendered leaderboard."""
+
+    __slots__ = ("rank", "team_id", "cells_html")
+
+    def __init__(self, rank: int, team_id: int, cells_html: SafeString):
+        self.rank = rank
+        self.team_id = team_id
+        self.cells_html = cells_html
+        """Table cells for the team's name, number of solves, and solved days."""
+
+
+class LeaderboardRowBuilder:
+    """Builds LeaderboardRows from values_list tuples of ROW_FIELDS, reading and writing the
+    rows' cells in the cache unless use_cache is False. Metapuzzle icons are loaded when the
+    builder is created, and flairs the first time any cells need to be rendered."""
+
+    def __init__(self, use_cache: bool = True):
+        self._use_cache = use_cache
+        meta_icons = dict(
+            MetapuzzleInfo.objects.values_list("puzzle__calendar_entry__day", "icon")
+        )
+        # Icons are entered by organizers and displayed unescaped, as in templates
+        self._day_symbols = [
+            mark_safe(meta_icons[day]) if day in meta_icons else SOLVED_DAY_SYMBOL for day in DAYS
+        ]
+        # Cells are also keyed by the day symbols, since changing them changes every row
+        self._cache_key_prefix = "teams:leaderboard:row:{}".format(
+            hashlib.md5("".join(self._day_symbols).encode(), usedforsecurity=False).hexdigest()
+        )
+        self._flair_html: dict[int, SafeString] | None = None
+        self._flairs_html: dict[tuple[int, ...], SafeString] = {(): mark_safe("")}
+        self._days_html: dict[int, SafeString] = {}
+
+    def build(self, values: Iterable[tuple]) -> list[LeaderboardRow]:
+        """Build rows for the given values_list tuples. Takes one cache lookup, plus queries for
+        flairs if any rows' cells aren't cached."""
+        values = list(values)
+        if not self._use_cache:
+            rendered = self._render_cells(values)
+            return [
+                LeaderboardRow(rank, team_id, rendered[team_id]) for rank, team_id, *_ in values
+            ]
+        keys = {
+            team_id: f"{self._cache_key_prefix}:{team_id}:{row_version}"
+            for _, team_id, row_version, *_ in values
+        }
+        cells_by_key = cache.get_many(keys.values())
+
+        uncached = [value for value in values if keys[value[1]] not in cells_by_key]
+        if uncached:
+            rendered = self._render_cells(uncached)
+            cache.set_many(
+                {keys[team_id]: cells for team_id, cells in rendered.items()},
+                timeout=ROW_CACHE_TIMEOUT,
+            )
+            cells_by_key.update((keys[team_id], cells) for team_id, cells in rendered.items())
+
+        return [
+            LeaderboardRow(rank, team_id, mark_safe(cells_by_key[keys[team_id]]))
+            for rank, team_id, *_ in values
+        ]
+
+    def _render_cells(self, values: list[tuple]) -> dict[int, SafeString]:
+        if self._flair_html is None:
+            self._flair_html = {
+                flair_id: format_html(
+                    '<span data-tts aria-label="{}">{}</span> ', label, mark_safe(icon)
+                )
+                for flair_id, label, icon in Flair.objects.values_list("id", "label", "icon")
+            }
+        flair_ids_by_team = defaultdict(list)
+        flair_links = (
+            Flair.users.through.objects.filter(user_id__in=[value[1] for value in values])
+            .order_by("flair__order_by")
+            .values_list("user_id", "flair_id")
+        )
+        for team_id, flair_id in flair_links:
+            flair_ids_by_team[team_id].append(flair_id)
+
+        return {
+            team_id: format_html(
+                '<td class="team-name">{}<a href="{}">{}</a></td><td align="right">{}</td>{}',
+                self._get_flairs_html(tuple(flair_ids_by_team[team_id])),
+                reverse("team_detail", args=[team_id]),
+                Truncator(team_name).chars(128),
+                num_solves,
+                self._get_days_html(solved_days_mask),
+            )
+            for _, team_id, _, team_name, num_solves, solved_days_mask in values
+        }
+
+    def _get_flairs_html(self, flair_ids: tuple[int, ...]) -> SafeString:
+        html = self._flairs_html.get(flair_ids)
+        if html is None:
+            html = mark_safe("".join(self._flair_html[flair_id] for flair_id in flair_ids))
+            self._flairs_html[flair_ids] = html
+        return html
+
+    def _get_days_html(self, solved_days_mask: int) -> SafeString:
+        html = self._days_html.get(solved_days_mask)
+        if html is None:
+            html = format_html_join(
+                "",
+                '<td align="center">{}</td>',
+                (
+                    (symbol if solved_days_mask >> day & 1 else "",)
+                    for day, symbol in zip(DAYS, self._day_symbols, strict=True)
+                ),
+            )
+            self._days_html[solved_days_mask] = html
+        return html
+
+
+def render_rows(
+    rows: Iterable[LeaderboardRow],
+    highlighted_team_id: int | None = None,
+    id_prefix: str = "team-",
+) -> SafeString:
+    """Render leaderboard table rows, highlighting the row of the given team. Each row's id is
+    id_prefix followed by its team's id."""
+    parts = []
+    for row in rows:
+        selected = ' class="is-selected"' if row.team_id == highlighted_team_id else ""
+        parts.append(
+            f'<tr id="{id_prefix}{row.team_id}"{selected}><td align="right">{row.rank}</td>'
+            f"{row.cells_html}</tr>"
+        )
+    return mark_safe("".join(parts))
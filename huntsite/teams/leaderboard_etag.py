@@ -0,0 +1,62 @@
+"""Version of the leaderboard, used as the ETag of polls for it.
+
+Teams poll the leaderboard every few seconds, so even a query per poll to check whether it has
+changed adds up. Instead, the version is a token stored in the configured Django cache, which is
+replaced whenever the leaderboard may have changed: when guess_submit() records a solve, whose
+insert doesn't send signals, when a solve is deleted, when the leaderboard is rebuilt, and when
+teams join, leave, or are renamed. If the token is missing from the cache, e.g., because it was
+evicted, a new one is stored, so clients fetch the leaderboard once more than they need to.
+"""
+
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from huntsite.puzzles.models import Solve
+from huntsite.teams.models import LeaderboardEntry, User
+from huntsite.teams.team_search import INDEXED_USER_FIELDS
+
+LEADERBOARD_VERSION_CACHE_KEY = "teams:leaderboard:version"
+
+
+def get_version() -> str:
+    """Return the leaderboard's current version. Takes one cache lookup."""
+    version = cache.get(LEADERBOARD_VERSION_CACHE_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(LEADERBOARD_VERSION_CACHE_KEY, version, timeout=None):
+            # Another request stored a version first
+            version = cache.get(LEADERBOARD_VERSION_CACHE_KEY) or version
+    return version
+
+
+def invalidate():
+    """Replace the leaderboard's version, now and again after the current transaction commits, so
+    that no client can keep a pre-commit leaderboard under the new version."""
+    cache.set(LEADERBOARD_VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+    transaction.on_commit(
+        lambda: cache.set(LEADERBOARD_VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+    )
+
+
+@receiver(post_delete, sender=Solve)
+def invalidate_leaderboard_version_on_solve_delete(sender, **kwargs):
+    invalidate()
+
+
+@receiver(post_save, sender=LeaderboardEntry)
+def invalidate_leaderboard_version_on_team_join(sender, created, **kwargs):
+    if created:
+        invalidate()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_leaderboard_version_on_user_change(sender, update_fields=None, **kwargs):
+    # Saves that can't change the leaderboard's teams or their names, like logins, keep it
+    if update_fields is not None and not INDEXED_USER_FIELDS.intersection(update_fields):
+        return
+    invalidate()
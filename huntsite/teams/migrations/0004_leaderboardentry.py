@@ -0,0 +1,56 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_leaderboard_entries(apps, schema_editor):
+    """Create entries for existing teams. Equivalent to the rebuild_leaderboard command."""
+    User = apps.get_model("teams", "User")
+    LeaderboardEntry = apps.get_model("teams", "LeaderboardEntry")
+    Solve = apps.get_model("puzzles", "Solve")
+    AdventCalendarEntry = apps.get_model("puzzles", "AdventCalendarEntry")
+    MetapuzzleInfo = apps.get_model("puzzles", "MetapuzzleInfo")
+
+    day_by_puzzle = dict(AdventCalendarEntry.objects.values_list("puzzle_id", "day"))
+    is_final_by_metapuzzle = dict(MetapuzzleInfo.objects.values_list("puzzle_id", "is_final"))
+    entries = {
+        user_id: LeaderboardEntry(user_id=user_id)
+        for user_id in User.objects.values_list("id", flat=True)
+    }
+    for user_id, puzzle_id in Solve.objects.values_list("user_id", "puzzle_id"):
+        entry = entries[user_id]
+        entry.num_solves += 1
+        entry.num_meta_solves += puzzle_id in is_final_by_metapuzzle
+        entry.is_finished |= is_final_by_metapuzzle.get(puzzle_id, False)
+        day = day_by_puzzle.get(puzzle_id, -1)
+        if 0 <= day < 63:
+            entry.solved_days_mask |= 1 << day
+    LeaderboardEntry.objects.bulk_create(entries.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('puzzles', '0012_puzzlestats'),
+        ('teams', '0003_alter_flair_users'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='leaderboard_entry', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('is_finished', models.BooleanField(default=False)),
+                ('num_meta_solves', models.PositiveIntegerField(default=0)),
+                ('num_solves', models.PositiveIntegerField(default=0)),
+                ('solved_days_mask', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Leaderboard Entries',
+                'indexes': [models.Index(fields=['-is_finished', '-num_meta_solves', '-num_solves'], name='leaderboard_rank_idx')],
+            },
+        ),
+        migrations.RunPython(populate_leaderboard_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teams', '0004_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leaderboardentry',
+            name='row_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
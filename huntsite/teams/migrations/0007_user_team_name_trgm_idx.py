@@ -0,0 +1,38 @@
+# Generated by Django 5.0.4 on 2026-10-18 11:20
+
+from django.db import migrations
+
+
+def create_team_name_trigram_index(apps, schema_editor):
+    """On Postgres, index team names for case-insensitive substring searches. The indexed
+    expression matches the SQL that Django generates for the icontains and istartswith lookups.
+    Other databases use the in-memory index in huntsite.teams.team_search instead."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            # Without the contrib extensions installed, searches still work, just unindexed
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS teams_user_team_name_trgm_idx ON teams_user "
+        "USING gin (UPPER(team_name::text) gin_trgm_ops)"
+    )
+
+
+def drop_team_name_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS teams_user_team_name_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teams', '0006_leaderboardsnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_team_name_trigram_index, drop_team_name_trigram_index),
+    ]
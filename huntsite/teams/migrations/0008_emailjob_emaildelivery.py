@@ -0,0 +1,47 @@
+# Generated by Django 5.0.4 on 2026-10-18 11:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teams', '0007_user_team_name_trgm_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255)),
+                ('message', models.TextField(help_text='Markdown, sent as both HTML and plain text.')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('sending', 'Sending'), ('finished', 'Finished')], default='queued', max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EmailDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='teams.emailjob')),
+            ],
+            options={
+                'verbose_name_plural': 'Email Deliveries',
+                'indexes': [models.Index(fields=['job', 'status'], name='email_delivery_status_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='emaildelivery',
+            constraint=models.UniqueConstraint(fields=('job', 'email'), name='unique_delivery_per_job_email'),
+        ),
+    ]
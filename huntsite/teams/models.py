@@ -7,9 +7,11 @@ from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import AnonymousUser as DefaultAnonymousUser
 from django.contrib.auth.models import UserManager as DefaultUserManager
 from django.db import models
-from django.db.models import Prefetch
-from django.db.models.signals import post_save
+from django.db.models import F, Func, OuterRef, Prefetch, Q, Subquery, Window
+from django.db.models.functions import Rank
+from django.db.models.signals import m2m_changed, post_save, pre_delete
 from django.dispatch import receiver
+from django.utils.functional import cached_property
 
 
 class UserQuerySet(models.QuerySet):
@@ -132,3 +134,242 @@ class Flair(models.Model):
     label = models.CharField(max_length=255, blank=False)
     order_by = models.IntegerField(default=0)
     users = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name="flairs", blank=True)
+
+
+RANK_FIELDS = ("is_finished", "num_meta_solves", "num_solves")
+"""LeaderboardEntry fields that teams are ranked by, in descending order of each."""
+
+
+class LeaderboardEntryQuerySet(models.QuerySet):
+    def nonprivileged(self):
+        """Entries of the teams that are shown on the leaderboard."""
+        return self.filter(
+            user__is_active=True,
+            user__is_tester=False,
+            user__is_staff=False,
+            user__is_superuser=False,
+        )
+
+    def ranked(self):
+        """Nonprivileged teams' entries in leaderboard order, annotated with their rank. Teams are
+        ranked by (finished the hunt, number of metapuzzle solves, number of solves), and tied
+        teams share a rank, e.g., 1, 2, 2, 4. Tied teams are listed by team name."""
+        return (
+            self.nonprivileged()
+            .annotate(rank=Window(Rank(), order_by=[F(field).desc() for field in RANK_FIELDS]))
+            .order_by(*(f"-{field}" for field in RANK_FIELDS), "user__team_name")
+        )
+
+    def with_overall_rank(self):
+        """Entries annotated with their team's rank on the whole leaderboard, as in ranked().
+        Unlike ranked(), the rank doesn't depend on the queryset's other filters, so this is for
+        selecting a few teams' entries. Each entry's rank is counted by a subquery."""
+        ranked_above = Q(**{f"{RANK_FIELDS[-1]}__gt": OuterRef(RANK_FIELDS[-1])})
+        for field in reversed(RANK_FIELDS[:-1]):
+            ranked_above = Q(**{f"{field}__gt": OuterRef(field)}) | (
+                Q(**{field: OuterRef(field)}) & ranked_above
+            )
+        num_ranked_above = (
+            self.model._default_manager.nonprivileged()
+            .filter(ranked_above)
+            .order_by()
+            .annotate(count=Func(F("pk"), function="COUNT", output_field=models.IntegerField()))
+            .values("count")
+        )
+        return self.annotate(rank=Subquery(num_ranked_above) + 1)
+
+    def position_of(self, entry: "LeaderboardEntry") -> int:
+        """Return the number of nonprivileged teams listed before the entry's team on the
+        leaderboard."""
+        listed_before = Q(user__team_name__lt=entry.user.team_name)
+        for field in reversed(RANK_FIELDS):
+            value = getattr(entry, field)
+            listed_before = Q(**{f"{field}__gt": value}) | (Q(**{field: value}) & listed_before)
+        return self.nonprivileged().filter(listed_before).count()
+
+    def bump_row_versions(self) -> int:
+        """Mark the entries' rendered leaderboard rows as changed."""
+        return self.update(row_version=F("row_version") + 1)
+
+    def record_solve(self, user_id: int, day: int, is_meta: bool, is_final: bool):
+        """Atomically add a solve to a team's entry, creating the entry if it doesn't exist."""
+        updates = {
+            "num_solves": F("num_solves") + 1,
+            "num_meta_solves": F("num_meta_solves") + int(is_meta),
+        }
+        if 0 <= day < LeaderboardEntry.MAX_DAYS:
+            updates["solved_days_mask"] = F("solved_days_mask").bitor(1 << day)
+        if is_final:
+            updates["is_finished"] = True
+        updates["row_version"] = F("row_version") + 1
+        if not self.filter(pk=user_id).update(**updates):
+            self.bulk_create([LeaderboardEntry(user_id=user_id)], ignore_conflicts=True)
+            self.filter(pk=user_id).update(**updates)
+
+
+class LeaderboardEntry(models.Model):
+    """Materialized leaderboard standing for a team, updated as the team solves puzzles so that
+    the leaderboard doesn't need to be computed from all solves. Ranks aren't stored, since one
+    solve can change the rank of every team below it; they're computed by the database with a
+    window function when entries are read. The rebuild_leaderboard management command
+    recomputes all entries from scratch."""
+
+    MAX_DAYS = 63
+    """Solved days are stored as bits of a 64-bit integer."""
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="leaderboard_entry",
+    )
+    is_finished = models.BooleanField(default=False)
+    num_meta_solves = models.PositiveIntegerField(default=0)
+    num_solves = models.PositiveIntegerField(default=0)
+    solved_days_mask = models.BigIntegerField(default=0)
+    row_version = models.PositiveIntegerField(default=0, editable=False)
+    """Incremented whenever the team's leaderboard row changes other than by its rank, i.e., on
+    solves, renames, and flair changes. Cached row HTML is keyed by it."""
+
+    objects = LeaderboardEntryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = "Leaderboard Entries"
+        indexes = [
+            models.Index(
+                fields=["-is_finished", "-num_meta_solves", "-num_solves"],
+                name="leaderboard_rank_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user.team_name} - {self.num_solves} solves"
+
+    @cached_property
+    def solved_days(self) -> list[int]:
+        return [day for day in range(self.MAX_DAYS) if self.solved_days_mask & (1 << day)]
+
+    @staticmethod
+    def days_to_mask(days) -> int:
+        mask = 0
+        for day in days:
+            if 0 <= day < LeaderboardEntry.MAX_DAYS:
+                mask |= 1 << day
+        return mask
+
+
+class LeaderboardSnapshot(models.Model):
+    """Compact copy of every team's leaderboard standing at a point in time, so that the
+    leaderboard as of any past time can be computed from the latest snapshot before it plus the
+    solves since, rather than from every solve. Snapshots are taken by the snapshot_leaderboard
+    management command."""
+
+    STANDING_FIELDS = ("is_finished", "num_meta_solves", "num_solves", "solved_days_mask")
+
+    taken_at = models.DateTimeField(unique=True)
+    standings = models.JSONField()
+    """Parallel arrays of team ids and each of STANDING_FIELDS, keyed by field name."""
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        get_latest_by = "taken_at"
+
+    def __str__(self):
+        return f"Leaderboard as of {self.taken_at.isoformat()}"
+
+    @classmethod
+    def pack_standings(cls, standings: dict[int, list]) -> dict[str, list]:
+        """Convert standings, as {team id: [value of each of STANDING_FIELDS]}, to the format
+        they're stored in."""
+        team_ids = sorted(standings)
+        packed = {"user_id": team_ids}
+        for i, field in enumerate(cls.STANDING_FIELDS):
+            packed[field] = [standings[team_id][i] for team_id in team_ids]
+        return packed
+
+    def unpack_standings(self) -> dict[int, list]:
+        """Return the snapshot's standings as {team id: [value of each of STANDING_FIELDS]}."""
+        columns = [self.standings[field] for field in self.STANDING_FIELDS]
+        return {
+            team_id: [column[i] for column in columns]
+            for i, team_id in enumerate(self.standings["user_id"])
+        }
+
+
+class EmailJob(models.Model):
+    """A bulk email to send to many recipients, whose deliveries are sent by the background task
+    worker rather than by web workers."""
+
+    class Status(models.TextChoices):
+        QUEUED = "queued"
+        SENDING = "sending"
+        FINISHED = "finished"
+
+    subject = models.CharField(max_length=255)
+    message = models.TextField(help_text="Markdown, sent as both HTML and plain text.")
+    status = models.CharField(max_length=16, choices=Status, default=Status.QUEUED)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} ({self.created_at.isoformat()})"
+
+
+class EmailDelivery(models.Model):
+    """An email job's delivery to one recipient."""
+
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        SENDING = "sending"
+        SENT = "sent"
+        FAILED = "failed"
+
+    job = models.ForeignKey(EmailJob, on_delete=models.CASCADE, related_name="deliveries")
+    email = models.EmailField()
+    status = models.CharField(max_length=16, choices=Status, default=Status.PENDING)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    """When a worker claimed the delivery to send it. Deliveries claimed long enough ago that
+    their worker must have died are claimed again."""
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Email Deliveries"
+        constraints = [
+            models.UniqueConstraint(fields=["job", "email"], name="unique_delivery_per_job_email")
+        ]
+        indexes = [models.Index(fields=["job", "status"], name="email_delivery_status_idx")]
+
+    def __str__(self):
+        return f"{self.email} ({self.status})"
+
+
+@receiver(post_save, sender=User)
+def create_leaderboard_entry(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        LeaderboardEntry.objects.create(user=instance)
+    elif update_fields is None or "team_name" in update_fields:
+        # The team may have been renamed
+        LeaderboardEntry.objects.filter(user=instance).bump_row_versions()
+
+
+@receiver(post_save, sender=Flair)
+@receiver(pre_delete, sender=Flair)
+def bump_flair_leaderboard_rows(sender, instance, **kwargs):
+    LeaderboardEntry.objects.filter(user__flairs=instance).bump_row_versions()
+
+
+@receiver(m2m_changed, sender=Flair.users.through)
+def bump_flair_users_leaderboard_rows(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        entries = LeaderboardEntry.objects.filter(user=instance)
+    elif action == "pre_clear":
+        entries = LeaderboardEntry.objects.filter(user__flairs=instance)
+    else:
+        entries = LeaderboardEntry.objects.filter(user__in=pk_set)
+    entries.bump_row_versions()
@@ -1,17 +1,42 @@
+from collections.abc import Iterable, Iterator
+import datetime
 from io import StringIO
 from itertools import islice
-from time import sleep
 
 from allauth.account.models import EmailAddress
 from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from django.core.mail import EmailMultiAlternatives
-from django.db import transaction
+from django.core.paginator import Page, Paginator
+from django.db import connection, transaction
+from django.db.models import Case, Prefetch, Q, QuerySet, Value, When
+from django.db.models.functions import Concat, Left, Replace
 from django.template.loader import render_to_string
+from django.utils import timezone
 from loguru import logger
 import markdown
 from markdown import Markdown
 
-from huntsite.teams.models import User
+from huntsite.puzzles.models import AdventCalendarEntry, MetapuzzleInfo, Solve
+from huntsite.puzzles.tasks import rebuild_puzzle_stats
+from huntsite.tasks.services import task_enqueue_unique
+from huntsite.teams import email_delivery, leaderboard, leaderboard_etag, team_search
+from huntsite.teams.models import (
+    TEAM_NAME_MAX_LENGTH,
+    EmailDelivery,
+    EmailJob,
+    Flair,
+    LeaderboardEntry,
+    LeaderboardSnapshot,
+    User,
+)
+
+DEACTIVATED_EMAIL_DOMAIN = "deactivated.adventhunt.com"
+
+
+def _enqueue_rebuild_puzzle_stats():
+    # Puzzle stats only count active teams, and can't be decremented for a team's guesses
+    transaction.on_commit(lambda: task_enqueue_unique(rebuild_puzzle_stats))
 
 
 @transaction.atomic
@@ -22,10 +47,11 @@ def user_deactivate(user: User):
     user.username = f"deactivated-{old_username}"
     user.team_name = f"{user.team_name} (Deactivated)"
     user.email = (
-        user.email.replace("@", "__at__").replace(".", "__dot__") + "@deactivated.adventhunt.com"
+        user.email.replace("@", "__at__").replace(".", "__dot__") + f"@{DEACTIVATED_EMAIL_DOMAIN}"
     )
     user.set_unusable_password()
     user.save()
+    _enqueue_rebuild_puzzle_stats()
     # Remove allauth email addresses
     email_addresses = EmailAddress.objects.filter(user=user)
     email_addresses.delete()
@@ -45,6 +71,50 @@ def user_clear_password(user: User):
     logger.success("Cleared password for user {user}", user=user)
 
 
+@transaction.atomic
+def users_deactivate(users: QuerySet[User]) -> int:
+    """Deactivate the given users like user_deactivate, but with one UPDATE for all of them,
+    rather than a save per user. Users who are already deactivated are skipped. Returns the
+    number of users deactivated."""
+    user_ids = list(users.filter(is_active=True).values_list("id", flat=True))
+    username_prefix = "deactivated-"
+    team_name_suffix = " (Deactivated)"
+    num_deactivated = User.objects.filter(id__in=user_ids).update(
+        is_active=False,
+        username=Concat(
+            Value(username_prefix),
+            Left("username", User._meta.get_field("username").max_length - len(username_prefix)),
+        ),
+        team_name=Concat(
+            Left("team_name", TEAM_NAME_MAX_LENGTH - len(team_name_suffix)),
+            Value(team_name_suffix),
+        ),
+        email=Concat(
+            Replace(Replace("email", Value("@"), Value("__at__")), Value("."), Value("__dot__")),
+            Value(f"@{DEACTIVATED_EMAIL_DOMAIN}"),
+        ),
+        password=make_password(None),
+    )
+    # Remove allauth email addresses
+    EmailAddress.objects.filter(user_id__in=user_ids).delete()
+    # Updates don't send the post_save signals that would otherwise do these
+    LeaderboardEntry.objects.filter(user_id__in=user_ids).bump_row_versions()
+    leaderboard_etag.invalidate()
+    transaction.on_commit(team_search.invalidate)
+    if num_deactivated:
+        _enqueue_rebuild_puzzle_stats()
+    logger.success("Deactivated {n} users.", n=num_deactivated)
+    return num_deactivated
+
+
+def users_clear_password(users: QuerySet[User]) -> int:
+    """Clear the given users' passwords like user_clear_password, but with one UPDATE for all of
+    them, hashing the empty password only once. Returns the number of users updated."""
+    num_cleared = users.update(password=make_password(""))
+    logger.success("Cleared passwords for {n} users.", n=num_cleared)
+    return num_cleared
+
+
 def email_address_select_all_active():
     """Select all email addresses for active users."""
     return EmailAddress.objects.exclude(user__is_active=False).order_by("user").all()
@@ -80,9 +150,6 @@ def _unmark(text):
     return __md.convert(text)
 
 
-EMAIL_BATCH_SIZE = 10
-
-
 def batched(iterable, n):
     "Batch data into lists of length n. The last batch may be shorter."
     # batched('ABCDEFG', 3) --> ABC DEF G
@@ -94,15 +161,14 @@ def batched(iterable, n):
         yield batch
 
 
-def send_email(subject, message, recipient_list):
-    """Send email to a list of recipients as BCC, with a markdown message converted to both HTML
-    and plaintext."""
-    logger.info(f"Sending email with subject '{subject}' to {len(recipient_list)} recipients.")
-
+def _build_emails(subject, message, recipient_list, batch_size: int | None = None):
+    """Build emails to a list of recipients as BCC, in batches of batch_size, with a markdown
+    message converted to both HTML and plaintext."""
     message_html = render_to_string("email.html", {"content": markdown.markdown(message)})
     message_plain = _unmark(message)
 
-    for batch in batched(recipient_list, EMAIL_BATCH_SIZE):
+    emails = []
+    for batch in batched(recipient_list, batch_size or settings.EMAIL_BATCH_SIZE):
         email = EmailMultiAlternatives(
             subject=subject,
             body=message_plain,
@@ -111,5 +177,380 @@ def send_email(subject, message, recipient_list):
             bcc=batch,
         )
         email.attach_alternative(message_html, "text/html")
-        email.send()
-        sleep(0.1)
+        emails.append(email)
+    return emails
+
+
+def send_email(
+    subject,
+    message,
+    recipient_list,
+    batch_size: int | None = None,
+    concurrency: int | None = None,
+    rate: float | None = None,
+) -> email_delivery.DeliveryReport:
+    """Send email to a list of recipients as BCC, with a markdown message converted to both HTML
+    and plaintext. Recipients are split into messages of batch_size, which are sent by
+    concurrency workers at up to rate messages per second; each defaults to its EMAIL_ setting."""
+    logger.info(f"Sending email with subject '{subject}' to {len(recipient_list)} recipients.")
+    return email_delivery.deliver(
+        _build_emails(subject, message, recipient_list, batch_size=batch_size),
+        concurrency=concurrency or settings.EMAIL_CONCURRENCY,
+        rate=settings.EMAIL_RATE_LIMIT if rate is None else rate,
+    )
+
+
+def email_job_create(
+    subject: str, message: str, recipient_list: Iterable[str], created_by: User | None = None
+) -> EmailJob:
+    """Queue an email to a list of recipients, to be sent by email_job_send. Duplicate
+    recipients are only sent the email once."""
+    with transaction.atomic():
+        job = EmailJob.objects.create(subject=subject, message=message, created_by=created_by)
+        EmailDelivery.objects.bulk_create(
+            (EmailDelivery(job=job, email=email) for email in dict.fromkeys(recipient_list)),
+            batch_size=1000,
+        )
+    logger.info("Queued email job {job}.", job=job)
+    return job
+
+
+def _email_deliveries_claim(job: EmailJob, chunk_size: int) -> list[tuple[int, str]]:
+    """Claim up to chunk_size of a job's deliveries to send, as (id, email) pairs. Deliveries
+    claimed by a worker that didn't finish them within EMAIL_JOB_CLAIM_TIMEOUT are claimed again,
+    so that jobs resume after a worker dies. Deliveries locked by other workers are skipped."""
+    now = timezone.now()
+    claim_expired_at = now - datetime.timedelta(seconds=settings.EMAIL_JOB_CLAIM_TIMEOUT)
+    with transaction.atomic():
+        deliveries = list(
+            job.deliveries.filter(
+                Q(status=EmailDelivery.Status.PENDING)
+                | Q(status=EmailDelivery.Status.SENDING, claimed_at__lt=claim_expired_at)
+            )
+            .select_for_update(skip_locked=True)
+            .order_by("id")
+            .values_list("id", "email")[:chunk_size]
+        )
+        EmailDelivery.objects.filter(id__in=[id for id, _ in deliveries]).update(
+            status=EmailDelivery.Status.SENDING, claimed_at=now
+        )
+    return deliveries
+
+
+def email_job_send(job: EmailJob, chunk_size: int | None = None) -> tuple[int, int]:
+    """Send a job's unsent deliveries, claiming chunk_size at a time, and record each
+    recipient's delivery status. Returns the numbers of recipients sent and failed."""
+    EmailJob.objects.filter(pk=job.pk, status=EmailJob.Status.QUEUED).update(
+        status=EmailJob.Status.SENDING, started_at=timezone.now()
+    )
+    num_sent = num_failed = 0
+    while deliveries := _email_deliveries_claim(job, chunk_size or settings.EMAIL_JOB_CHUNK_SIZE):
+        report = email_delivery.deliver(
+            _build_emails(job.subject, job.message, [email for _, email in deliveries]),
+            concurrency=settings.EMAIL_CONCURRENCY,
+            rate=settings.EMAIL_RATE_LIMIT,
+        )
+        failed_emails = {email for message in report.failed_messages for email in message.bcc}
+        failed_ids = [id for id, email in deliveries if email in failed_emails]
+        sent_ids = [id for id, email in deliveries if email not in failed_emails]
+        EmailDelivery.objects.filter(id__in=sent_ids).update(
+            status=EmailDelivery.Status.SENT, sent_at=timezone.now()
+        )
+        EmailDelivery.objects.filter(id__in=failed_ids).update(status=EmailDelivery.Status.FAILED)
+        num_sent += len(sent_ids)
+        num_failed += len(failed_ids)
+
+    unfinished = [EmailDelivery.Status.PENDING, EmailDelivery.Status.SENDING]
+    if not job.deliveries.filter(status__in=unfinished).exists():
+        EmailJob.objects.filter(pk=job.pk).exclude(status=EmailJob.Status.FINISHED).update(
+            status=EmailJob.Status.FINISHED, finished_at=timezone.now()
+        )
+    if num_sent or num_failed:
+        logger.info(
+            "Sent email job {job} to {num_sent} recipients, {num_failed} failed.",
+            job=job,
+            num_sent=num_sent,
+            num_failed=num_failed,
+        )
+    return num_sent, num_failed
+
+
+def email_job_retry_failed(job: EmailJob) -> int:
+    """Mark a job's failed deliveries to be sent again by email_job_send. Returns the number
+    marked."""
+    with transaction.atomic():
+        num_retried = job.deliveries.filter(status=EmailDelivery.Status.FAILED).update(
+            status=EmailDelivery.Status.PENDING, claimed_at=None
+        )
+        if num_retried:
+            EmailJob.objects.filter(pk=job.pk).update(
+                status=EmailJob.Status.SENDING, finished_at=None
+            )
+    return num_retried
+
+
+LEADERBOARD_PAGE_SIZE = 100
+LEADERBOARD_STREAM_CHUNK_SIZE = 500
+
+
+def _leaderboard_queryset():
+    return (
+        LeaderboardEntry.objects.ranked()
+        .select_related("user")
+        .prefetch_related(Prefetch("user__flairs", queryset=Flair.objects.order_by("order_by")))
+    )
+
+
+def leaderboard_list() -> list[LeaderboardEntry]:
+    """Function to return nonprivileged teams' leaderboard entries in order, each with a rank
+    attribute."""
+    return list(_leaderboard_queryset())
+
+
+def _leaderboard_values(as_of: datetime.datetime | None = None):
+    if as_of is not None:
+        return _leaderboard_values_as_of(as_of)
+    return LeaderboardEntry.objects.ranked().values_list(*leaderboard.ROW_FIELDS)
+
+
+def _leaderboard_row_builder(as_of: datetime.datetime | None = None):
+    # Historical rows aren't versioned, so their cells mustn't be cached
+    return leaderboard.LeaderboardRowBuilder(use_cache=as_of is None)
+
+
+def leaderboard_page(
+    number, page_size: int = LEADERBOARD_PAGE_SIZE, as_of: datetime.datetime | None = None
+) -> Page:
+    """Function to return a page of compact leaderboard rows, as of the given time if any. Raises
+    django.core.paginator.InvalidPage if there is no such page."""
+    page = Paginator(_leaderboard_values(as_of), page_size).page(number)
+    page.object_list = _leaderboard_row_builder(as_of).build(page.object_list)
+    return page
+
+
+def leaderboard_page_number(
+    user: User, page_size: int = LEADERBOARD_PAGE_SIZE, as_of: datetime.datetime | None = None
+) -> int | None:
+    """Function to return the number of the leaderboard page that lists a team, as of the given
+    time if any, or None if the team isn't on the leaderboard."""
+    if as_of is not None:
+        team_ids = [value[1] for value in _leaderboard_values_as_of(as_of)]
+        return team_ids.index(user.pk) // page_size + 1 if user.pk in team_ids else None
+    entry = (
+        LeaderboardEntry.objects.nonprivileged().select_related("user").filter(user=user).first()
+    )
+    if entry is None:
+        return None
+    return LeaderboardEntry.objects.position_of(entry) // page_size + 1
+
+
+def leaderboard_chunks(
+    chunk_size: int = LEADERBOARD_STREAM_CHUNK_SIZE, as_of: datetime.datetime | None = None
+) -> Iterator[list[leaderboard.LeaderboardRow]]:
+    """Generator of all compact leaderboard rows in order, as of the given time if any, in lists
+    of up to chunk_size rows. Current rows are fetched as they're consumed, so the whole
+    leaderboard is never held in memory."""
+    builder = _leaderboard_row_builder(as_of)
+    values = _leaderboard_values(as_of)
+    values = iter(values) if as_of is not None else values.iterator(chunk_size=chunk_size)
+    while chunk := list(islice(values, chunk_size)):
+        yield builder.build(chunk)
+
+
+def leaderboard_prewarm() -> int:
+    """Function to render every leaderboard row whose cells aren't cached, e.g., ahead of the
+    traffic of a puzzle release. Returns the number of rows."""
+    return sum(len(rows) for rows in leaderboard_chunks())
+
+
+LEADERBOARD_SEARCH_LIMIT = 20
+
+
+def _team_search_ids(query: str, limit: int) -> list[int]:
+    if connection.vendor == "postgresql":
+        # The icontains and istartswith lookups use the trigram index on team names
+        teams = (
+            User.nonprivileged.filter(team_name__icontains=query)
+            .annotate(
+                is_prefix=Case(
+                    When(team_name__istartswith=query, then=Value(True)), default=Value(False)
+                )
+            )
+            .order_by("-is_prefix", "team_name")
+        )
+        return list(teams.values_list("id", flat=True)[:limit])
+    return team_search.search(query, limit)
+
+
+def leaderboard_search(
+    query: str, limit: int = LEADERBOARD_SEARCH_LIMIT, as_of: datetime.datetime | None = None
+) -> list[leaderboard.LeaderboardRow]:
+    """Function to return compact leaderboard rows, as of the given time if any, for up to limit
+    teams whose names contain the query, ignoring case. Teams whose names start with the query
+    come first, and are otherwise ordered by name."""
+    query = query.strip()
+    if not query:
+        return []
+    team_ids = _team_search_ids(query, limit)
+    if as_of is not None:
+        matched = set(team_ids)
+        values = [value for value in _leaderboard_values_as_of(as_of) if value[1] in matched]
+    else:
+        values = (
+            LeaderboardEntry.objects.filter(user_id__in=team_ids)
+            .with_overall_rank()
+            .values_list(*leaderboard.ROW_FIELDS)
+        )
+    values_by_team = {value[1]: value for value in values}
+    return _leaderboard_row_builder(as_of).build(
+        values_by_team[team_id] for team_id in team_ids if team_id in values_by_team
+    )
+
+
+def leaderboard_num_teams(as_of: datetime.datetime | None = None) -> int:
+    """Function to return the number of teams on the leaderboard, as of the given time if any."""
+    entries = LeaderboardEntry.objects.nonprivileged()
+    if as_of is not None:
+        entries = entries.filter(user__date_joined__lte=as_of)
+    return entries.count()
+
+
+def leaderboard_version() -> str:
+    """Function to return a version string for the leaderboard, which changes when a solve is
+    recorded or deleted, when the leaderboard is rebuilt, and when teams join, leave, or are
+    renamed. It's read from the cache without querying, so it's used as the leaderboard's ETag."""
+    return leaderboard_etag.get_version()
+
+
+LEADERBOARD_ROW_FIELDS = {
+    "rank": "rank",
+    "id": "user_id",
+    "name": "user__team_name",
+    "solved_days_mask": "solved_days_mask",
+    "is_finished": "is_finished",
+    "num_meta_solves": "num_meta_solves",
+    "num_solves": "num_solves",
+}
+"""Keys of the leaderboard rows returned by leaderboard_rows, mapped to the fields they're read
+from."""
+
+
+def leaderboard_rows() -> list[dict]:
+    """Function to return the leaderboard in order as JSON-serializable dictionaries, without
+    instantiating model instances."""
+    rows = LeaderboardEntry.objects.ranked().values_list(*LEADERBOARD_ROW_FIELDS.values())
+    return [dict(zip(LEADERBOARD_ROW_FIELDS, row, strict=True)) for row in rows]
+
+
+def _replay_solves(standings: dict[int, list], solves: Iterable[tuple[int, int]]):
+    """Add solves, as (team id, puzzle id) pairs, to standings in the format of
+    LeaderboardSnapshot.unpack_standings."""
+    day_by_puzzle = dict(AdventCalendarEntry.objects.values_list("puzzle_id", "day"))
+    is_final_by_metapuzzle = dict(MetapuzzleInfo.objects.values_list("puzzle_id", "is_final"))
+    for user_id, puzzle_id in solves:
+        standing = standings.setdefault(user_id, [False, 0, 0, 0])
+        standing[0] = standing[0] or is_final_by_metapuzzle.get(puzzle_id, False)
+        standing[1] += puzzle_id in is_final_by_metapuzzle
+        standing[2] += 1
+        standing[3] |= LeaderboardEntry.days_to_mask([day_by_puzzle.get(puzzle_id, -1)])
+
+
+def leaderboard_rebuild() -> int:
+    """Recompute all teams' leaderboard entries from the Solve table. Returns the number of
+    entries written. Existing entries are locked first, so solves recorded during the rebuild
+    either are counted by it or update its results afterwards."""
+    with transaction.atomic():
+        list(LeaderboardEntry.objects.select_for_update())
+        standings = {
+            user_id: [False, 0, 0, 0] for user_id in User.objects.values_list("id", flat=True)
+        }
+        _replay_solves(standings, Solve.objects.values_list("user_id", "puzzle_id"))
+        entries = [
+            LeaderboardEntry(
+                user_id=user_id,
+                is_finished=is_finished,
+                num_meta_solves=num_meta_solves,
+                num_solves=num_solves,
+                solved_days_mask=solved_days_mask,
+            )
+            for user_id, (is_finished, num_meta_solves, num_solves, solved_days_mask) in (
+                standings.items()
+            )
+        ]
+        LeaderboardEntry.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=list(LeaderboardSnapshot.STANDING_FIELDS),
+        )
+        LeaderboardEntry.objects.bump_row_versions()
+        leaderboard_etag.invalidate()
+    logger.info("Rebuilt leaderboard entries for {n} teams.", n=len(entries))
+    return len(entries)
+
+
+LEADERBOARD_SNAPSHOT_DELAY = datetime.timedelta(minutes=1)
+"""How long before the current time snapshots are taken as of, so that solves whose
+transactions were still being committed are included."""
+
+
+def _standings_as_of(as_of: datetime.datetime) -> dict[int, list]:
+    """Compute all teams' standings as of a time, from the latest snapshot taken at or before
+    that time plus the solves since, in the format of LeaderboardSnapshot.unpack_standings."""
+    snapshot = (
+        LeaderboardSnapshot.objects.filter(taken_at__lte=as_of).order_by("-taken_at").first()
+    )
+    solves = Solve.objects.filter(created_at__lte=as_of)
+    if snapshot is None:
+        standings = {}
+    else:
+        standings = snapshot.unpack_standings()
+        solves = solves.filter(created_at__gt=snapshot.taken_at)
+    _replay_solves(standings, solves.values_list("user_id", "puzzle_id"))
+    return standings
+
+
+def _leaderboard_values_as_of(as_of: datetime.datetime) -> list[tuple]:
+    """Leaderboard rows as of a time, as tuples of leaderboard.ROW_FIELDS. Includes the
+    nonprivileged teams that had registered by then."""
+    teams = (
+        LeaderboardEntry.objects.nonprivileged()
+        .filter(user__date_joined__lte=as_of)
+        .values_list("user_id", "user__team_name")
+    )
+    standings = _standings_as_of(as_of)
+    no_solves = [False, 0, 0, 0]
+    ordered = sorted(
+        ((standings.get(user_id, no_solves), user_id, team_name) for user_id, team_name in teams),
+        key=lambda team: (not team[0][0], -team[0][1], -team[0][2], team[2]),
+    )
+
+    values = []
+    rank = 0
+    previous_key = None
+    for position, (standing, user_id, team_name) in enumerate(ordered, start=1):
+        is_finished, num_meta_solves, num_solves, solved_days_mask = standing
+        key = (is_finished, num_meta_solves, num_solves)
+        if key != previous_key:
+            rank = position
+            previous_key = key
+        values.append((rank, user_id, 0, team_name, num_solves, solved_days_mask))
+    return values
+
+
+def leaderboard_snapshot_take(taken_at: datetime.datetime | None = None) -> LeaderboardSnapshot:
+    """Take a snapshot of all teams' leaderboard standings as of a time, by default
+    LEADERBOARD_SNAPSHOT_DELAY before now. Replaces any snapshot taken at the same time."""
+    if taken_at is None:
+        taken_at = timezone.now() - LEADERBOARD_SNAPSHOT_DELAY
+    standings = _standings_as_of(taken_at)
+    snapshot, _ = LeaderboardSnapshot.objects.update_or_create(
+        taken_at=taken_at,
+        defaults={"standings": LeaderboardSnapshot.pack_standings(standings)},
+    )
+    logger.info(
+        "Took leaderboard snapshot of {n} teams as of {taken_at}.",
+        n=len(standings),
+        taken_at=taken_at,
+    )
+    return snapshot
@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from huntsite.puzzles.models import AdventCalendarEntry, MetapuzzleInfo, Solve
+from huntsite.tasks.registry import register
+from huntsite.tasks.services import task_enqueue_unique
+from huntsite.teams import services as team_services
+from huntsite.teams.models import EmailJob
+
+
+@register
+def send_email_job(job_id: int) -> dict:
+    """Send an email job queued from the admin. Failed recipients don't fail the task; they're
+    recorded on the job's deliveries."""
+    num_sent, num_failed = team_services.email_job_send(EmailJob.objects.get(pk=job_id))
+    return {"num_sent": num_sent, "num_failed": num_failed}
+
+
+@register
+def rebuild_leaderboard() -> dict:
+    return {"num_teams": team_services.leaderboard_rebuild()}
+
+
+def _enqueue_rebuild_leaderboard():
+    transaction.on_commit(lambda: task_enqueue_unique(rebuild_leaderboard))
+
+
+# Leaderboard entries are only updated incrementally when solves are recorded, so changes that
+# can't be applied incrementally rebuild them in the background
+@receiver(post_delete, sender=Solve)
+def rebuild_leaderboard_on_solve_delete(sender, **kwargs):
+    _enqueue_rebuild_leaderboard()
+
+
+@receiver(post_save, sender=MetapuzzleInfo)
+@receiver(post_delete, sender=MetapuzzleInfo)
+@receiver(post_save, sender=AdventCalendarEntry)
+@receiver(post_delete, sender=AdventCalendarEntry)
+def rebuild_leaderboard_on_puzzle_change(sender, instance, **kwargs):
+    # Whether a puzzle is a meta, the final meta, or on a given day only matters once solved
+    if Solve.objects.filter(puzzle_id=instance.puzzle_id).exists():
+        _enqueue_rebuild_leaderboard()
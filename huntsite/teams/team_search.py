@@ -0,0 +1,143 @@
+"""In-process index of team names, used to search teams on databases without a trigram index.
+
+On Postgres, team name searches use the trigram index created by the teams app's migrations. On
+other databases, a case-insensitive substring search can't use an index, so searches use this
+index instead. It holds the leaderboard's teams sorted by casefolded name, so that prefix matches
+are found by bisection, and a map from each trigram of the names to the teams whose names contain
+it, so that substring matches are only checked against teams that contain every trigram of the
+query.
+
+The index is loaded from the database on first use and held in memory by each worker process. It
+is invalidated by saves of User objects that can change the leaderboard's teams or their names,
+and by deletes of User objects. As with the answer index, invalidation also bumps a version
+stored in the configured Django cache, which each process checks before using its index.
+"""
+
+import bisect
+import threading
+from typing import NamedTuple
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from loguru import logger
+
+from huntsite.teams.models import User
+
+TEAM_SEARCH_INDEX_VERSION_CACHE_KEY = "teams:team_search:version"
+
+INDEXED_USER_FIELDS = frozenset(
+    {"team_name", "is_active", "is_tester", "is_staff", "is_superuser"}
+)
+"""User fields that determine whether and under what name a team is in the index."""
+
+
+def _normalize(text: str) -> str:
+    return text.casefold()
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class TeamSearchIndex(NamedTuple):
+    names: list[str]
+    """Casefolded team names, sorted."""
+    team_ids: list[int]
+    """Ids of the teams with the names at the same positions."""
+    positions_by_trigram: dict[str, list[int]]
+    """Positions of the names containing each trigram, in order."""
+
+    @classmethod
+    def build(cls, teams: list[tuple[int, str]]) -> "TeamSearchIndex":
+        teams = sorted((_normalize(team_name), team_id) for team_id, team_name in teams)
+        positions_by_trigram = {}
+        for position, (name, _) in enumerate(teams):
+            for trigram in _trigrams(name):
+                positions_by_trigram.setdefault(trigram, []).append(position)
+        return cls(
+            names=[name for name, _ in teams],
+            team_ids=[team_id for _, team_id in teams],
+            positions_by_trigram=positions_by_trigram,
+        )
+
+    def search(self, query: str, limit: int) -> list[int]:
+        """Return the ids of up to limit teams whose names contain the query, ignoring case.
+        Teams whose names start with the query come first, and are otherwise ordered by name."""
+        query = _normalize(query)
+        if not query:
+            return []
+
+        start = bisect.bisect_left(self.names, query)
+        end = start
+        while end < len(self.names) and end - start < limit and self.names[end].startswith(query):
+            end += 1
+        positions = list(range(start, end))
+
+        if len(positions) < limit:
+            query_trigrams = _trigrams(query)
+            if query_trigrams:
+                posting_lists = sorted(
+                    (self.positions_by_trigram.get(trigram, []) for trigram in query_trigrams),
+                    key=len,
+                )
+                candidates = posting_lists[0]
+            else:
+                # Queries shorter than a trigram are checked against every name
+                candidates = range(len(self.names))
+            for position in candidates:
+                name = self.names[position]
+                if query in name and not name.startswith(query):
+                    positions.append(position)
+                    if len(positions) == limit:
+                        break
+        return [self.team_ids[position] for position in positions]
+
+
+_index: TeamSearchIndex | None = None
+_index_version: str | None = None
+_lock = threading.Lock()
+
+
+def _load_index() -> TeamSearchIndex:
+    return TeamSearchIndex.build(list(User.nonprivileged.values_list("id", "team_name")))
+
+
+def _get_index() -> TeamSearchIndex:
+    global _index, _index_version
+    version = cache.get(TEAM_SEARCH_INDEX_VERSION_CACHE_KEY)
+    index = _index
+    if index is None or version != _index_version:
+        with _lock:
+            index = _index = _load_index()
+            _index_version = version
+            logger.debug("Loaded team search index with {n} teams.", n=len(index.names))
+    return index
+
+
+def search(query: str, limit: int) -> list[int]:
+    """Return the ids of up to limit leaderboard teams whose names contain the query, ignoring
+    case, with the teams whose names start with it first, and otherwise in order of name."""
+    return _get_index().search(query, limit)
+
+
+def invalidate():
+    """Invalidate the team search index in this process and in all other processes sharing the
+    configured cache."""
+    global _index
+    with _lock:
+        _index = None
+    cache.set(TEAM_SEARCH_INDEX_VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_team_search_index(sender, update_fields=None, **kwargs):
+    # Saves that can't change the index, like logins, keep it
+    if update_fields is not None and not INDEXED_USER_FIELDS.intersection(update_fields):
+        return
+    # Invalidate again after commit so that no process can reload pre-commit data
+    invalidate()
+    transaction.on_commit(invalidate)
@@ -0,0 +1,59 @@
+import time
+from unittest import mock
+
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend
+import pytest
+
+from huntsite.teams.email_delivery import RateLimiter, deliver
+
+
+def _messages(n: int) -> list[EmailMessage]:
+    return [EmailMessage(subject=f"Message {i}", to=[f"team{i}@example.com"]) for i in range(n)]
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_deliver(concurrency):
+    """Every message should be sent, with one connection per worker."""
+    with mock.patch.object(EmailBackend, "open", autospec=True) as open_connection:
+        report = deliver(_messages(20), concurrency=concurrency)
+    assert open_connection.call_count == concurrency
+    assert (report.num_sent, report.num_failed) == (20, 0)
+    assert report.messages_per_second > 0
+    assert sorted(email.subject for email in mail.outbox) == sorted(
+        email.subject for email in _messages(20)
+    )
+
+
+def test_deliver_failures():
+    """Messages that fail to send should be counted without stopping the others."""
+    send_messages = EmailBackend.send_messages
+
+    def fail_some(self, messages):
+        if messages[0].subject.endswith("3"):
+            raise ConnectionError
+        return send_messages(self, messages)
+
+    with mock.patch.object(EmailBackend, "send_messages", fail_some):
+        report = deliver(_messages(10), concurrency=2)
+    assert (report.num_sent, report.num_failed) == (9, 1)
+    assert len(mail.outbox) == 9
+
+
+def test_deliver_no_messages():
+    assert deliver([], concurrency=4).num_sent == 0
+
+
+def test_rate_limiter():
+    rate_limiter = RateLimiter(rate=100)
+    start = time.monotonic()
+    for _ in range(11):
+        rate_limiter.wait()
+    assert time.monotonic() - start >= 0.1
+
+    rate_limiter = RateLimiter(rate=0)
+    start = time.monotonic()
+    for _ in range(1000):
+        rate_limiter.wait()
+    assert time.monotonic() - start < 0.1
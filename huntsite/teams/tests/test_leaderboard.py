@@ -0,0 +1,113 @@
+from bs4 import BeautifulSoup
+import pytest
+
+from huntsite.puzzles.factories import MetapuzzleInfoFactory, PuzzleFactory
+from huntsite.puzzles.services import guess_submit
+from huntsite.teams.factories import FlairFactory, UserFactory
+from huntsite.teams.leaderboard import DAYS, ROW_FIELDS, LeaderboardRowBuilder, render_rows
+from huntsite.teams.models import LeaderboardEntry
+
+pytestmark = pytest.mark.django_db
+
+
+def _build_rows(builder=None):
+    values = LeaderboardEntry.objects.ranked().order_by("user_id").values_list(*ROW_FIELDS)
+    return (builder or LeaderboardRowBuilder()).build(values)
+
+
+def _cells(row) -> list[str]:
+    return [cell.decode_contents() for cell in BeautifulSoup(row.cells_html, "html.parser")("td")]
+
+
+def test_leaderboard_row_builder():
+    MetapuzzleInfoFactory(puzzle__calendar_entry__day=2, icon="⭐")
+    team1 = UserFactory(team_name="<Team 1>")
+    team2, team3 = UserFactory.create_batch(2)
+    FlairFactory(icon="🎁", label="<Backer>", order_by=2, users=[team1, team2])
+    FlairFactory(icon="🦌", label="Reindeer", order_by=1, users=[team1])
+    mask = LeaderboardEntry.days_to_mask([1, 2])
+    LeaderboardEntry.objects.filter(user__in=[team1, team2]).update(
+        num_solves=2, solved_days_mask=mask
+    )
+
+    rows = _build_rows()
+    assert [row.team_id for row in rows] == [team1.pk, team2.pk, team3.pk]
+
+    # Flairs are in order and the team name links to the team, all escaped
+    cells = _cells(rows[0])
+    assert cells[0] == (
+        '<span aria-label="Reindeer" data-tts="">🦌</span> '
+        '<span aria-label="&lt;Backer&gt;" data-tts="">🎁</span> '
+        f'<a href="/teams/{team1.pk}/">&lt;Team 1&gt;</a>'
+    )
+    assert cells[1] == "2"
+    # Solved days show the metapuzzle icon on metapuzzle days
+    assert len(cells) == 2 + len(DAYS)
+    assert cells[2:5] == ["", "❆", "⭐"]
+    assert cells[5:] == [""] * (len(DAYS) - 3)
+
+    assert _cells(rows[2])[2:] == [""] * len(DAYS)
+
+
+def test_render_rows():
+    team1, team2 = UserFactory.create_batch(2)
+    rows = BeautifulSoup(render_rows(_build_rows(), highlighted_team_id=team2.pk), "html.parser")(
+        "tr"
+    )
+    assert [row["id"] for row in rows] == [f"team-{team1.pk}", f"team-{team2.pk}"]
+    assert rows[0].td.text == "1"
+    assert not rows[0].get("class")
+    assert rows[1]["class"] == ["is-selected"]
+
+
+def test_leaderboard_row_cache(locmem_cache, django_assert_num_queries):
+    """Cached cells should be used until the team's row changes."""
+    puzzle = PuzzleFactory(calendar_entry__day=3)
+    team = UserFactory(team_name="Team")
+    flair = FlairFactory(icon="🎁", users=[team])
+    _build_rows()
+
+    # Metapuzzle icons + entries, without querying flairs
+    with django_assert_num_queries(2):
+        rows = _build_rows()
+    assert "🎁" in rows[0].cells_html
+
+    guess_submit(puzzle, team, puzzle.answer)
+    assert _cells(_build_rows()[0])[2 + 3] == "❆"
+
+    team.team_name = "Renamed"
+    team.save()
+    assert "Renamed" in _build_rows()[0].cells_html
+
+    # Saves that can't rename the team, like logins, don't change the row
+    row_version = LeaderboardEntry.objects.get(user=team).row_version
+    team.save(update_fields=["last_login"])
+    assert LeaderboardEntry.objects.get(user=team).row_version == row_version
+
+    flair.icon = "🦌"
+    flair.save()
+    assert "🦌" in _build_rows()[0].cells_html
+
+    flair.users.remove(team)
+    assert "🦌" not in _build_rows()[0].cells_html
+
+    team.flairs.add(flair)
+    assert "🦌" in _build_rows()[0].cells_html
+
+    flair.delete()
+    assert "🦌" not in _build_rows()[0].cells_html
+
+    # Changing metapuzzle icons changes every row
+    MetapuzzleInfoFactory(puzzle=puzzle, icon="⭐")
+    assert _cells(_build_rows()[0])[2 + 3] == "⭐"
+
+
+def test_leaderboard_row_builder_num_queries(django_assert_num_queries):
+    FlairFactory(users=UserFactory.create_batch(3))
+    # Metapuzzle icons
+    with django_assert_num_queries(1):
+        builder = LeaderboardRowBuilder()
+    values = list(LeaderboardEntry.objects.ranked().values_list(*ROW_FIELDS))
+    # Flairs + flair links, without a cache
+    with django_assert_num_queries(2):
+        builder.build(values)
@@ -1,15 +1,48 @@
+import datetime
 from textwrap import dedent
+from unittest import mock
 
 from django.conf import settings
 from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.paginator import InvalidPage
+from django.utils import timezone
 import pytest
 
+from huntsite.puzzles.factories import MetapuzzleInfoFactory, PuzzleFactory
+from huntsite.puzzles.models import PuzzleStats, Solve
+from huntsite.puzzles.services import guess_submit
+from huntsite.tasks.services import tasks_run_pending
 from huntsite.teams.factories import NO_EMAIL_ADDRESSES, EmailAddressFactory, UserFactory
+from huntsite.teams.models import (
+    EmailDelivery,
+    EmailJob,
+    LeaderboardEntry,
+    LeaderboardSnapshot,
+    User,
+)
 from huntsite.teams.services import (
+    _email_deliveries_claim,
     _unmark,
     email_address_select_all_active,
+    email_job_create,
+    email_job_retry_failed,
+    email_job_send,
+    leaderboard_chunks,
+    leaderboard_list,
+    leaderboard_num_teams,
+    leaderboard_page,
+    leaderboard_page_number,
+    leaderboard_rebuild,
+    leaderboard_rows,
+    leaderboard_search,
+    leaderboard_snapshot_take,
+    leaderboard_version,
     send_email,
+    user_clear_password,
     user_deactivate,
+    users_clear_password,
+    users_deactivate,
 )
 
 pytestmark = pytest.mark.django_db
@@ -46,6 +79,78 @@ def test_user_deactivate(client):
     assert not user3.is_active
 
 
+def test_users_deactivate(django_assert_num_queries):
+    """Bulk deactivation should have the same effects as user_deactivate."""
+    users = [
+        UserFactory(email=f"team{i}@example.com", email_addresses=[f"dancer{i}@example.com"])
+        for i in range(4)
+    ]
+    old = {user.pk: (user.username, user.team_name) for user in users}
+    kept = UserFactory()
+
+    # Savepoint, user ids, users, email addresses and their confirmations (3), leaderboard
+    # entries, and release, however many users are deactivated
+    with django_assert_num_queries(8):
+        assert users_deactivate(User.objects.filter(pk__in=old)) == 4
+    for i, user in enumerate(users):
+        user.refresh_from_db()
+        old_username, old_team_name = old[user.pk]
+        assert not user.is_active
+        assert user.username == f"deactivated-{old_username}"
+        assert user.team_name == f"{old_team_name} (Deactivated)"
+        assert user.email == f"team{i}__at__example__dot__com@deactivated.adventhunt.com"
+        assert not user.has_usable_password()
+        assert user.emailaddress_set.count() == 0
+    kept.refresh_from_db()
+    assert kept.is_active
+    assert kept.emailaddress_set.count() == 1
+
+    # Deactivated users are skipped
+    assert users_deactivate(User.objects.filter(pk=users[0].pk)) == 0
+    users[0].refresh_from_db()
+    assert users[0].username.count("deactivated-") == 1
+
+
+def test_users_deactivate_rebuilds_puzzle_stats(django_capture_on_commit_callbacks):
+    """Deactivating teams should rebuild the puzzle stats in the background, so that they stop
+    counting the teams' solves and guesses."""
+    puzzle = PuzzleFactory()
+    teams = UserFactory.create_batch(2)
+    for team in teams:
+        guess_submit(puzzle, team, puzzle.answer)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        users_deactivate(User.objects.filter(pk=teams[0].pk))
+    assert tasks_run_pending() == 1
+    assert PuzzleStats.objects.get(puzzle=puzzle).num_solves == 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user_deactivate(teams[1])
+    assert tasks_run_pending() == 1
+    assert PuzzleStats.objects.get(puzzle=puzzle).num_solves == 0
+
+
+def test_users_deactivate_long_names():
+    user = UserFactory(username="u" * 150, team_name="t" * 127)
+    users_deactivate(User.objects.filter(pk=user.pk))
+    user.refresh_from_db()
+    assert user.username == "deactivated-" + "u" * 138
+    assert user.team_name == "t" * 113 + " (Deactivated)"
+
+
+def test_users_clear_password(django_assert_num_queries):
+    """Bulk password clearing should have the same effect as clearing each user's password."""
+    users = UserFactory.create_batch(3)
+    expected = UserFactory()
+    user_clear_password(expected)
+    with django_assert_num_queries(1):
+        assert users_clear_password(User.objects.filter(pk__in=[user.pk for user in users])) == 3
+    for user in [expected, *users]:
+        user.refresh_from_db()
+        assert user.has_usable_password()
+        assert user.check_password("")
+
+
 def test_active_email_select():
     user1_email = EmailAddressFactory(user=UserFactory())
     user2 = UserFactory()
@@ -92,15 +197,416 @@ def test_send_email():
     assert mail.outbox == []
 
     recipients = [email.email for email in email_addresses]
-    send_email(subject, message, recipients)
+    report = send_email(subject, message, recipients)
+    assert (report.num_sent, report.num_failed) == (2, 0)
 
     assert len(mail.outbox) == 2
-    assert mail.outbox[0].subject == subject
-    assert mail.outbox[0].body == message
-    assert mail.outbox[0].to == [settings.EMAIL_REPLY_TO]
-    assert mail.outbox[0].bcc == recipients[:10]
-
-    assert mail.outbox[1].subject == subject
-    assert mail.outbox[1].body == message
-    assert mail.outbox[0].to == [settings.EMAIL_REPLY_TO]
-    assert mail.outbox[1].bcc == recipients[10:]
+    # Messages are sent concurrently, so in any order
+    outbox = sorted(mail.outbox, key=lambda email: len(email.bcc), reverse=True)
+    assert outbox[0].subject == subject
+    assert outbox[0].body == message
+    assert outbox[0].to == [settings.EMAIL_REPLY_TO]
+    assert outbox[0].bcc == recipients[:10]
+
+    assert outbox[1].subject == subject
+    assert outbox[1].body == message
+    assert outbox[1].to == [settings.EMAIL_REPLY_TO]
+    assert outbox[1].bcc == recipients[10:]
+
+
+def test_send_email_batch_size():
+    recipients = [f"team{i}@example.com" for i in range(7)]
+    send_email("Subject", "Message", recipients, batch_size=3, concurrency=2, rate=0)
+    assert sorted(len(email.bcc) for email in mail.outbox) == [1, 3, 3]
+    assert sorted(address for email in mail.outbox for address in email.bcc) == recipients
+
+
+def _delivery_statuses(job):
+    return dict(job.deliveries.values_list("email", "status"))
+
+
+def test_email_job(settings):
+    settings.EMAIL_RATE_LIMIT = 0
+    recipients = [f"team{i}@example.com" for i in range(25)]
+    team = UserFactory()
+    job = email_job_create("Subject", "Message", recipients + recipients[:5], created_by=team)
+    assert job.status == EmailJob.Status.QUEUED
+    assert job.deliveries.count() == 25
+    assert mail.outbox == []
+
+    assert email_job_send(job) == (25, 0)
+    assert sorted(address for email in mail.outbox for address in email.bcc) == sorted(recipients)
+    assert mail.outbox[0].subject == "Subject"
+    assert mail.outbox[0].body == "Message"
+    job.refresh_from_db()
+    assert job.status == EmailJob.Status.FINISHED
+    assert job.started_at <= job.finished_at
+    assert set(_delivery_statuses(job).values()) == {EmailDelivery.Status.SENT}
+
+    # Finished jobs aren't sent again
+    assert email_job_send(job) == (0, 0)
+    assert len(mail.outbox) == 3
+
+
+def test_email_job_resume(settings):
+    """Deliveries claimed by a worker that died should be sent once the claim expires."""
+    settings.EMAIL_RATE_LIMIT = 0
+    recipients = [f"team{i}@example.com" for i in range(25)]
+    job = email_job_create("Subject", "Message", recipients)
+    claimed = _email_deliveries_claim(job, chunk_size=10)
+    assert [email for _, email in claimed] == recipients[:10]
+
+    assert email_job_send(job, chunk_size=10) == (15, 0)
+    job.refresh_from_db()
+    assert job.status == EmailJob.Status.SENDING
+    assert sorted(address for email in mail.outbox for address in email.bcc) == sorted(
+        recipients[10:]
+    )
+
+    expired = timezone.now() - datetime.timedelta(seconds=settings.EMAIL_JOB_CLAIM_TIMEOUT + 1)
+    job.deliveries.filter(status=EmailDelivery.Status.SENDING).update(claimed_at=expired)
+    assert email_job_send(job, chunk_size=10) == (10, 0)
+    job.refresh_from_db()
+    assert job.status == EmailJob.Status.FINISHED
+    assert sorted(address for email in mail.outbox for address in email.bcc) == sorted(recipients)
+
+
+def test_email_job_failures(settings):
+    """Recipients of messages that fail to send should be marked failed, and can be retried."""
+    settings.EMAIL_RATE_LIMIT = 0
+    settings.EMAIL_BATCH_SIZE = 5
+    recipients = [f"team{i}@example.com" for i in range(20)]
+    job = email_job_create("Subject", "Message", recipients)
+    send_messages = EmailBackend.send_messages
+
+    def fail_first_recipient(self, messages):
+        if recipients[0] in messages[0].bcc:
+            raise ConnectionError
+        return send_messages(self, messages)
+
+    with mock.patch.object(EmailBackend, "send_messages", fail_first_recipient):
+        assert email_job_send(job) == (15, 5)
+    statuses = _delivery_statuses(job)
+    assert {email for email, status in statuses.items() if status == "failed"} == set(
+        recipients[:5]
+    )
+    job.refresh_from_db()
+    assert job.status == EmailJob.Status.FINISHED
+
+    assert email_job_retry_failed(job) == 5
+    job.refresh_from_db()
+    assert job.status == EmailJob.Status.SENDING
+    assert email_job_send(job) == (5, 0)
+    assert set(_delivery_statuses(job).values()) == {EmailDelivery.Status.SENT}
+    job.refresh_from_db()
+    assert job.status == EmailJob.Status.FINISHED
+
+
+def _solve_leaderboard_puzzles():
+    """Set up teams with solves covering each leaderboard ranking criterion."""
+    puzzles = [PuzzleFactory(calendar_entry__day=day) for day in range(1, 4)]
+    meta = MetapuzzleInfoFactory(puzzle__calendar_entry__day=12).puzzle
+    final = MetapuzzleInfoFactory(puzzle__calendar_entry__day=24, is_final=True).puzzle
+    teams = {
+        name: UserFactory(team_name=name)
+        for name in ["Finished", "Meta", "Three A", "Three B", "One", "None"]
+    }
+    for puzzle in puzzles:
+        guess_submit(puzzle, teams["Three A"], puzzle.answer)
+        guess_submit(puzzle, teams["Three B"], puzzle.answer)
+    guess_submit(puzzles[0], teams["One"], puzzles[0].answer)
+    guess_submit(meta, teams["Meta"], meta.answer)
+    guess_submit(meta, teams["Finished"], meta.answer)
+    guess_submit(final, teams["Finished"], final.answer)
+    # Privileged teams aren't on the leaderboard
+    guess_submit(final, UserFactory(is_tester=True), final.answer)
+    return teams
+
+
+def test_leaderboard_list():
+    """leaderboard_list should rank teams from their materialized leaderboard entries."""
+    _solve_leaderboard_puzzles()
+
+    entries = leaderboard_list()
+    assert [(entry.rank, entry.user.team_name) for entry in entries] == [
+        (1, "Finished"),
+        (2, "Meta"),
+        (3, "Three A"),
+        (3, "Three B"),
+        (5, "One"),
+        (6, "None"),
+    ]
+    assert entries[0].is_finished
+    assert entries[0].solved_days == [12, 24]
+    assert entries[2].solved_days == [1, 2, 3]
+    assert entries[-1].solved_days == []
+
+
+def test_leaderboard_list_num_queries(django_assert_num_queries):
+    _solve_leaderboard_puzzles()
+
+    # Entries with users + flairs
+    with django_assert_num_queries(2):
+        leaderboard_list()
+
+
+def test_leaderboard_page():
+    """Pages should continue the ranks of the previous pages."""
+    teams = _solve_leaderboard_puzzles()
+
+    page = leaderboard_page(2, page_size=2)
+    assert [(row.rank, row.team_id) for row in page] == [
+        (3, teams["Three A"].pk),
+        (3, teams["Three B"].pk),
+    ]
+    assert page.paginator.count == 6
+    assert page.paginator.num_pages == 3
+    with pytest.raises(InvalidPage):
+        leaderboard_page(4, page_size=2)
+    with pytest.raises(InvalidPage):
+        leaderboard_page("last", page_size=2)
+
+
+def test_leaderboard_page_number():
+    teams = _solve_leaderboard_puzzles()
+
+    assert leaderboard_page_number(teams["Finished"], page_size=2) == 1
+    assert leaderboard_page_number(teams["Meta"], page_size=2) == 1
+    # Tied teams are listed by team name
+    assert leaderboard_page_number(teams["Three A"], page_size=2) == 2
+    assert leaderboard_page_number(teams["Three B"], page_size=2) == 2
+    assert leaderboard_page_number(teams["None"], page_size=2) == 3
+    assert leaderboard_page_number(UserFactory(is_tester=True), page_size=2) is None
+
+
+def test_leaderboard_chunks():
+    """leaderboard_chunks should yield rows for the same teams as leaderboard_list, in chunks."""
+    _solve_leaderboard_puzzles()
+
+    chunks = list(leaderboard_chunks(chunk_size=4))
+    assert [len(chunk) for chunk in chunks] == [4, 2]
+    assert [(row.rank, row.team_id) for chunk in chunks for row in chunk] == [
+        (entry.rank, entry.user_id) for entry in leaderboard_list()
+    ]
+
+
+def test_leaderboard_rows():
+    teams = _solve_leaderboard_puzzles()
+
+    rows = leaderboard_rows()
+    assert rows[0] == {
+        "rank": 1,
+        "id": teams["Finished"].pk,
+        "name": "Finished",
+        "solved_days_mask": (1 << 12) | (1 << 24),
+        "is_finished": True,
+        "num_meta_solves": 2,
+        "num_solves": 2,
+    }
+    assert [(row["rank"], row["name"]) for row in rows] == [
+        (entry.rank, entry.user.team_name) for entry in leaderboard_list()
+    ]
+
+
+def test_leaderboard_version(locmem_cache, django_assert_num_queries):
+    """The leaderboard version should change with solves and with the set of teams, and be read
+    without querying."""
+    puzzle = PuzzleFactory()
+    team = UserFactory()
+    version = leaderboard_version()
+    with django_assert_num_queries(0):
+        assert leaderboard_version() == version
+
+    guess_submit(puzzle, team, "wrong")
+    assert leaderboard_version() == version
+
+    guess_submit(puzzle, team, puzzle.answer)
+    assert leaderboard_version() != version
+    version = leaderboard_version()
+
+    # Deleting a solve other than the latest
+    other_puzzle = PuzzleFactory()
+    guess_submit(other_puzzle, team, other_puzzle.answer)
+    version = leaderboard_version()
+    Solve.objects.get(puzzle=puzzle).delete()
+    assert leaderboard_version() != version
+    version = leaderboard_version()
+
+    # Created without the factory, which mutes the signals sent when teams sign up
+    other_team = User.objects.create(username="other", team_name="Other Team")
+    assert leaderboard_version() != version
+    version = leaderboard_version()
+
+    user_deactivate(other_team)
+    assert leaderboard_version() != version
+    version = leaderboard_version()
+
+    users_deactivate(User.objects.filter(pk=team.pk))
+    assert leaderboard_version() != version
+    version = leaderboard_version()
+
+    # Logins don't change the leaderboard
+    team.save(update_fields=["last_login"])
+    assert leaderboard_version() == version
+
+    leaderboard_rebuild()
+    assert leaderboard_version() != version
+
+
+def test_leaderboard_rebuild():
+    """leaderboard_rebuild should recompute the same entries as the incremental updates."""
+    teams = _solve_leaderboard_puzzles()
+    expected = [
+        (e.user_id, e.is_finished, e.num_meta_solves, e.num_solves, e.solved_days_mask)
+        for e in leaderboard_list()
+    ]
+
+    LeaderboardEntry.objects.all().delete()
+    assert leaderboard_rebuild() == len(teams) + 1
+    assert [
+        (e.user_id, e.is_finished, e.num_meta_solves, e.num_solves, e.solved_days_mask)
+        for e in leaderboard_list()
+    ] == expected
+
+
+def _standing(team):
+    entry = LeaderboardEntry.objects.get(user=team)
+    return (entry.num_meta_solves, entry.num_solves, entry.solved_days_mask)
+
+
+def test_leaderboard_rebuilt_on_changes(django_capture_on_commit_callbacks):
+    """Changes that can't be applied to leaderboard entries incrementally should rebuild them in
+    the background."""
+    puzzle = PuzzleFactory(calendar_entry__day=1)
+    meta = MetapuzzleInfoFactory(puzzle__calendar_entry__day=2).puzzle
+    team = UserFactory()
+    for solved in (puzzle, meta):
+        guess_submit(solved, team, solved.answer)
+    assert _standing(team) == (1, 2, 0b110)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Solve.objects.get(user=team, puzzle=meta).delete()
+    assert tasks_run_pending() == 1
+    assert _standing(team) == (0, 1, 0b10)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        puzzle.calendar_entry.day = 3
+        puzzle.calendar_entry.save()
+        MetapuzzleInfoFactory(puzzle=puzzle)
+    # Rebuilt once for both changes
+    assert tasks_run_pending() == 1
+    assert _standing(team) == (1, 1, 0b1000)
+
+    # Changes to unsolved puzzles don't need a rebuild
+    with django_capture_on_commit_callbacks(execute=True):
+        meta.meta_info.delete()
+    assert tasks_run_pending() == 0
+
+
+def _leaderboard_as_of(as_of):
+    return [(row.rank, row.team_id, row.cells_html) for row in leaderboard_page(1, as_of=as_of)]
+
+
+def test_leaderboard_as_of():
+    """The leaderboard as of a time should be the leaderboard as it was then, whether or not
+    there's a snapshot before that time."""
+    teams = _solve_leaderboard_puzzles()
+    before = timezone.now()
+    expected = _leaderboard_as_of(None)
+    assert _leaderboard_as_of(before) == expected
+
+    # A later solve and a later team
+    puzzle = PuzzleFactory(calendar_entry__day=5)
+    guess_submit(puzzle, teams["None"], puzzle.answer)
+    late_team = UserFactory(team_name="Late")
+    assert _leaderboard_as_of(before) == expected
+    assert leaderboard_num_teams(as_of=before) == len(teams)
+    assert leaderboard_num_teams() == len(teams) + 1
+    assert leaderboard_page_number(teams["None"], as_of=before, page_size=5) == 2
+    assert leaderboard_page_number(teams["None"], page_size=5) == 1
+    assert leaderboard_page_number(late_team, as_of=before) is None
+
+    leaderboard_snapshot_take(before - datetime.timedelta(seconds=1))
+    assert _leaderboard_as_of(before) == expected
+    leaderboard_snapshot_take(before)
+    assert _leaderboard_as_of(before) == expected
+    # Solves after a snapshot are replayed on top of it
+    assert _leaderboard_as_of(timezone.now()) == _leaderboard_as_of(None)
+
+    chunks = list(leaderboard_chunks(chunk_size=4, as_of=before))
+    assert [(row.rank, row.team_id, row.cells_html) for chunk in chunks for row in chunk] == (
+        expected
+    )
+
+
+def test_leaderboard_snapshot_take():
+    teams = _solve_leaderboard_puzzles()
+    Solve.objects.update(created_at=timezone.now() - datetime.timedelta(hours=1))
+
+    snapshot = leaderboard_snapshot_take()
+    assert snapshot.taken_at < timezone.now()
+    entries = LeaderboardEntry.objects.in_bulk()
+    standings = LeaderboardSnapshot.objects.latest().unpack_standings()
+    # Only teams with solves have standings
+    assert set(standings) == set(Solve.objects.values_list("user_id", flat=True))
+    for team_id, standing in standings.items():
+        entry = entries[team_id]
+        assert standing == [getattr(entry, field) for field in LeaderboardSnapshot.STANDING_FIELDS]
+    assert teams["None"].pk not in standings
+
+    # Taking a snapshot at the same time replaces it
+    leaderboard_snapshot_take(snapshot.taken_at)
+    assert LeaderboardSnapshot.objects.count() == 1
+
+
+def test_leaderboard_as_of_num_queries(django_assert_num_queries):
+    """The number of queries for the leaderboard as of a time shouldn't depend on the number of
+    solves."""
+    _solve_leaderboard_puzzles()
+    leaderboard_snapshot_take(timezone.now())
+    # Teams, snapshot, solves since, puzzle days, metapuzzles, metapuzzle icons, flairs, and
+    # flair links
+    with django_assert_num_queries(8):
+        leaderboard_page(1, as_of=timezone.now())
+
+
+def test_leaderboard_search():
+    """Search results should have the teams' ranks on the whole leaderboard."""
+    teams = _solve_leaderboard_puzzles()
+    UserFactory(team_name="Three Testers", is_tester=True)
+
+    rows = leaderboard_search("three")
+    assert [(row.rank, row.team_id) for row in rows] == [
+        (3, teams["Three A"].pk),
+        (3, teams["Three B"].pk),
+    ]
+    # Teams whose names start with the query come first
+    assert [row.team_id for row in leaderboard_search("ON")] == [
+        teams["One"].pk,
+        teams["None"].pk,
+    ]
+    assert [(row.rank, row.team_id) for row in leaderboard_search(" finished ")] == [
+        (1, teams["Finished"].pk)
+    ]
+    assert "Three A" in rows[0].cells_html
+    assert len(leaderboard_search("e", limit=2)) == 2
+    assert leaderboard_search("sleigh") == []
+    assert leaderboard_search(" ") == []
+
+
+def test_leaderboard_search_as_of():
+    teams = _solve_leaderboard_puzzles()
+    before = timezone.now()
+    puzzle = PuzzleFactory(calendar_entry__day=5)
+    for _ in range(2):
+        guess_submit(puzzle, teams["One"], puzzle.answer)
+    guess_submit(puzzle, teams["Three B"], puzzle.answer)
+
+    assert [(row.rank, row.team_id) for row in leaderboard_search("three", as_of=before)] == [
+        (3, teams["Three A"].pk),
+        (3, teams["Three B"].pk),
+    ]
+    assert [(row.rank, row.team_id) for row in leaderboard_search("three")] == [
+        (4, teams["Three A"].pk),
+        (3, teams["Three B"].pk),
+    ]
@@ -0,0 +1,73 @@
+import pytest
+
+from huntsite.teams import team_search
+from huntsite.teams.factories import UserFactory
+from huntsite.teams.models import User
+from huntsite.teams.services import user_deactivate, users_deactivate
+from huntsite.teams.team_search import TeamSearchIndex
+
+pytestmark = pytest.mark.django_db
+
+
+def test_team_search_index():
+    """Prefix matches should come first, then other substring matches, each ordered by name."""
+    index = TeamSearchIndex.build(
+        [
+            (1, "The Reindeer"),
+            (2, "reindeer games"),
+            (3, "Santa's Reindeer"),
+            (4, "Elves"),
+            (5, "REIN"),
+            (6, "Grinch"),
+        ]
+    )
+    assert index.search("reindeer", limit=10) == [2, 3, 1]
+    assert index.search("REIN", limit=10) == [5, 2, 3, 1]
+    assert index.search("rein", limit=2) == [5, 2]
+    assert index.search("rein", limit=3) == [5, 2, 3]
+    # Queries shorter than a trigram
+    assert index.search("e", limit=10) == [4, 5, 2, 3, 1]
+    assert index.search("in", limit=10) == [6, 5, 2, 3, 1]
+    assert index.search("sleigh", limit=10) == []
+    assert index.search("", limit=10) == []
+
+
+def test_team_search_nonprivileged(django_assert_num_queries):
+    """Only the leaderboard's teams should be searched, and the index should only be loaded
+    once."""
+    team = UserFactory(team_name="Team Rudolph")
+    UserFactory(team_name="Testers Rudolph", is_tester=True)
+    UserFactory(team_name="Deactivated Rudolph", is_active=False)
+    with django_assert_num_queries(1):
+        assert team_search.search("rudolph", limit=10) == [team.pk]
+    with django_assert_num_queries(0):
+        assert team_search.search("rudolph", limit=10) == [team.pk]
+
+
+def test_team_search_invalidation():
+    """Renaming or deactivating a team should invalidate the index, but other saves like logins
+    shouldn't."""
+    team = UserFactory(team_name="Team Rudolph")
+    assert team_search.search("rudolph", limit=10) == [team.pk]
+
+    team.team_name = "Team Comet"
+    team.save()
+    assert team_search.search("rudolph", limit=10) == []
+    assert team_search.search("comet", limit=10) == [team.pk]
+
+    team.team_name = "Team Vixen"
+    team.save(update_fields=["last_login"])
+    assert team_search.search("comet", limit=10) == [team.pk]
+
+    user_deactivate(team)
+    assert team_search.search("comet", limit=10) == []
+
+
+def test_team_search_invalidation_on_bulk_deactivate(django_capture_on_commit_callbacks):
+    """Deactivating teams in bulk should invalidate the index once the deactivation commits."""
+    team = UserFactory(team_name="Team Rudolph")
+    assert team_search.search("rudolph", limit=10) == [team.pk]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        users_deactivate(User.objects.filter(pk=team.pk))
+    assert team_search.search("rudolph", limit=10) == []
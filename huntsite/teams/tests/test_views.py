@@ -1,11 +1,15 @@
 import re
+from unittest import mock
 
 from bs4 import BeautifulSoup
+from django.utils import timezone
 import pytest
 
 from huntsite.puzzles.factories import PuzzleFactory
 from huntsite.puzzles.services import guess_submit
 from huntsite.teams.factories import FlairFactory, UserFactory
+from huntsite.teams.services import LEADERBOARD_PAGE_SIZE
+from huntsite.tester_utils.session_handlers import TIME_TRAVEL_SESSION_VAR
 
 pytestmark = pytest.mark.django_db
 
@@ -38,6 +42,251 @@ def test_team_list_view(client):
     assert len(re.findall(r"Kickstarter backer", response.content.decode())) == 2
 
 
+def test_team_list_view_ranks(client, django_assert_max_num_queries):
+    """Leaderboard should show ranks and solves, with a number of queries that doesn't depend on
+    the number of teams."""
+    puzzle = PuzzleFactory(calendar_entry__day=1)
+    teams = [UserFactory(team_name=f"Team {i}") for i in range(1, 11)]
+    for team in teams[:5]:
+        guess_submit(puzzle, team, puzzle.answer)
+
+    with django_assert_max_num_queries(6):
+        response = client.get("/teams/")
+    soup = BeautifulSoup(response.content, "html.parser")
+    rows = soup.find(id="leaderboard").find("tbody").find_all("tr")
+    assert len(rows) == 10
+    cells = rows[0].find_all("td")
+    assert cells[0].text.strip() == "1"
+    assert cells[2].text.strip() == "1"
+    assert "❆" in cells[4].text
+    cells = rows[-1].find_all("td")
+    assert cells[0].text.strip() == "6"
+    assert cells[2].text.strip() == "0"
+
+
+def test_team_list_num_queries(client, django_assert_num_queries):
+    """The number of queries for a leaderboard page shouldn't depend on the number of teams or
+    their flairs."""
+    puzzle = PuzzleFactory(calendar_entry__day=1)
+    teams = UserFactory.create_batch(5)
+    FlairFactory(users=teams)
+    FlairFactory(users=teams[:2])
+    for team in teams[:3]:
+        guess_submit(puzzle, team, puzzle.answer)
+
+    # The first request also loads the current site, which is then cached
+    client.get("/teams/")
+    # Team count + metapuzzle icons + entries + flairs + flair links
+    with django_assert_num_queries(5):
+        assert client.get("/teams/").status_code == 200
+
+    client.force_login(teams[-1])
+    # Session + user + the above + the team's entry + the number of teams ahead of it
+    with django_assert_num_queries(9):
+        assert client.get("/teams/").status_code == 200
+
+
+def test_team_detail_num_queries(client, django_assert_num_queries):
+    """The number of queries for a team's page shouldn't depend on its flairs or solves."""
+    puzzles = PuzzleFactory.create_batch(3)
+    team = UserFactory()
+    FlairFactory.create_batch(2, users=[team])
+    for puzzle in puzzles:
+        guess_submit(puzzle, team, puzzle.answer)
+    client.force_login(team)
+    # The first request also loads the current site, which is then cached
+    client.get(f"/teams/{team.pk}/")
+
+    # Session + user + team with profile + flairs + solves
+    with django_assert_num_queries(5):
+        response = client.get(f"/teams/{team.pk}/")
+    assert response.status_code == 200
+    soup = BeautifulSoup(response.content, "html.parser")
+    assert len(soup.find("table").find("tbody").find_all("tr")) == 3
+
+
+def test_team_detail_cached_num_queries(client, locmem_cache, django_assert_num_queries):
+    """A team's solves should be cached until it solves another puzzle."""
+    puzzles = PuzzleFactory.create_batch(2)
+    team = UserFactory()
+    guess_submit(puzzles[0], team, puzzles[0].answer)
+    client.force_login(team)
+    client.get(f"/teams/{team.pk}/")
+
+    # Session + user + team with profile + flairs
+    with django_assert_num_queries(4):
+        response = client.get(f"/teams/{team.pk}/")
+    assert puzzles[0].title in response.content.decode()
+
+    guess_submit(puzzles[1], team, puzzles[1].answer)
+    response = client.get(f"/teams/{team.pk}/")
+    assert puzzles[1].title in response.content.decode()
+
+
+def test_team_list_view_pages(client):
+    """Leaderboard should be paginated, with a link to the logged-in team's page."""
+    teams = [
+        UserFactory(username=f"team{i:03}", team_name=f"Team {i:03}")
+        for i in range(LEADERBOARD_PAGE_SIZE + 1)
+    ]
+    last_team = teams[-1]
+
+    client.force_login(last_team)
+    response = client.get("/teams/")
+    assert response.status_code == 200
+    soup = BeautifulSoup(response.content, "html.parser")
+    assert str(LEADERBOARD_PAGE_SIZE + 1) in soup.find("p", id="team-count").text
+    assert len(soup.find(id="leaderboard").find("tbody").find_all("tr")) == LEADERBOARD_PAGE_SIZE
+    assert soup.find("a", string=f"1–{LEADERBOARD_PAGE_SIZE}")["aria-current"] == "page"
+    jump_link = soup.find("a", string="Jump to my team")
+    assert jump_link["href"] == f"/teams/?page=2#team-{last_team.pk}"
+
+    response = client.get(jump_link["href"])
+    soup = BeautifulSoup(response.content, "html.parser")
+    rows = soup.find(id="leaderboard").find("tbody").find_all("tr")
+    assert len(rows) == 1
+    assert rows[0]["id"] == f"team-{last_team.pk}"
+    assert "is-selected" in rows[0]["class"]
+
+    assert client.get("/teams/?page=3").status_code == 404
+    assert client.get("/teams/?page=abc").status_code == 404
+
+
+def test_team_list_all_view(client):
+    """The whole leaderboard should be streamed in one response."""
+    puzzle = PuzzleFactory(calendar_entry__day=1)
+    teams = [UserFactory(team_name=f"Team {i}") for i in range(1, 11)]
+    guess_submit(puzzle, teams[-1], puzzle.answer)
+    UserFactory(team_name="Team Test", is_tester=True)
+
+    response = client.get("/teams/all/")
+    assert response.status_code == 200
+    assert response.streaming
+    content = b"".join(response.streaming_content).decode()
+    assert "Team Test" not in content
+
+    soup = BeautifulSoup(content, "html.parser")
+    assert "10" in soup.find("p", id="team-count").text
+    rows = soup.find(id="leaderboard").find("tbody").find_all("tr")
+    assert [row["id"] for row in rows] == [f"team-{team.pk}" for team in teams[-1:] + teams[:-1]]
+    assert [row.find("td").text.strip() for row in rows] == ["1"] + ["2"] * 9
+    assert soup.find(class_="pagination") is None
+
+
+def test_team_list_views_time_travel(client):
+    """Time-traveling testers should see the leaderboard as it was at the time traveled to."""
+    puzzle = PuzzleFactory(calendar_entry__day=1)
+    teams = [UserFactory(team_name=f"Team {i}") for i in range(1, 3)]
+    tester = UserFactory(is_tester=True)
+    past = timezone.now()
+    guess_submit(puzzle, teams[1], puzzle.answer)
+    UserFactory(team_name="Team 3")
+
+    client.force_login(tester)
+    session = client.session
+    session[TIME_TRAVEL_SESSION_VAR] = past.isoformat()
+    session.save()
+    for url in ("/teams/", "/teams/all/"):
+        response = client.get(url)
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        soup = BeautifulSoup(content, "html.parser")
+        assert "2" in soup.find("p", id="team-count").text
+        rows = soup.find(id="leaderboard").find("tbody").find_all("tr")
+        assert [row["id"] for row in rows] == [f"team-{team.pk}" for team in teams]
+        assert [row.find("td").text for row in rows] == ["1", "1"]
+
+    # Other teams see the current leaderboard
+    client.force_login(teams[0])
+    session = client.session
+    session[TIME_TRAVEL_SESSION_VAR] = past.isoformat()
+    session.save()
+    rows = BeautifulSoup(client.get("/teams/").content, "html.parser").find_all("tr", id=True)
+    assert [row["id"] for row in rows][0] == f"team-{teams[1].pk}"
+    assert len(rows) == 3
+
+
+def test_team_search_view(client):
+    """Team searches should respond with a table of the matching teams' rows."""
+    puzzle = PuzzleFactory(calendar_entry__day=1)
+    teams = [UserFactory(team_name=f"Team {name}") for name in ["Comet", "Cupid", "Vixen"]]
+    guess_submit(puzzle, teams[2], puzzle.answer)
+
+    client.force_login(teams[0])
+    soup = BeautifulSoup(client.get("/teams/").content, "html.parser")
+    assert soup.find("input", id="team-search")["hx-get"] == "/teams/search/"
+
+    response = client.get("/teams/search/", {"q": "c"}, headers={"HX-Request": "true"})
+    assert response.status_code == 200
+    rows = BeautifulSoup(response.content, "html.parser").find("tbody").find_all("tr")
+    assert [row["id"] for row in rows] == [f"search-team-{team.pk}" for team in teams[:2]]
+    assert [row.find("td").text for row in rows] == ["2", "2"]
+    assert rows[0]["class"] == ["is-selected"]
+
+    response = client.get("/teams/search/", {"q": "sleigh"})
+    assert "No teams found." in response.content.decode()
+    response = client.get("/teams/search/", {"q": ""})
+    assert response.content.decode().strip() == ""
+
+
+def test_team_list_view_htmx_poll(client, locmem_cache):
+    """htmx polls for a page of leaderboard rows should be conditional on the leaderboard."""
+    puzzle = PuzzleFactory(calendar_entry__day=1)
+    team = UserFactory(team_name="Team 1")
+    UserFactory(team_name="Team 2")
+
+    client.force_login(team)
+    response = client.get("/teams/")
+    assert "ETag" not in response
+    assert 'hx-get="/teams/?page=1"' in response.content.decode()
+
+    headers = {"HX-Request": "true"}
+    response = client.get("/teams/?page=1", headers=headers)
+    assert response.status_code == 200
+    assert "HX-Request" in response["Vary"]
+    assert "no-cache" in response["Cache-Control"]
+    soup = BeautifulSoup(response.content, "html.parser")
+    assert soup.find("table") is None
+    assert [row["id"] for row in soup.find_all("tr")] == [f"team-{team.pk}", mock.ANY]
+
+    etag = response["ETag"]
+    headers["If-None-Match"] = etag
+    assert client.get("/teams/?page=1", headers=headers).status_code == 304
+
+    guess_submit(puzzle, team, puzzle.answer)
+    response = client.get("/teams/?page=1", headers=headers)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+def test_team_list_json_view(client, locmem_cache, django_assert_num_queries):
+    """JSON leaderboard should respond with 304 Not Modified until the leaderboard changes."""
+    puzzle = PuzzleFactory(calendar_entry__day=1)
+    teams = [UserFactory(team_name=f"Team {i}") for i in range(1, 4)]
+    guess_submit(puzzle, teams[2], puzzle.answer)
+
+    response = client.get("/teams/leaderboard.json")
+    assert response.status_code == 200
+    assert [(row["rank"], row["id"]) for row in response.json()["teams"]] == [
+        (1, teams[2].pk),
+        (2, teams[0].pk),
+        (2, teams[1].pk),
+    ]
+    assert response.json()["teams"][0]["solved_days_mask"] == 1 << 1
+
+    etag = response["ETag"]
+    # The version is read from the cache
+    with django_assert_num_queries(0):
+        response = client.get("/teams/leaderboard.json", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    guess_submit(puzzle, teams[0], puzzle.answer)
+    response = client.get("/teams/leaderboard.json", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+    assert response.json()["teams"][0]["id"] == teams[0].pk
+
+
 def test_team_detail_view(client):
     team = UserFactory(team_name="Team 1")
     other_team = UserFactory(team_name="Team 2")
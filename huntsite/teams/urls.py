@@ -7,5 +7,8 @@ urlpatterns = [
     path("accounts/username/", views.account_username_update, name="account_username"),
     path("accounts/", include("allauth.urls")),
     path("teams/", views.team_list, name="team_list"),
+    path("teams/all/", views.team_list_all, name="team_list_all"),
+    path("teams/search/", views.team_search, name="team_search"),
+    path("teams/leaderboard.json", views.team_list_json, name="team_list_json"),
     path("teams/<int:pk>/", views.team_detail, name="team_detail"),
 ]
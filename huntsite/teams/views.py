@@ -1,14 +1,21 @@
-from collections import defaultdict
-from typing import NamedTuple
+import hashlib
+import itertools
+import uuid
 
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import InvalidPage
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
+from django.template.loader import render_to_string
 from django.template.response import TemplateResponse
-from django.views.decorators.http import require_http_methods, require_safe
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods, require_safe
+from django.views.decorators.vary import vary_on_headers
 
-from huntsite.puzzles import models as puzzle_models
-from huntsite.puzzles import services as puzzle_services
-from huntsite.teams import forms, models
+from huntsite.puzzles import solved_puzzles
+from huntsite.teams import forms, leaderboard, models
+from huntsite.teams import services as team_services
+from huntsite.tester_utils.session_handlers import read_time_travel_session_var
 
 
 @login_required
@@ -78,7 +85,7 @@ def team_detail(request, pk: int):
     )
     team = get_object_or_404(user_manager.with_profile().with_flairs(), pk=pk)
 
-    solves = puzzle_services.solve_list_for_user(user=team).select_related("puzzle")
+    solves = solved_puzzles.get_solved_puzzles(team).solve_list()
     context = {
         "team": team,
         "solves": solves,
@@ -87,88 +94,119 @@ def team_detail(request, pk: int):
     return TemplateResponse(request, "team_detail.html", context)
 
 
-class LeaderboardEntry(NamedTuple):
-    team: models.User
-    solved_days: list[int]
-    rank: int
+def _leaderboard_page_links(page) -> list[tuple[int | None, str]]:
+    """Links to leaderboard pages as (page number, label) pairs, labeled by the range of
+    positions on each page. Elided pages are represented by a None page number."""
+    paginator = page.paginator
+    links = []
+    for number in paginator.get_elided_page_range(page.number, on_each_side=2, on_ends=1):
+        if number == paginator.ELLIPSIS:
+            links.append((None, number))
+        else:
+            first = (number - 1) * paginator.per_page + 1
+            last = min(number * paginator.per_page, paginator.count)
+            links.append((number, f"{first}–{last}"))
+    return links
+
+
+def _leaderboard_etag(request, *args, **kwargs) -> str:
+    return team_services.leaderboard_version()
+
+
+def _leaderboard_as_of(request):
+    """The time to show the leaderboard as of, for testers who are time traveling."""
+    return read_time_travel_session_var(request) if request.user.is_tester else None
+
+
+def _team_list_etag(request, *args, **kwargs) -> str | None:
+    """ETag for htmx requests polling a page of leaderboard rows, which depend on the page, on
+    the logged-in team, whose row is highlighted, and on the time traveled to, if any. Full pages
+    have other content that can change, so they aren't conditional."""
+    if not request.headers.get("HX-Request"):
+        return None
+    key = (
+        f"{team_services.leaderboard_version()}:{request.get_full_path()}:{request.user.pk}"
+        f":{_leaderboard_as_of(request)}"
+    )
+    return hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
 
 
 @require_safe
+@vary_on_headers("HX-Request")
+@cache_control(no_cache=True)
+@condition(etag_func=_team_list_etag)
 def team_list(request):
-    """View to display a list of all teams."""
+    """View to display a page of the leaderboard. For htmx requests, only the page's rows are
+    rendered. Time-traveling testers see the leaderboard as of the time they traveled to."""
+    as_of = _leaderboard_as_of(request)
+    try:
+        page = team_services.leaderboard_page(request.GET.get("page", 1), as_of=as_of)
+    except InvalidPage as e:
+        raise Http404("Leaderboard page not found.") from e
 
-    teams = models.User.nonprivileged.with_flairs().all()
-    solves = puzzle_models.Solve.objects.exclude(user__is_tester=True)
-    puzzles = puzzle_models.Puzzle.objects.with_calendar_entry().all()
-    meta_infos = puzzle_models.MetapuzzleInfo.objects.order_by("-is_final").all()
-    metapuzzle_ids = {meta_info.puzzle_id for meta_info in meta_infos}
+    if request.user.is_authenticated:
+        my_page_number = team_services.leaderboard_page_number(request.user, as_of=as_of)
+    else:
+        my_page_number = None
 
-    solves_by_team = defaultdict(list)
-    meta_solves_by_team = defaultdict(list)
-    for solve in solves:
-        solves_by_team[solve.user_id].append(solve.puzzle_id)
-        if solve.puzzle_id in metapuzzle_ids:
-            meta_solves_by_team[solve.user_id].append(solve.puzzle_id)
+    rows_html = leaderboard.render_rows(page.object_list, highlighted_team_id=request.user.pk)
+    if request.headers.get("HX-Request"):
+        return HttpResponse(rows_html)
 
-    try:
-        final_puzzle_id = next(
-            meta_info.puzzle_id for meta_info in meta_infos if meta_info.is_final
-        )
-    except StopIteration:
-        final_puzzle_id = None
-
-    def _rank_key(team):
-        return (
-            # Finished hunt
-            final_puzzle_id not in solves_by_team[team.id],  # False < True
-            # Meta solves
-            -len(meta_solves_by_team[team.id]),
-            # All solves
-            -len(solves_by_team[team.id]),
-        )
-
-    def _rank_data(teams):
-        ranks_map = {}
-        rank = 0
-        step_size = 1
-        rank_keys_by_team = {team.id: _rank_key(team) for team in teams}
-        for key in sorted(rank_keys_by_team.values()):
-            if key in ranks_map:
-                # Is tie, increment step size
-                step_size += 1
-            else:
-                # Next rank
-                ranks_map[key] = rank + step_size
-                rank += step_size
-                # Reset step size
-                step_size = 1
-        return {team.id: ranks_map[rank_keys_by_team[team.id]] for team in teams}
-
-    ranks = _rank_data(teams)
-
-    puzzle_id_to_day = {puzzle.id: puzzle.calendar_entry.day for puzzle in puzzles}
-
-    leaderboard_data = sorted(
-        (
-            LeaderboardEntry(
-                team=team,
-                solved_days=[puzzle_id_to_day[p_id] for p_id in solves_by_team[team.id]],
-                rank=ranks[team.id],
-            )
-            for team in teams
-        ),
-        key=lambda entry: (
-            entry.rank,
-            entry.team.team_name,
+    context = {
+        "leaderboard_rows_html": rows_html,
+        "num_teams": page.paginator.count,
+        "page": page,
+        "page_links": _leaderboard_page_links(page),
+        "my_page_number": my_page_number,
+        "day_spine": leaderboard.DAYS,
+    }
+    return TemplateResponse(request, "team_list.html", context)
+
+
+@require_safe
+def team_search(request):
+    """View to search the leaderboard's teams by name, for htmx requests from the leaderboard.
+    Responds with a table of the matching teams' rows."""
+    query = request.GET.get("q", "")[: models.TEAM_NAME_MAX_LENGTH]
+    rows = team_services.leaderboard_search(query, as_of=_leaderboard_as_of(request))
+    context = {
+        "query": query.strip(),
+        "search_rows_html": leaderboard.render_rows(
+            rows, highlighted_team_id=request.user.pk, id_prefix="search-team-"
         ),
-    )
+        "day_spine": leaderboard.DAYS,
+    }
+    return TemplateResponse(request, "partials/team_search_results.html", context)
 
-    day_spine = list(range(25))
-    metas_by_day = {puzzle_id_to_day[meta_info.puzzle_id]: meta_info for meta_info in meta_infos}
 
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=_leaderboard_etag)
+def team_list_json(request):
+    """JSON endpoint for the whole leaderboard. Responds with 304 Not Modified to requests whose
+    If-None-Match header has the current ETag."""
+    return JsonResponse({"teams": team_services.leaderboard_rows()})
+
+
+@require_safe
+def team_list_all(request):
+    """View to display the whole leaderboard. The response is streamed, building rows in chunks
+    as they're fetched, so that neither the time to first byte nor the memory used grows with the
+    number of teams. Time-traveling testers see the leaderboard as of the time they traveled to."""
+    as_of = _leaderboard_as_of(request)
+    # The page is rendered around a placeholder for the rows, then split at it
+    rows_placeholder = uuid.uuid4().hex
     context = {
-        "leaderboard_data": leaderboard_data,
-        "day_spine": day_spine,
-        "metas_by_day": metas_by_day,
+        "leaderboard_rows_html": rows_placeholder,
+        "num_teams": team_services.leaderboard_num_teams(as_of=as_of),
+        "day_spine": leaderboard.DAYS,
     }
-    return TemplateResponse(request, "team_list.html", context)
+    head, tail = render_to_string("team_list.html", context, request=request).split(
+        rows_placeholder
+    )
+    rows_html = (
+        leaderboard.render_rows(rows, highlighted_team_id=request.user.pk)
+        for rows in team_services.leaderboard_chunks(as_of=as_of)
+    )
+    return StreamingHttpResponse(itertools.chain([head], rows_html, [tail]))
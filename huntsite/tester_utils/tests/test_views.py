@@ -4,7 +4,9 @@ from django.urls import reverse
 from django.utils import timezone
 import pytest
 
+from huntsite.puzzles import throttling
 from huntsite.puzzles.factories import PuzzleFactory
+from huntsite.puzzles.services import guess_submit
 from huntsite.teams.factories import UserFactory
 from huntsite.tester_utils.factories import OrganizerDashboardPermissionFactory
 from huntsite.tester_utils.session_handlers import (
@@ -93,3 +95,36 @@ def test_organizer_dashboard_view(client):
     OrganizerDashboardPermissionFactory(user=user)
     response = client.get(reverse("organizer_dashboard"))
     assert response.status_code == 200
+
+
+def test_organizer_dashboard_num_queries(client, django_assert_num_queries):
+    """The number of queries for the organizer dashboard shouldn't depend on the number of
+    puzzles, solves, or guesses."""
+    puzzles = PuzzleFactory.create_batch(3)
+    teams = UserFactory.create_batch(3)
+    for team in teams:
+        for puzzle in puzzles:
+            guess_submit(puzzle, team, "WRONG")
+            guess_submit(puzzle, team, puzzle.answer)
+    OrganizerDashboardPermissionFactory(user=teams[0])
+    client.force_login(teams[0])
+    # The first request also loads the current site, which is then cached
+    client.get(reverse("organizer_dashboard"))
+
+    # Session + user + permission + solves + guesses + puzzles
+    with django_assert_num_queries(6):
+        assert client.get(reverse("organizer_dashboard")).status_code == 200
+
+
+def test_organizer_dashboard_throttled_count(client, settings, locmem_cache):
+    """Organizer dashboard should show the number of throttled guess submissions."""
+    settings.GUESS_THROTTLE_PUZZLE_CAPACITY = 1
+    user = UserFactory()
+    OrganizerDashboardPermissionFactory(user=user)
+    puzzle = PuzzleFactory()
+    for _ in range(3):
+        throttling.throttle_guess(user, puzzle.id)
+
+    client.force_login(user)
+    response = client.get(reverse("organizer_dashboard"))
+    assert "Throttled guess submissions: 2" in response.content.decode()
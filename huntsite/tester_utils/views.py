@@ -8,6 +8,7 @@ from django.shortcuts import get_object_or_404, redirect, render
 from django.views.decorators.http import require_POST
 from loguru import logger
 
+from huntsite.puzzles import throttling
 from huntsite.puzzles.models import Guess, Puzzle, Solve
 from huntsite.tester_utils import forms, session_handlers
 from huntsite.tester_utils.models import OrganizerDashboardPermission
@@ -75,6 +76,7 @@ def organizer_dashboard_view(request):
         "recent_solves_json": json.dumps([solve.to_dict() for solve in recent_solves]),
         "recent_guesses_json": json.dumps([guess.to_dict() for guess in recent_guesses]),
         "puzzles": puzzles,
+        "throttled_guesses_count": throttling.throttled_count(),
     }
 
     return render(request, "organizer_dashboard.html", context)
@@ -108,6 +108,7 @@ INSTALLED_APPS = [
     "huntsite.puzzles",
     "huntsite.teams",
     "huntsite.tester_utils",
+    "huntsite.tasks",
 ]
 
 MIDDLEWARE = [
@@ -253,9 +254,15 @@ if DEPLOY_ENVIRONMENT == DeployEnvironment.PRODUCTION:
             }
         }
     else:
+        # The answer index and guess buffer coordinate worker processes through the cache, which
+        # a per-process locmem cache can't do
+        if env.int("GUNICORN_WORKERS", default=1) > 1:
+            raise ValueError("REDIS_URL must be set when running more than one GUNICORN_WORKERS")
         CACHES = {
             "default": {
                 "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                # The default of 300 is too few to hold a leaderboard's cached rows
+                "OPTIONS": {"MAX_ENTRIES": env.int("LOCMEM_CACHE_MAX_ENTRIES", default=50_000)},
             }
         }
 else:
@@ -272,6 +279,35 @@ if env.bool("SOLO_CACHE_ENABLED", default=False):
     SOLO_CACHE = "default"
 SOLO_CACHE_TIMEOUT = env.int("SOLO_CACHE_TIMEOUT", default=60 * 5)
 
+## Guess buffer
+# Write incorrect guesses to the database in batches; see huntsite/puzzles/guess_buffer.py
+
+GUESS_BUFFER_ENABLED = env.bool("GUESS_BUFFER_ENABLED", default=False)
+GUESS_BUFFER_MAX_SIZE = env.int("GUESS_BUFFER_MAX_SIZE", default=100)
+GUESS_BUFFER_MAX_AGE = env.float("GUESS_BUFFER_MAX_AGE", default=2.0)  # seconds
+GUESS_BUFFER_MAX_RETRIES = env.int("GUESS_BUFFER_MAX_RETRIES", default=3)
+
+## Guess throttling
+# Token buckets limiting each team's guesses overall and per puzzle; see
+# huntsite/puzzles/throttling.py
+
+GUESS_THROTTLE_ENABLED = env.bool("GUESS_THROTTLE_ENABLED", default=True)
+GUESS_THROTTLE_TEAM_CAPACITY = env.int("GUESS_THROTTLE_TEAM_CAPACITY", default=30)
+GUESS_THROTTLE_TEAM_PER_MINUTE = env.float("GUESS_THROTTLE_TEAM_PER_MINUTE", default=20)
+GUESS_THROTTLE_PUZZLE_CAPACITY = env.int("GUESS_THROTTLE_PUZZLE_CAPACITY", default=10)
+GUESS_THROTTLE_PUZZLE_PER_MINUTE = env.float("GUESS_THROTTLE_PUZZLE_PER_MINUTE", default=5)
+
+## Background tasks
+# Tasks stored in the database and run by the run_worker management command; see
+# huntsite/tasks/services.py. Failed tasks are retried up to TASKS_MAX_ATTEMPTS attempts in
+# total, after TASKS_RETRY_DELAY seconds, doubling with each retry. Tasks whose worker hasn't
+# finished them after TASKS_LOCK_TIMEOUT seconds are assumed to have lost their worker.
+
+TASKS_MAX_ATTEMPTS = env.int("TASKS_MAX_ATTEMPTS", default=3)
+TASKS_RETRY_DELAY = env.float("TASKS_RETRY_DELAY", default=30)  # seconds
+TASKS_LOCK_TIMEOUT = env.int("TASKS_LOCK_TIMEOUT", default=60 * 60)  # seconds
+TASKS_POLL_INTERVAL = env.float("TASKS_POLL_INTERVAL", default=5)  # seconds
+
 ## Sessions
 
 if REDIS_URL:
@@ -402,6 +438,18 @@ logger.info("Using email backend: " + EMAIL_BACKEND)
 logger.info("Server emails will be sent from: " + DEFAULT_FROM_EMAIL)
 logger.info("Server emails will have reply-to address: " + EMAIL_REPLY_TO)
 
+# Bulk email is sent as messages of up to EMAIL_BATCH_SIZE BCC recipients each, by
+# EMAIL_CONCURRENCY workers that each reuse one backend connection, at up to EMAIL_RATE_LIMIT
+# messages per second overall (0 for no limit); see huntsite/teams/email_delivery.py
+EMAIL_BATCH_SIZE = env.int("EMAIL_BATCH_SIZE", default=10)
+EMAIL_CONCURRENCY = env.int("EMAIL_CONCURRENCY", default=4)
+EMAIL_RATE_LIMIT = env.float("EMAIL_RATE_LIMIT", default=10.0)  # messages per second
+# Email jobs queued from the admin are sent by a background task (see above), which claims
+# EMAIL_JOB_CHUNK_SIZE recipients at a time, and reclaims recipients whose worker hasn't
+# finished them after EMAIL_JOB_CLAIM_TIMEOUT seconds
+EMAIL_JOB_CHUNK_SIZE = env.int("EMAIL_JOB_CHUNK_SIZE", default=500)
+EMAIL_JOB_CLAIM_TIMEOUT = env.int("EMAIL_JOB_CLAIM_TIMEOUT", default=60 * 10)
+
 ## Error and Performance Monitoring / Sentry
 
 SENTRY_DSN = env("SENTRY_DSN", None)
@@ -0,0 +1,97 @@
+"""Benchmark of bulk email delivery throughput, against an email backend that simulates the
+latency of opening a connection to an email provider and of sending each message."""
+
+import os
+import time
+
+import django
+from django.core.mail.backends.locmem import EmailBackend
+import typer
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+django.setup()
+
+from django.core import mail  # noqa: E402
+from django.core.mail import EmailMessage  # noqa: E402
+
+from huntsite.teams.email_delivery import deliver  # noqa: E402
+
+BACKEND = "scripts.benchmark_email.SlowEmailBackend"
+CONNECT_LATENCY = 0.05
+"""Seconds to open a connection, e.g., for an SMTP handshake with TLS."""
+SEND_LATENCY = 0.02
+"""Seconds to send each message over an open connection."""
+
+
+class SlowEmailBackend(EmailBackend):
+    """Backend that, like the SMTP backend, opens a connection for each send_messages() call
+    unless one is already open."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.is_open = False
+
+    def open(self):
+        if self.is_open:
+            return False
+        time.sleep(CONNECT_LATENCY)
+        self.is_open = True
+        return True
+
+    def close(self):
+        self.is_open = False
+
+    def send_messages(self, messages):
+        new_connection = self.open()
+        try:
+            time.sleep(SEND_LATENCY * len(messages))
+            return super().send_messages(messages)
+        finally:
+            if new_connection:
+                self.close()
+
+
+def _messages(num_messages: int) -> list[EmailMessage]:
+    return [
+        EmailMessage(subject="Benchmark", body="Message", bcc=[f"team{i}@example.com"])
+        for i in range(num_messages)
+    ]
+
+
+def _send_each(num_messages: int, sleep: float) -> float:
+    """The delivery that send_email did before the delivery engine: a new connection per
+    message, and a sleep between messages."""
+    start = time.perf_counter()
+    for message in _messages(num_messages):
+        message.connection = mail.get_connection(BACKEND)
+        message.send()
+        time.sleep(sleep)
+    return num_messages / (time.perf_counter() - start)
+
+
+def main(
+    num_messages: int = 200,
+    concurrency: list[int] = typer.Option([1, 2, 4, 8]),
+    rate: float = 0,
+):
+    """Compare messages per second sent with a new connection per message against the delivery
+    engine with one connection per worker, for each number of workers."""
+    mail.outbox = []
+    print(
+        f"{num_messages} messages, {CONNECT_LATENCY * 1000:.0f} ms to connect, "
+        f"{SEND_LATENCY * 1000:.0f} ms to send each:"
+    )
+    for label, sleep in (
+        ("connection per message + 0.1 s sleep", 0.1),
+        ("connection per message", 0),
+    ):
+        print(f"  {label:<40} {_send_each(num_messages, sleep):8.1f} messages/s")
+    for n in concurrency:
+        report = deliver(_messages(num_messages), concurrency=n, rate=rate, backend=BACKEND)
+        assert report.num_sent == num_messages
+        label = f"{n} workers, connection per worker"
+        print(f"  {label:<40} {report.messages_per_second:8.1f} messages/s")
+
+
+if __name__ == "__main__":
+    typer.run(main)
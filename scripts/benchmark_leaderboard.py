@@ -0,0 +1,156 @@
+"""Benchmark of computing the leaderboard, run against a throwaway test database created on the
+database server configured by DATABASE_URL. Run it once with a SQLite and once with a Postgres
+DATABASE_URL to compare backends."""
+
+from collections import defaultdict
+import os
+import random
+import timeit
+
+import django
+import typer
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from huntsite.puzzles.models import (  # noqa: E402
+    AdventCalendarEntry,
+    MetapuzzleInfo,
+    Puzzle,
+    Solve,
+)
+from huntsite.teams import services as team_services  # noqa: E402
+from huntsite.teams.models import LeaderboardEntry, User  # noqa: E402
+
+NUM_DAYS = 25
+META_DAYS = {6: False, 12: False, 18: False, 24: True}
+"""Days with metapuzzles, mapped to whether the metapuzzle is the final one."""
+
+
+def _rank_from_solves() -> list[tuple[int, int, list[int]]]:
+    """The leaderboard computation that team_list did before leaderboard entries were
+    materialized: load every team and solve, then sort and rank in Python."""
+    teams = User.nonprivileged.with_flairs().all()
+    solves = Solve.objects.exclude(user__is_tester=True)
+    puzzles = Puzzle.objects.with_calendar_entry().all()
+    meta_infos = MetapuzzleInfo.objects.order_by("-is_final").all()
+    metapuzzle_ids = {meta_info.puzzle_id for meta_info in meta_infos}
+    final_puzzle_id = next((m.puzzle_id for m in meta_infos if m.is_final), None)
+
+    solves_by_team = defaultdict(list)
+    meta_solves_by_team = defaultdict(list)
+    for solve in solves:
+        solves_by_team[solve.user_id].append(solve.puzzle_id)
+        if solve.puzzle_id in metapuzzle_ids:
+            meta_solves_by_team[solve.user_id].append(solve.puzzle_id)
+
+    rank_keys = {
+        team.id: (
+            final_puzzle_id not in solves_by_team[team.id],
+            -len(meta_solves_by_team[team.id]),
+            -len(solves_by_team[team.id]),
+        )
+        for team in teams
+    }
+    ranks_map = {}
+    rank = 0
+    step_size = 1
+    for key in sorted(rank_keys.values()):
+        if key in ranks_map:
+            step_size += 1
+        else:
+            ranks_map[key] = rank + step_size
+            rank += step_size
+            step_size = 1
+
+    puzzle_id_to_day = {puzzle.id: puzzle.calendar_entry.day for puzzle in puzzles}
+    return sorted(
+        (
+            ranks_map[rank_keys[team.id]],
+            team.id,
+            [puzzle_id_to_day[puzzle_id] for puzzle_id in solves_by_team[team.id]],
+        )
+        for team in teams
+    )
+
+
+def _rank_from_entries() -> list[tuple[int, int, list[int]]]:
+    return [
+        (entry.rank, entry.user_id, entry.solved_days)
+        for entry in team_services.leaderboard_list()
+    ]
+
+
+def _populate(num_teams: int):
+    """Create puzzles and num_teams teams, each solving a random prefix of the days."""
+    Solve.objects.all().delete()
+    User.objects.all().delete()
+    Puzzle.objects.all().delete()
+
+    puzzles = Puzzle.objects.bulk_create(
+        Puzzle(title=f"Day {day}", slug=f"day-{day}", answer=f"ANSWER {day}")
+        for day in range(1, NUM_DAYS + 1)
+    )
+    AdventCalendarEntry.objects.bulk_create(
+        AdventCalendarEntry(puzzle=puzzle, day=day) for day, puzzle in enumerate(puzzles, start=1)
+    )
+    MetapuzzleInfo.objects.bulk_create(
+        MetapuzzleInfo(puzzle=puzzles[day - 1], is_final=is_final)
+        for day, is_final in META_DAYS.items()
+    )
+
+    users = User.objects.bulk_create(
+        (
+            User(username=f"team{i}", email=f"team{i}@example.com", team_name=f"Team {i}")
+            for i in range(num_teams)
+        ),
+        batch_size=1000,
+    )
+    Solve.objects.bulk_create(
+        (
+            Solve(user=user, puzzle=puzzle)
+            for user in users
+            for puzzle in puzzles[: random.randint(0, NUM_DAYS)]
+        ),
+        batch_size=1000,
+    )
+    team_services.leaderboard_rebuild()
+
+
+def main(
+    num_teams: list[int] = typer.Option([1_000, 10_000, 50_000]),
+    repeat: int = 3,
+    seed: int = 0,
+):
+    """Time the leaderboard computed from all solves in Python against materialized
+    leaderboard entries ranked with a window function."""
+    random.seed(seed)
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        print(f"{connection.vendor}, best of {repeat} runs:")
+        for n in num_teams:
+            _populate(n)
+            assert LeaderboardEntry.objects.count() == n
+            assert [row[:2] for row in _rank_from_solves()] == [
+                row[:2] for row in sorted(_rank_from_entries())
+            ]
+            timings = {
+                label: min(timeit.repeat(func, number=1, repeat=repeat))
+                for label, func in (("solves", _rank_from_solves), ("entries", _rank_from_entries))
+            }
+            print(
+                f"  {n:>7} teams:  solves {timings['solves'] * 1000:8.1f} ms"
+                f"  entries {timings['entries'] * 1000:8.1f} ms"
+                f"  ({timings['solves'] / timings['entries']:5.1f}x)"
+            )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,135 @@
+"""Benchmark of the time and memory taken to render every row of the leaderboard, run against a
+throwaway test database created on the database server configured by DATABASE_URL."""
+
+import os
+import random
+import timeit
+import tracemalloc
+
+import django
+import typer
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.template import engines  # noqa: E402
+from django.test.utils import override_settings, setup_test_environment  # noqa: E402
+from scripts.benchmark_leaderboard import _populate  # noqa: E402
+
+from huntsite.puzzles.models import MetapuzzleInfo  # noqa: E402
+from huntsite.teams import services as team_services  # noqa: E402
+from huntsite.teams.leaderboard import DAYS, render_rows  # noqa: E402
+from huntsite.teams.models import Flair, User  # noqa: E402
+
+ENTRIES_TEMPLATE = """{% load common_extras %}
+{% for entry in leaderboard_data %}
+  <tr id="team-{{ entry.user.id }}"
+      {% if entry.user.id == user.pk %}class="is-selected"{% endif %}>
+    <td align="right">{{ entry.rank }}</td>
+    <td class="team-name">
+      {% for flair in entry.user.flairs.all %}
+        <span data-tts aria-label="{{ flair.label }}">{{ flair.icon|safe }}</span>
+      {% endfor %}
+      <a href="{% url 'team_detail' entry.user.id %}">
+        {{ entry.user.team_name|truncatechars:128 }}
+      </a>
+    </td>
+    <td align="right">{{ entry.num_solves }}</td>
+    {% for day in day_spine %}
+      <td align="center">
+        {% if day in metas_by_day %}
+          {% with metas_by_day|dictget:day as meta_info %}
+            {% if day in entry.solved_days %}{{ meta_info.icon|safe }}{% endif %}
+          {% endwith %}
+        {% else %}
+          {% if day in entry.solved_days %}❆{% endif %}
+        {% endif %}
+      </td>
+    {% endfor %}
+  </tr>
+{% endfor %}
+"""
+"""The rows template as it was before rows were compact, rendered from model instances."""
+
+
+def _render_entries() -> int:
+    template = engines["django"].from_string(ENTRIES_TEMPLATE)
+    meta_infos = MetapuzzleInfo.objects.select_related("puzzle__calendar_entry")
+    context = {
+        "leaderboard_data": team_services.leaderboard_list(),
+        "day_spine": DAYS,
+        "metas_by_day": {meta.puzzle.calendar_entry.day: meta for meta in meta_infos},
+    }
+    return len(template.render(context))
+
+
+def _render_rows(chunk_size: int) -> int:
+    return sum(
+        len(render_rows(rows)) for rows in team_services.leaderboard_chunks(chunk_size=chunk_size)
+    )
+
+
+def _peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+DUMMY_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+LOCMEM_CACHE = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 1_000_000},
+    }
+}
+
+
+def _run_benchmarks(benchmarks: dict, label_suffix: str, repeat: int):
+    for label, func in benchmarks.items():
+        elapsed = min(timeit.repeat(func, number=1, repeat=repeat))
+        peak = _peak_memory(func)
+        label += label_suffix
+        print(f"  {label:<32} {elapsed * 1000:8.1f} ms  {peak / 2**20:8.1f} MiB peak")
+
+
+def main(num_teams: int = 10_000, chunk_size: int = 500, repeat: int = 3, seed: int = 0):
+    """Compare rendering every leaderboard row from model instances against rendering compact
+    rows, both all at once and in streamed chunks, and with and without their cells cached."""
+    random.seed(seed)
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        _populate(num_teams)
+        users = list(User.objects.all())
+        for i in range(5):
+            Flair.objects.create(icon="🎁", label=f"Flair {i}").users.add(
+                *random.sample(users, k=num_teams // 10)
+            )
+
+        benchmarks = {
+            "entries": _render_entries,
+            "rows": lambda: _render_rows(chunk_size=num_teams),
+            f"rows ({chunk_size} per chunk)": lambda: _render_rows(chunk_size=chunk_size),
+        }
+        print(f"{connection.vendor}, {num_teams} teams, best of {repeat} runs:")
+        # Without a cache, every row's cells are rendered
+        with override_settings(CACHES=DUMMY_CACHE):
+            _run_benchmarks(benchmarks, label_suffix="", repeat=repeat)
+        with override_settings(CACHES=LOCMEM_CACHE):
+            _render_rows(chunk_size=chunk_size)
+            _run_benchmarks(
+                {label: func for label, func in benchmarks.items() if label != "entries"},
+                label_suffix=", cached",
+                repeat=repeat,
+            )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    typer.run(main)
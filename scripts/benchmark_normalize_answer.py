@@ -0,0 +1,71 @@
+import random
+import timeit
+
+from faker import Faker
+import typer
+
+from huntsite.puzzles.utils import (
+    ANSWER_CACHE_SIZE,
+    _normalize_answer_reference,
+    normalize_answer,
+)
+
+fake = Faker()
+
+
+def _guess_text_factory() -> str:
+    nb = random.randint(1, 4)
+    text = " ".join(fake.word() for _ in range(nb))
+    # Mix in some of what real guesses contain: punctuation, digits, odd casing and accents
+    match random.random():
+        case p if p < 0.2:
+            text = text.upper() + "!"
+        case p if p < 0.3:
+            text = f"  {text.title()}, {random.randint(1, 99)} "
+        case p if p < 0.4:
+            text = text.replace("e", "é").replace("a", "å")
+    return text
+
+
+def main(num_guesses: int = 10_000, repeat: int = 5, seed: int = 0):
+    """Microbenchmark of normalize_answer against the reference implementation.
+
+    "Cold" calls bypass the LRU cache, so they measure the translation-table implementation
+    itself. "Warm" calls go through the cache with a working set that fits in it, as repeated
+    guesses and re-grades of popular wrong answers do.
+    """
+    random.seed(seed)
+    Faker.seed(seed)
+    guesses = [_guess_text_factory() for _ in range(num_guesses)]
+    hot_guesses = random.choices(guesses[: ANSWER_CACHE_SIZE // 2], k=num_guesses)
+    assert [normalize_answer(g) for g in guesses] == [
+        _normalize_answer_reference(g) for g in guesses
+    ]
+
+    def run_reference():
+        for guess in guesses:
+            _normalize_answer_reference(guess)
+
+    def run_cold():
+        normalize_answer.cache_clear()
+        for guess in guesses:
+            normalize_answer.__wrapped__(guess)
+
+    def run_warm():
+        for guess in hot_guesses:
+            normalize_answer(guess)
+
+    print(f"{num_guesses} guesses, best of {repeat} runs:")
+    timings = {
+        label: min(timeit.repeat(func, number=1, repeat=repeat))
+        for label, func in (("reference", run_reference), ("cold", run_cold), ("warm", run_warm))
+    }
+    for label, elapsed in timings.items():
+        print(
+            f"  {label:<10} {elapsed / num_guesses * 1e6:8.3f} µs/guess"
+            f"  ({timings['reference'] / elapsed:5.1f}x reference)"
+        )
+
+
+if __name__ == "__main__":
+    typer.run(main)
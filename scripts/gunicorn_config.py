@@ -7,3 +7,10 @@ max_requests = env.int("GUNICORN_MAX_REQUESTS", default=0)
 max_requests_jitter = env.int("GUNICORN_MAX_REQUESTS_JITTER", default=0)
 
 workers = env.int("GUNICORN_WORKERS", default=1)
+
+
+def worker_exit(server, worker):
+    # Write any guesses still waiting in the write-behind buffer before the worker exits
+    from huntsite.puzzles.guess_buffer import guess_buffer
+
+    guess_buffer.close()